@@ -0,0 +1,66 @@
+"""
+Load-adaptive render quality for queue workers.
+
+At peaks (a class uploading at the start of a lesson) every job waits
+behind full-quality renders, while off-peak the workers idle. With
+ADAPTIVE_QUALITY on, a worker looks at the queue and the machine before
+each job:
+
+- under pressure (more than ADAPTIVE_QUEUE_DEPTH jobs waiting, or a load
+  average above ADAPTIVE_CPU_LOAD per CPU) the job is rendered one profile
+  cheaper than asked for, two if both are over, but never below
+  ADAPTIVE_QUALITY_FLOOR
+- a job rendered below what was asked for gets an upgrade job at the
+  requested profile; upgrades wait until workers are no longer under
+  pressure, so they use the idle time after a peak
+
+Upgrade jobs themselves are never degraded.
+"""
+
+import os
+from collections import namedtuple
+
+import config
+
+# Profiles from the cheapest to the most expensive
+PROFILE_ORDER = ("draft", "standard", "archive")
+
+LoadSample = namedtuple('LoadSample', ['queued', 'cpu_load'])
+
+
+def sample_load(queue):
+    """Waiting jobs (upgrades excluded) and the 1-minute load average per CPU."""
+    try:
+        cpu_load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        # No load average on this platform; go by queue depth alone
+        cpu_load = 0.0
+    return LoadSample(queue.queued_count(), cpu_load)
+
+
+def pressure(load):
+    """How many profile steps to drop: one per threshold the load is over."""
+    return int(load.queued > config.ADAPTIVE_QUEUE_DEPTH) + int(load.cpu_load > config.ADAPTIVE_CPU_LOAD)
+
+
+def choose_profile(requested, load, floor=None):
+    """
+    Profile to render a job at under `load`.
+
+    Args:
+        requested: Profile name the job asked for
+        load: LoadSample from `sample_load`
+        floor: Cheapest profile allowed (default: ADAPTIVE_QUALITY_FLOOR)
+
+    Returns:
+        str: `requested`, or a cheaper profile no lower than `floor`
+    """
+    floor = floor or config.ADAPTIVE_QUALITY_FLOOR
+    if requested not in PROFILE_ORDER or floor not in PROFILE_ORDER:
+        return requested
+    level = PROFILE_ORDER.index(requested)
+    floor_level = PROFILE_ORDER.index(floor)
+    if level <= floor_level:
+        return requested
+    return PROFILE_ORDER[max(floor_level, level - pressure(load))]
+
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Headless HTTP API for submitting scores without the Streamlit UI.
+
+Endpoints (JSON unless noted):
+
+    POST   /jobs?filename=piece.musicxml   Submit a file (raw request body); returns 202 with the job.
+                                           Optional: &mode=falling for the falling-notes video,
+                                           &quality=draft|standard|archive for the render profile,
+                                           &measures=17-32 to render only those measures
+    GET    /jobs                           List jobs
+    GET    /jobs/<id>                      Job status and render progress
+    GET    /jobs/<id>/output               The rendered video (video/mp4)
+    DELETE /jobs/<id>                      Cancel a queued or running job
+    POST   /preview?filename=piece.musicxml
+                                           Storyboard of the video as a PNG contact sheet (image/png),
+                                           drawn in the request; takes &mode= and &measures= like /jobs
+    GET    /health                         Liveness and queue depth
+
+A job that workers rendered at a cheaper profile under load (see
+adaptive_quality.py) reports `rendered_quality` below `quality` and an
+`upgrade_job`: the id of the re-render at the requested quality.
+
+Jobs go into the shared durable job queue and are processed by worker
+processes through the same `FileProcessor.process_file` core as the app:
+API_WORKERS embedded workers, plus any `worker.py` replicas sharing the
+volume. When API_MAX_QUEUE jobs are waiting, submissions are refused with
+503 so clients back off instead of piling up work.
+
+Previews are drawn in the API process itself, with the render's duration
+limit and deadline (MAX_SCORE_SECONDS, RENDER_TIMEOUT_SECONDS). For an image
+that includes OMR, so at most API_MAX_PREVIEWS run at once; beyond that, or
+while the queue is full, previews get 503 as well. If API_KEY is set, every
+request must send `Authorization: Bearer <key>`.
+
+Usage:
+    python api_server.py --host 0.0.0.0 --port 8600
+"""
+
+import io
+import os
+import json
+import hmac
+import signal
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import config
+from job_queue import get_job_queue
+from render_profiles import RENDER_PROFILES, DEFAULT_PROFILE
+from measure_range import parse_measure_range
+from synthesia import VIDEO_MODES
+from worker import Worker
+
+
+def _run_worker():
+    """Entry point of an embedded worker process."""
+    worker = Worker(get_job_queue())
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker.run()
+
+
+def describe(job):
+    """Public view of a queue job."""
+    info = {
+        'id': job['id'],
+        'filename': job['filename'],
+        'bytes': job['input_bytes'],
+        'mode': job['mode'],
+        'quality': job['profile'],
+        'rendered_quality': job['rendered_profile'],
+        'measures': job['measures'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'submitted_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'message': job['message'],
+    }
+    if job['progress']:
+        info['progress'] = job['progress']
+    if job['status'] == 'done':
+        info['output_url'] = f"/jobs/{job['id']}/output"
+    if job['upgrade_of']:
+        info['upgrade_of'] = job['upgrade_of']
+    if job['upgrade_job']:
+        # Rendered below the requested quality under load; this job will have the requested one
+        info['upgrade_job'] = job['upgrade_job']
+    return info
+
+
+class _APIHandler(BaseHTTPRequestHandler):
+    queue = None
+    max_queue = None
+    # Semaphore with a slot per preview allowed at once, or None for no limit
+    previews = None
+    api_key = None
+    max_upload_bytes = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if not self.api_key:
+            return True
+        supplied = self.headers.get('Authorization', '')
+        if hmac.compare_digest(supplied.encode(), f"Bearer {self.api_key}".encode()):
+            return True
+        self._send_json(401, {'error': 'Missing or invalid API key'})
+        return False
+
+    def _job_from_path(self, parts):
+        job = self.queue.get(parts[1]) if len(parts) >= 2 else None
+        if job is None:
+            self._send_json(404, {'error': 'No such job'})
+        return job
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if parts == ['health']:
+            self._send_json(200, {'status': 'ok', 'queued': self.queue.queued_count()})
+            return
+        if not self._authorized():
+            return
+        if parts == ['jobs']:
+            self._send_json(200, {'jobs': [describe(job) for job in self.queue.list()]})
+        elif parts[0] == 'jobs' and len(parts) == 2:
+            job = self._job_from_path(parts)
+            if job is not None:
+                self._send_json(200, describe(job))
+        elif parts[0] == 'jobs' and len(parts) == 3 and parts[2] == 'output':
+            job = self._job_from_path(parts)
+            if job is not None:
+                self._send_output(job)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def _send_output(self, job):
+        if job['status'] != 'done':
+            self._send_json(409, {'error': f"Job is {job['status']}"})
+            return
+        try:
+            video_file = open(job['output_path'], 'rb')
+        except OSError:
+            # Evicted by the storage janitor
+            self._send_json(410, {'error': 'Output has expired; submit the file again'})
+            return
+        with video_file:
+            size = os.fstat(video_file.fileno()).st_size
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Content-Length', str(size))
+            filename = os.path.basename(job['output_path'])
+            self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+            self.end_headers()
+            while True:
+                chunk = video_file.read(1024 * 1024)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        if path not in ('/jobs', '/preview'):
+            self._send_json(404, {'error': 'Not found'})
+            return
+        query = parse_qs(url.query)
+        filename = query.get('filename', [None])[0] or self.headers.get('X-Filename')
+        if not filename:
+            self._send_json(400, {'error': 'Pass the file name as ?filename= or an X-Filename header'})
+            return
+        mode = query.get('mode', ['fingerboard'])[0]
+        if mode not in VIDEO_MODES:
+            self._send_json(400, {'error': f"mode must be one of {', '.join(VIDEO_MODES)}"})
+            return
+        profile = query.get('quality', [DEFAULT_PROFILE])[0]
+        if profile not in RENDER_PROFILES:
+            self._send_json(400, {'error': f"quality must be one of {', '.join(RENDER_PROFILES)}"})
+            return
+        measures = query.get('measures', [None])[0]
+        if measures:
+            try:
+                first, last = parse_measure_range(measures)
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            measures = f"{first}-{last}"
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0:
+            self._send_json(400, {'error': 'Empty request body'})
+            return
+        if self.max_upload_bytes and length > self.max_upload_bytes:
+            self._send_json(413, {'error': f"File is larger than {self.max_upload_bytes // (1024 * 1024)} MB"})
+            return
+        if self.max_queue and self.queue.queued_count() >= self.max_queue:
+            self._send_busy()
+            return
+        if path == '/preview':
+            self._send_preview(filename, self.rfile.read(length), mode, measures or None)
+            return
+        data = self.rfile.read(length)
+        job = self.queue.submit(filename, data, mode=mode, profile=profile, measures=measures or None)
+        self._send_json(202, describe(job))
+
+    def _send_busy(self):
+        self.send_response(503)
+        self.send_header('Retry-After', '30')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_preview(self, filename, data, mode, measures):
+        # Answered in the request, not queued: a MusicXML storyboard takes about as long as setting up the renderer.
+        # An image needs OMR first, so only API_MAX_PREVIEWS run at once
+        from file_processor import get_file_processor
+        from storyboard import contact_sheet
+
+        if self.previews is not None and not self.previews.acquire(blocking=False):
+            self._send_busy()
+            return
+        try:
+            success, message, storyboard = get_file_processor().preview_file(filename, data, mode=mode,
+                                                                             measures=measures)
+        finally:
+            if self.previews is not None:
+                self.previews.release()
+        if not success:
+            self._send_json(422, {'error': message})
+            return
+        image = io.BytesIO()
+        contact_sheet(storyboard.keyframes).save(image, format='PNG')
+        body = image.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if parts[0] != 'jobs' or len(parts) != 2:
+            self._send_json(404, {'error': 'Not found'})
+            return
+        job = self._job_from_path(parts)
+        if job is not None:
+            self._send_json(202, describe(self.queue.cancel(job['id'])))
+
+    def log_message(self, format, *args):
+        print(f"API {self.address_string()} {format % args}")
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless HTTP API for MusicSynth render jobs.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=config.API_PORT, help=f"Port (default: {config.API_PORT})")
+    parser.add_argument("--workers", type=int, default=config.API_WORKERS,
+                        help=f"Embedded render workers; 0 when separate worker containers take the jobs "
+                             f"(default: {config.API_WORKERS})")
+    args = parser.parse_args()
+
+    if args.host not in ('127.0.0.1', 'localhost') and not config.API_KEY:
+        print("Warning: API_KEY is not set, so the API accepts jobs from anyone who can reach it")
+
+    server = ThreadingHTTPServer((args.host, args.port), _APIHandler)
+    _APIHandler.queue = get_job_queue()
+    _APIHandler.max_queue = config.API_MAX_QUEUE
+    _APIHandler.previews = threading.BoundedSemaphore(config.API_MAX_PREVIEWS) if config.API_MAX_PREVIEWS else None
+    _APIHandler.api_key = config.API_KEY
+    _APIHandler.max_upload_bytes = config.API_MAX_UPLOAD_MB * 1024 * 1024 if config.API_MAX_UPLOAD_MB else None
+    # docker stop sends SIGTERM; shut down the same way as on Ctrl+C
+    signal.signal(signal.SIGTERM, _stop)
+    # Spawned, not forked: the server is multi-threaded and workers must not inherit its socket
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_run_worker, daemon=True) for _ in range(args.workers)]
+    for process in workers:
+        process.start()
+    print(f"MusicSynth API listening on http://{args.host}:{args.port} with {args.workers} embedded render workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        server.server_close()
+        # Workers cancel their current job and hand it back to the queue
+        for process in workers:
+            process.terminate()
+        for process in workers:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 import streamlit as st
-from file_processor import FileProcessor
+from file_processor import get_file_processor
 import os
 import time
-from datetime import datetime
-import pandas as pd
 from auth import require_auth, render_user_menu
 from config import validate_config
 from theme_manager import apply_modern_theme, theme_manager
+from job_control import CancelToken
+from measure_range import parse_measure_range
+import config
+import metrics
 
 # Validate configuration first
 try:
@@ -24,6 +26,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Expose Prometheus metrics on localhost (once per process)
+metrics.start_metrics_server()
+
 # Apply MusicSynth theme
 apply_modern_theme()
 
@@ -34,9 +39,11 @@ if not require_auth():
 # Render user menu in sidebar
 render_user_menu()
 
-# Initialize session state for file processor if it doesn't exist
-if 'file_processor' not in st.session_state:
-    st.session_state.file_processor = FileProcessor()
+# One FileProcessor is shared by every session in this process
+file_processor = get_file_processor()
+
+# Supabase user ID of the signed-in user, the key of their render library
+user_id = getattr(st.session_state.get('user'), 'id', None)
 
 # MusicSynth header with official branding
 st.markdown("""
@@ -97,7 +104,111 @@ uploaded_file = st.file_uploader(
     help="Upload MusicXML files (.musicxml, .xml) or sheet music images (.png, .jpg, .jpeg)"
 )
 
+VIDEO_MODE_LABELS = {
+    "fingerboard": "🎻 Fingerboard: highlight the notes as they sound",
+    "falling": "🎹 Falling notes: notes scroll down toward the fingerboard",
+}
+video_mode = st.radio("Visualization", list(VIDEO_MODE_LABELS), format_func=VIDEO_MODE_LABELS.get, horizontal=True)
+
+RENDER_PROFILE_LABELS = {
+    "draft": "⚡ Draft: quick low-resolution preview",
+    "standard": "🎬 Standard: 720p",
+    "archive": "💎 Archive: 1080p, best for downloads",
+}
+render_profile = st.radio("Quality", list(RENDER_PROFILE_LABELS), format_func=RENDER_PROFILE_LABELS.get,
+                          index=list(RENDER_PROFILE_LABELS).index("standard"), horizontal=True, key="render_profile")
+
+measure_text = st.text_input("Measures (optional)", placeholder="e.g. 17-32",
+                             help="Render only these measures, to practise a passage. Leave empty for the whole piece.")
+measures = None
+measures_valid = True
+if measure_text.strip():
+    try:
+        first_measure, last_measure = parse_measure_range(measure_text)
+        measures = f"{first_measure}-{last_measure}"
+    except ValueError as e:
+        measures_valid = False
+        st.error(f"❌ {e}")
+
+def request_final_render():
+    """Re-render the current upload at standard quality after a draft."""
+    st.session_state.render_profile = "standard"
+
+# Identifies this particular upload, so a cancelled file is not re-rendered on the next rerun
+upload_key = None
+if uploaded_file is not None:
+    upload_key = (f"{uploaded_file.name}:{uploaded_file.size}:{getattr(uploaded_file, 'file_id', '')}:"
+                  f"{video_mode}:{render_profile}:{measures}")
+
+# Identifies what the storyboard shows; changing only the quality needs no new storyboard
+preview_key = None
 if uploaded_file is not None:
+    preview_key = f"{uploaded_file.name}:{uploaded_file.size}:{getattr(uploaded_file, 'file_id', '')}:{video_mode}:{measures}"
+
+# A video of this upload with these settings in the user's library is re-served straight away, no storyboard
+in_library = False
+if uploaded_file is not None and measures_valid and user_id:
+    library_hits = st.session_state.setdefault('library_hits', {})
+    if upload_key not in library_hits:
+        library_hits[upload_key] = file_processor.in_library(user_id, uploaded_file.name, uploaded_file.getbuffer(),
+                                                             mode=video_mode, profile=render_profile,
+                                                             measures=measures)
+    in_library = library_hits[upload_key]
+
+def confirm_render():
+    """Render the video of the upload whose storyboard is shown."""
+    st.session_state.confirmed_upload = st.session_state.get('preview', {}).get('key')
+
+def cancel_render():
+    """Stop the running render; also marks the upload so the rerun doesn't restart it."""
+    token = st.session_state.get('render_token')
+    if token is not None:
+        token.cancel()
+    if st.session_state.get('render_job'):
+        from job_queue import get_job_queue
+        get_job_queue().cancel(st.session_state.render_job)
+    st.session_state.cancelled_upload = st.session_state.get('active_upload')
+
+if uploaded_file is not None and st.session_state.get('cancelled_upload') == upload_key:
+    st.warning("⏹️ Render cancelled. Upload the file again to start a new render.")
+elif (uploaded_file is not None and measures_valid and not in_library
+      and st.session_state.get('confirmed_upload') != preview_key):
+    # Storyboard first: a few keyframes show whether the score was read right, before anything is encoded
+    preview = st.session_state.get('preview')
+    if preview is None or preview['key'] != preview_key:
+        with st.spinner("🔍 Reading your score..."):
+            success, message, storyboard = file_processor.preview_uploaded_file(uploaded_file, mode=video_mode,
+                                                                                measures=measures)
+        preview = st.session_state.preview = {'key': preview_key, 'success': success, 'message': message,
+                                              'storyboard': storyboard}
+    
+    if preview['success']:
+        st.markdown("""
+        <div class="musicsynth-card">
+            <h3 style="margin: 0 0 0.5rem 0; color: var(--foreground);">🖼️ Storyboard</h3>
+            <p style="margin: 0; color: var(--muted-foreground);">Check that your score was read correctly before the video is rendered</p>
+        </div>
+        """, unsafe_allow_html=True)
+        keyframes = preview['storyboard'].keyframes
+        for row in range(0, len(keyframes), 4):
+            for column, keyframe in zip(st.columns(4), keyframes[row:row + 4]):
+                caption = f"{keyframe.time:.1f}s"
+                if keyframe.measure is not None:
+                    caption = f"Measure {keyframe.measure} · {caption}"
+                column.image(keyframe.image, caption=caption, use_container_width=True)
+        st.button("🎬 Looks Right, Render the Video", on_click=confirm_render, type="primary")
+    else:
+        st.error(f"❌ {preview['message']}")
+elif uploaded_file is not None and measures_valid:
+    # An image was already recognised for the storyboard: render the MusicXML it produced instead of running OMR
+    # again. The upload itself is still sent along, as the render library keys the video on it
+    score_path = None
+    preview = st.session_state.get('preview')
+    if preview is not None and preview['key'] == preview_key and preview['storyboard'] is not None:
+        storyboard_score = preview['storyboard'].score_path
+        if os.path.basename(storyboard_score) != uploaded_file.name and os.path.exists(storyboard_score):
+            score_path = storyboard_score
+    
     # Initialize timing statistics
     timing_stats = {
         'start_time': time.time(),
@@ -112,16 +223,58 @@ if uploaded_file is not None:
     </div>
     """, unsafe_allow_html=True)
     
+    # Live render progress: frames done, render fps and ETA
+    progress_bar = st.progress(0.0, text="Preparing your score...")
+    
+    # Cancel button, shown only while the job runs
+    cancel_slot = st.empty()
+    cancel_slot.button("⏹️ Cancel Render", on_click=cancel_render, type="secondary")
+    st.session_state.active_upload = upload_key
+    st.session_state.render_token = CancelToken()
+    
+    def update_progress(progress):
+        eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "--"
+        progress_bar.progress(
+            progress.frames_done / progress.total_frames,
+            text=f"Rendering frame {progress.frames_done} of {progress.total_frames} "
+                 f"· {progress.fps:.1f} fps · about {eta} left"
+        )
+    
     # Process the uploaded file
     with st.spinner("🎼 Creating your musical visualization..."):
         # Track file processing time
         process_start = time.time()
-        success, message, output_path = st.session_state.file_processor.process_uploaded_file(uploaded_file)
+        if config.JOB_QUEUE_ENABLED:
+            # Rendered by a worker process; this replica only waits and shows progress
+            from job_queue import get_job_queue
+            job_queue = get_job_queue()
+            score = None
+            if score_path is not None:
+                with open(score_path, 'rb') as score_file:
+                    score = score_file.read()
+            job = job_queue.submit(uploaded_file.name, uploaded_file.getbuffer(), user_id=user_id,
+                                   mode=video_mode, profile=render_profile, measures=measures, score=score)
+            st.session_state.render_job = job['id']
+            success, message, output_path = job_queue.wait(job['id'], progress_callback=update_progress)
+            st.session_state.render_job = None
+        else:
+            success, message, output_path = file_processor.process_file(
+                uploaded_file.name, uploaded_file.getbuffer(), progress_callback=update_progress,
+                cancel_token=st.session_state.render_token, user_id=user_id, mode=video_mode, profile=render_profile,
+                measures=measures, score_path=score_path
+            )
         timing_stats['steps']['file_processing'] = time.time() - process_start
+        progress_bar.empty()
+        cancel_slot.empty()
         
         if success:
             st.success(f"✨ {message}")
             
+            # Remember this user's session directories so cleanup only touches their files
+            session_dirs = st.session_state.setdefault('session_dirs', [])
+            if os.path.dirname(output_path) not in session_dirs:
+                session_dirs.append(os.path.dirname(output_path))
+            
             # Track video generation time
             video_start = time.time()
             
@@ -141,6 +294,10 @@ if uploaded_file is not None:
             except Exception as e:
                 st.warning("Video preview is not available. You can download the video file instead.")
             
+            if render_profile == "draft":
+                st.info("This is a draft preview. Happy with it? Render the final video at full quality.")
+                st.button("🎬 Render Final Quality", on_click=request_final_render, type="primary")
+            
             # MusicSynth download section
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
@@ -196,6 +353,8 @@ if uploaded_file is not None:
             
             # Detailed statistics table
             with st.expander("📈 Detailed Performance Metrics"):
+                # pandas is only needed here, so it is not imported at start-up
+                import pandas as pd
                 stats_df = pd.DataFrame({
                     'Step': list(timing_stats['steps'].keys()),
                     'Time (seconds)': [f"{t:.2f}" for t in timing_stats['steps'].values()]
@@ -203,26 +362,63 @@ if uploaded_file is not None:
                 stats_df.loc[len(stats_df)] = ['Total Time', f"{timing_stats['total_time']:.2f}"]
                 st.table(stats_df)
             
-            # Save timing statistics to a log file
-            log_entry = f"\n{datetime.now()}\n"
-            log_entry += f"File: {uploaded_file.name}\n"
-            for step, duration in timing_stats['steps'].items():
-                log_entry += f"{step}: {duration:.2f} seconds\n"
-            log_entry += f"Total Time: {timing_stats['total_time']:.2f} seconds\n"
-            log_entry += "-" * 50
-            
-            log_path = os.path.join(st.session_state.file_processor.temp_dir, 'processing_stats.log')
-            with open(log_path, 'a') as f:
-                f.write(log_entry)
+            # Per-request records are written by FileProcessor; add the UI display time
+            metrics.registry.observe('display', timing_stats['steps']['video_generation'])
         else:
             st.error(f"❌ {message}")
 
+# Render library: previous videos of this user, replayed without re-rendering
+if user_id:
+    library = file_processor.library
+    entries = library.list(user_id)
+    if entries:
+        st.markdown("---")
+        usage = library.usage(user_id)
+        quota = f" of {usage['quota_bytes'] / (1024 * 1024):.0f} MB" if usage['quota_bytes'] else ""
+        st.markdown(f"""
+        <div class="musicsynth-card">
+            <h3 style="margin: 0 0 0.5rem 0; color: var(--foreground);">📚 Your Library</h3>
+            <p style="margin: 0; color: var(--muted-foreground);">
+                {usage['entries']} videos · {usage['bytes'] / (1024 * 1024):.1f} MB{quota} used
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        labels = {
+            entry['id']: f"{entry['filename']} · {time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['created_at']))} "
+                         f"· {entry['size_bytes'] / (1024 * 1024):.1f} MB"
+            for entry in entries
+        }
+        selected_id = st.selectbox("Previous videos", list(labels), format_func=labels.get, index=None,
+                                   placeholder="Choose a video to play or download")
+        entry = next((e for e in entries if e['id'] == selected_id), None)
+        if entry is not None:
+            video_path = library.video_path(entry)
+            st.video(video_path)
+            col1, col2 = st.columns(2)
+            with col1:
+                with open(video_path, 'rb') as video_file:
+                    st.download_button(
+                        label="⬇️ Download Again",
+                        data=video_file.read(),
+                        file_name=entry['video_name'],
+                        mime="video/mp4",
+                        on_click=library.touch,
+                        args=(entry['id'],),
+                        use_container_width=True
+                    )
+            with col2:
+                if st.button("🗑️ Remove From Library", use_container_width=True, type="secondary"):
+                    library.remove(user_id, entry['id'])
+                    st.rerun()
+
 # MusicSynth cleanup section
 st.markdown("---")
 col1, col2, col3 = st.columns([1, 2, 1])
 with col2:
     if st.button("🧹 Clean Up Files", use_container_width=True, type="secondary"):
-        st.session_state.file_processor.cleanup()
+        file_processor.cleanup(st.session_state.get('session_dirs', []))
+        st.session_state.session_dirs = []
         st.success("✨ Files cleaned up successfully!")
 
 # MusicSynth about section
@@ -281,6 +477,7 @@ st.sidebar.markdown("""
     <h3 style="margin: 0 0 0.5rem 0; color: var(--foreground);">🚀 How to Use</h3>
     <ol style="margin: 0; padding-left: 1.25rem; font-size: 0.875rem; color: var(--muted-foreground);">
         <li>Upload your MusicXML file or sheet music image</li>
+        <li>Check the storyboard to see your score was read correctly</li>
         <li>Watch the magic happen as we process your music</li>
         <li>Preview your beautiful piano roll visualization</li>
         <li>Download your creation to share with others</li>
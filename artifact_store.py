@@ -0,0 +1,162 @@
+"""
+Content-addressed artifact store.
+
+Blobs are stored once under `objects/<first two hex chars>/<sha256>` and
+hard-linked into session directories, so identical uploads share a single
+copy on disk. Bytes are hashed while they are being written; nothing is
+read back afterwards. Objects are read-only because every hard link shares
+the same inode.
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # Different filesystem or no hard link support
+        shutil.copyfile(src, dest)
+
+
+class ArtifactStore:
+    def __init__(self, root):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        for directory in [self.objects_dir, self.tmp_dir]:
+            os.makedirs(directory, mode=0o777, exist_ok=True)
+
+    def path(self, digest):
+        """Path of the object stored under `digest`."""
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def _commit(self, tmp_path, digest, link_to=None):
+        """
+        Move a fully written temp file into place, or drop it if the blob is already stored.
+
+        `link_to` is linked to the blob before the temp file is let go, so
+        the janitor never sees the object unreferenced in between.
+        """
+        object_path = self.path(digest)
+        if os.path.exists(object_path):
+            try:
+                if link_to is not None:
+                    _link_or_copy(object_path, link_to)
+                os.remove(tmp_path)
+                return
+            except FileNotFoundError:
+                # Evicted since the check; the temp file becomes the object again
+                pass
+        os.makedirs(os.path.dirname(object_path), mode=0o777, exist_ok=True)
+        os.chmod(tmp_path, 0o444)
+        if link_to is not None:
+            _link_or_copy(tmp_path, link_to)
+        os.replace(tmp_path, object_path)
+
+    def put_chunks(self, chunks, link_to=None):
+        """
+        Store a blob given as an iterable of byte chunks, hashing as it is written.
+
+        With `link_to`, that path is made a link to the blob as part of storing
+        it; linking separately afterwards can race with eviction.
+
+        Returns:
+            tuple: (digest, size)
+        """
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            self._commit(tmp_path, digest, link_to)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest, size
+
+    def put_buffer(self, buffer, link_to=None):
+        """Store an in-memory buffer (bytes or memoryview) in CHUNK_SIZE pieces; see `put_chunks`."""
+        view = memoryview(buffer)
+        return self.put_chunks((view[i:i + CHUNK_SIZE] for i in range(0, len(view), CHUNK_SIZE)), link_to)
+
+    def put_file(self, path):
+        """
+        Adopt an existing file (e.g. oemer output) into the store.
+
+        The file is hashed once and hard-linked in as the object, so it is
+        never copied. If the blob is already stored, `path` is replaced by a
+        link to the existing object.
+
+        Returns:
+            tuple: (digest, size)
+        """
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        object_path = self.path(digest)
+        if os.path.exists(object_path):
+            # Linked beside `path` first, so the file is never lost if the object is evicted meanwhile
+            tmp_link = f"{path}.{os.getpid()}.link"
+            try:
+                _link_or_copy(object_path, tmp_link)
+                os.replace(tmp_link, path)
+                return digest, os.path.getsize(path)
+            except FileNotFoundError:
+                # Evicted since the check; `path` becomes the object
+                pass
+        os.makedirs(os.path.dirname(object_path), mode=0o777, exist_ok=True)
+        try:
+            os.link(path, object_path)
+        except FileExistsError:
+            # Stored by another process meanwhile; this copy is identical
+            pass
+        except OSError:
+            shutil.copyfile(path, object_path)
+        os.chmod(object_path, 0o444)
+        return digest, os.path.getsize(object_path)
+
+    def link_into(self, digest, dest):
+        """Make `dest` refer to the stored blob, by hard link where possible, otherwise by copy."""
+        _link_or_copy(self.path(digest), dest)
+        return dest
+
+    def iter_unreferenced(self):
+        """
+        Yield (path, size, last_used) for objects that no session links to.
+
+        An object with a single link exists only in the store, so it is
+        safe to evict; linked objects are accounted for in the sessions.
+        """
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_nlink <= 1:
+                    yield path, stat.st_size, max(stat.st_mtime, stat.st_atime)
@@ -1,25 +1,151 @@
 import os
 import streamlit as st
-from supabase import create_client, Client
 from dotenv import load_dotenv
 import re
-from typing import Optional, Dict, Any
-from theme_manager import theme_manager
+import json
+import hmac
+import time
+import base64
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple
 
 # Load environment variables
 load_dotenv()
 
+# Refresh the access token in the background once it is this close to expiry
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+# Tolerated clock skew when checking expiry
+TOKEN_LEEWAY_SECONDS = 30
+# How long a request with an expired token waits for a refresh already in flight
+REFRESH_WAIT_SECONDS = 10
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase_client(url: str, key: str):
+    """
+    Process-wide Supabase client, built once on first use.
+    
+    The client is shared by every session, so it is created without session
+    persistence or auto-refresh: per-user tokens live in each session's
+    AuthSession, never in the client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from supabase import ClientOptions, create_client
+            _client = create_client(url, key, options=ClientOptions(auto_refresh_token=False, persist_session=False))
+    return _client
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+
+@lru_cache(maxsize=1024)
+def decode_access_token(token: str, secret: Optional[str]) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Decode a Supabase access token locally, without a server round trip.
+    
+    With the project's JWT secret (SUPABASE_JWT_SECRET) an HS256 signature
+    is verified here. Without the secret, or for a project signing with an
+    asymmetric key, only the structure is checked and the token is reported
+    as unverified, for the caller to check with the auth server. Results
+    are cached per token, so repeated reruns cost a dict lookup. Expiry is
+    checked separately by the caller.
+    
+    Returns:
+        (claims, verified): claims is None if the token is malformed or its
+        signature is invalid; verified is False if the signature could not
+        be checked locally
+    """
+    try:
+        header_segment, payload_segment, signature_segment = token.split('.')
+        header = json.loads(_b64url_decode(header_segment))
+        claims = json.loads(_b64url_decode(payload_segment))
+    except (ValueError, AttributeError):
+        return None, False
+    if not secret or header.get('alg') != 'HS256':
+        return claims, False
+    expected = hmac.new(secret.encode(), f"{header_segment}.{payload_segment}".encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, _b64url_decode(signature_segment)):
+        return None, False
+    return claims, True
+
+
+@lru_cache(maxsize=1024)
+def accepted_by_server(url: str, key: str, token: str) -> bool:
+    """
+    Ask the auth server whether it accepts `token`.
+    
+    Used for tokens that cannot be verified locally. An answer is cached per
+    token, so each token costs one round trip; a network error raises
+    (supabase_auth's AuthRetryableError) and is not cached.
+    """
+    from supabase_auth.errors import AuthApiError
+    try:
+        response = get_supabase_client(url, key).auth.get_user(token)
+    except AuthApiError:
+        return False
+    return bool(response and response.user)
+
+
+class AuthSession:
+    """Tokens of one signed-in user; updated in place by the background refresh."""
+    
+    def __init__(self, user, access_token: str, refresh_token: str, expires_at: Optional[float]):
+        self.user = user
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at
+        self.refreshing = False
+        self.refresh_succeeded = False
+        self.refresh_done = threading.Event()
+        self.refresh_done.set()
+        self.lock = threading.Lock()
+    
+    def begin_refresh(self) -> bool:
+        """Mark a refresh as started; False if one is already in flight."""
+        with self.lock:
+            if self.refreshing:
+                return False
+            self.refreshing = True
+            self.refresh_done.clear()
+            return True
+    
+    def end_refresh(self, succeeded: bool):
+        with self.lock:
+            self.refreshing = False
+            self.refresh_succeeded = succeeded
+            self.refresh_done.set()
+    
+    def update(self, session):
+        with self.lock:
+            self.access_token = session.access_token
+            self.refresh_token = session.refresh_token
+            self.expires_at = session.expires_at
+            if session.user:
+                self.user = session.user
+
+
 class SupabaseAuth:
     def __init__(self):
-        # Initialize Supabase client
+        # Configuration only; the shared client is created on first use
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_ANON_KEY")
+        self.jwt_secret = os.getenv("SUPABASE_JWT_SECRET")
         
         if not self.supabase_url or not self.supabase_key:
             st.error("Supabase configuration not found. Please check your environment variables.")
             st.stop()
-        
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+    
+    @property
+    def supabase(self):
+        """Shared Supabase client"""
+        return get_supabase_client(self.supabase_url, self.supabase_key)
     
     def is_valid_email(self, email: str) -> bool:
         """Validate email format"""
@@ -77,8 +203,12 @@ class SupabaseAuth:
             
             if response.user:
                 # Store user session in Streamlit session state
+                session = response.session
+                st.session_state.auth_session = AuthSession(
+                    response.user, session.access_token, session.refresh_token, session.expires_at
+                )
                 st.session_state.user = response.user
-                st.session_state.access_token = response.session.access_token
+                st.session_state.access_token = session.access_token
                 st.session_state.authenticated = True
                 
                 return {"success": True, "message": "Login successful!"}
@@ -94,18 +224,70 @@ class SupabaseAuth:
     def logout_user(self):
         """Logout user"""
         try:
-            self.supabase.auth.sign_out()
-            # Clear session state
-            if 'user' in st.session_state:
-                del st.session_state.user
-            if 'access_token' in st.session_state:
-                del st.session_state.access_token
-            if 'authenticated' in st.session_state:
-                del st.session_state.authenticated
+            # Revoke this user's session; the shared client holds no session of its own
+            access_token = st.session_state.get('access_token')
+            if access_token:
+                self.supabase.auth.admin.sign_out(access_token)
+            self._clear_session()
             st.rerun()
         except Exception as e:
             st.error(f"Logout failed: {str(e)}")
     
+    def _clear_session(self):
+        for key in ['user', 'access_token', 'authenticated', 'auth_session']:
+            if key in st.session_state:
+                del st.session_state[key]
+    
+    def _refresh(self, auth_session: AuthSession):
+        """
+        Exchange the refresh token for a new session; returns True on success.
+        
+        The caller must have called `auth_session.begin_refresh()`.
+        """
+        succeeded = False
+        try:
+            response = self.supabase.auth.refresh_session(auth_session.refresh_token)
+            if response.session:
+                auth_session.update(response.session)
+                succeeded = True
+        except Exception as e:
+            print(f"Token refresh failed: {str(e)}")
+        finally:
+            auth_session.end_refresh(succeeded)
+        return succeeded
+    
+    def _refresh_in_background(self, auth_session: AuthSession):
+        if not auth_session.begin_refresh():
+            return
+        threading.Thread(target=self._refresh, args=(auth_session,), daemon=True, name='token-refresh').start()
+    
+    def _refresh_expired(self, auth_session: AuthSession) -> bool:
+        """
+        Renew an expired session; returns True if it was renewed.
+        
+        Refresh tokens are single-use, so if a refresh is already in flight
+        (the background one, or another rerun of the same session) its
+        outcome is waited for instead of starting a second one that the
+        server would reject.
+        """
+        if auth_session.begin_refresh():
+            return self._refresh(auth_session)
+        if not auth_session.refresh_done.wait(REFRESH_WAIT_SECONDS):
+            print("Token refresh still pending; signing out")
+            return False
+        return auth_session.refresh_succeeded
+    
+    def _accepted_by_server(self, token: str) -> bool:
+        """Server-side check of a token that could not be verified locally."""
+        from supabase_auth.errors import AuthRetryableError
+        try:
+            return accepted_by_server(self.supabase_url, self.supabase_key, token)
+        except AuthRetryableError as e:
+            # The token came from server-side session state; don't sign the
+            # user out over an outage, it is checked again on the next rerun
+            print(f"Token check failed: {str(e)}")
+            return True
+    
     def get_current_user(self) -> Optional[Dict[str, Any]]:
         """Get current user from session"""
         if 'user' in st.session_state:
@@ -113,8 +295,45 @@ class SupabaseAuth:
         return None
     
     def is_authenticated(self) -> bool:
-        """Check if user is authenticated"""
-        return st.session_state.get('authenticated', False)
+        """
+        Check if user is authenticated.
+        
+        The access token is validated locally (signature and expiry) when
+        SUPABASE_JWT_SECRET is set and the token is HS256, otherwise by the
+        auth server, once per token. A token close to expiry is refreshed in
+        a background thread; an expired one is refreshed synchronously (or
+        the refresh in flight is waited for), and the user is signed out if
+        that fails.
+        """
+        if not st.session_state.get('authenticated', False):
+            return False
+        auth_session = st.session_state.get('auth_session')
+        if auth_session is None:
+            return True
+        
+        claims, verified = decode_access_token(auth_session.access_token, self.jwt_secret)
+        if claims is None:
+            self._clear_session()
+            return False
+        expires_at = claims.get('exp', auth_session.expires_at)
+        remaining = expires_at - time.time() if expires_at else None
+        
+        if remaining is not None and remaining < -TOKEN_LEEWAY_SECONDS:
+            # A renewed token comes straight from the auth server; no further check needed
+            if not self._refresh_expired(auth_session):
+                self._clear_session()
+                return False
+        else:
+            if not verified and not self._accepted_by_server(auth_session.access_token):
+                self._clear_session()
+                return False
+            if remaining is not None and remaining < TOKEN_REFRESH_MARGIN_SECONDS:
+                self._refresh_in_background(auth_session)
+        
+        # Pick up tokens renewed by a background refresh
+        st.session_state.access_token = auth_session.access_token
+        st.session_state.user = auth_session.user
+        return True
     
     def reset_password(self, email: str) -> Dict[str, Any]:
         """Send password reset email"""
@@ -133,9 +352,6 @@ def render_auth_forms():
     """Render MusicSynth authentication forms"""
     auth = SupabaseAuth()
     
-    # Apply theme
-    theme_manager.apply_theme()
-    
     st.markdown('<div class="auth-container musicsynth-fade-in">', unsafe_allow_html=True)
     
     # Create tabs for login and register
@@ -314,9 +530,6 @@ def require_auth():
     auth = SupabaseAuth()
     
     if not auth.is_authenticated():
-        # Apply theme first
-        theme_manager.apply_theme()
-        
         # MusicSynth authentication page
         st.markdown("""
         <div style="text-align: center; padding: 3rem 1.5rem;">
@@ -0,0 +1,255 @@
+"""
+Batch rendering for whole directories of MusicXML scores.
+
+Files are distributed across a process pool so interpreter, import and font
+start-up costs are paid once per worker rather than once per file. Outputs
+that are already up to date are skipped, and a manifest in the output
+directory lets an interrupted batch resume where it stopped.
+"""
+
+import os
+import glob
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from job_control import CancelToken, apply_resource_limits
+from render_profiles import DEFAULT_PROFILE
+from segment_cache import RENDERER_VERSION
+
+MUSICXML_EXTENSIONS = ('.musicxml', '.xml')
+MANIFEST_NAME = '.musicsynth_batch.json'
+
+
+def _glob_root(pattern):
+    """The directory part of a glob pattern before its first wildcard."""
+    parts = []
+    for part in os.path.dirname(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or '.'
+
+
+def collect_inputs(inputs):
+    """
+    Expand files, directories and glob patterns into the MusicXML files to render.
+
+    Returns:
+        list: Sorted (absolute path, relative path) pairs; the relative path
+        is taken from the directory or glob root the file was found under
+        (the file name for files given directly) and names its output
+    """
+    found = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                for name in filenames:
+                    if name.lower().endswith(MUSICXML_EXTENSIONS):
+                        path = os.path.join(dirpath, name)
+                        found.setdefault(os.path.abspath(path), os.path.relpath(path, item))
+        elif glob.has_magic(item):
+            root = _glob_root(item)
+            for path in glob.glob(item, recursive=True):
+                if os.path.isfile(path):
+                    found.setdefault(os.path.abspath(path), os.path.relpath(path, root))
+        elif os.path.isfile(item):
+            found.setdefault(os.path.abspath(item), os.path.basename(item))
+        else:
+            print(f"Warning: '{item}' does not exist, skipping")
+    return sorted(found.items())
+
+
+def output_path_for(relative_path, output_dir):
+    """Map an input score's relative path to its video path, keeping its subdirectories."""
+    return os.path.join(output_dir, os.path.splitext(relative_path)[0] + ".mp4")
+
+
+def _manifest_key(output_path, output_dir):
+    return os.path.relpath(output_path, output_dir)
+
+
+def _source_fingerprint(input_path, settings):
+    stat = os.stat(input_path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "settings": settings}
+
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_dir, manifest):
+    """Write the manifest atomically so an interruption never corrupts it."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(input_path, output_path, manifest, settings, manifest_key):
+    """Check whether an output exists and was rendered from the current input and settings."""
+    if not os.path.exists(output_path):
+        return False
+    entry = manifest.get(manifest_key)
+    if entry is not None:
+        return entry.get("source") == input_path and entry.get("fingerprint") == _source_fingerprint(input_path, settings)
+    # No manifest entry (e.g. rendered outside batch mode): fall back to modification times
+    return os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+
+def render_one(input_path, output_path, fps, timeout=None, mode="fingerboard", audio=False, profile=DEFAULT_PROFILE):
+    """
+    Render a single score in a worker process.
+
+    The video is written to a partial file and renamed into place only once
+    encoding has finished, so an interrupted render is never mistaken for a
+    complete one. A render running past `timeout` seconds is stopped and
+    reported as failed.
+
+    Returns:
+        dict: Per-file result with timings, status and any error message
+    """
+    from synthesia import parse_musicxml, make_video
+    from render_profiler import RenderProfiler
+
+    profiler = RenderProfiler.from_env()
+    if profiler is not None:
+        profiler.start()
+    result = {"input": input_path, "output": output_path, "status": "failed", "error": None}
+    start = time.time()
+    partial_path = os.path.splitext(output_path)[0] + '.partial.mp4'
+    try:
+        parse_start = time.time()
+        notes = parse_musicxml(input_path)
+        result["parse_seconds"] = time.time() - parse_start
+        result["notes"] = len(notes)
+        if not notes:
+            result["error"] = "No notes found in the input file"
+            return result
+
+        render_start = time.time()
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        make_video(notes, output_file=partial_path, fps=fps, profile=profile, logger=None, profiler=profiler,
+                   cancel_token=CancelToken(timeout=timeout), mode=mode, audio=audio)
+        os.replace(partial_path, output_path)
+        result["render_seconds"] = time.time() - render_start
+        result["status"] = "rendered"
+        if profiler is not None:
+            profiler.stop()
+            result["profile"] = profiler.write_report(output_path)
+    except Exception as e:
+        result["error"] = str(e)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    finally:
+        result["total_seconds"] = time.time() - start
+    return result
+
+
+def run_batch(inputs, output_dir, fps=None, jobs=None, summary_path=None, force=False, mode="fingerboard",
+              audio=False, profile=DEFAULT_PROFILE):
+    """
+    Render every score found in `inputs` into `output_dir`.
+
+    Args:
+        inputs: Files, directories or glob patterns
+        output_dir: Directory that receives the videos, manifest and summary
+        fps: Frames per second for every video (default: set by the profile)
+        jobs: Number of worker processes (default: CPU count)
+        summary_path: Where to write the JSON summary
+        force: Re-render even if outputs are up to date
+        mode: Visualization, one of synthesia.VIDEO_MODES
+        audio: Add a synthesized soundtrack
+        profile: Render quality profile, one of render_profiles.RENDER_PROFILES
+
+    Returns:
+        dict: The summary that was written to `summary_path`
+    """
+    import config
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = summary_path or os.path.join(output_dir, 'batch_summary.json')
+    settings = {"profile": profile, "fps": fps, "mode": mode, "audio": audio, "renderer": RENDERER_VERSION}
+    manifest = _load_manifest(output_dir)
+
+    files = collect_inputs(inputs)
+    print(f"Found {len(files)} MusicXML files")
+
+    results = []
+    pending = {}
+    # Inputs whose outputs would overwrite each other (e.g. piece.musicxml and piece.xml side by side)
+    sources = {}
+    for input_path, relative_path in files:
+        sources.setdefault(output_path_for(relative_path, output_dir), []).append(input_path)
+    for input_path, relative_path in files:
+        output_path = output_path_for(relative_path, output_dir)
+        others = [path for path in sources[output_path] if path != input_path]
+        if others:
+            results.append({"input": input_path, "output": output_path, "status": "failed",
+                            "error": f"Output {output_path} would also be written from {', '.join(others)}"})
+            print(f"Failed {input_path}: {results[-1]['error']}")
+        elif not force and is_up_to_date(input_path, output_path, manifest, settings,
+                                         _manifest_key(output_path, output_dir)):
+            results.append({"input": input_path, "output": output_path, "status": "skipped", "error": None})
+        else:
+            pending[input_path] = output_path
+    skipped = sum(1 for r in results if r["status"] == "skipped")
+    print(f"{skipped} up to date, {len(results) - skipped} in conflict, {len(pending)} to render")
+
+    batch_start = time.time()
+    interrupted = False
+    # Cap worker memory so one pathological score cannot take down the machine
+    executor = ProcessPoolExecutor(max_workers=jobs, initializer=apply_resource_limits,
+                                   initargs=(None, config.RENDER_MEMORY_MB or None))
+    try:
+        futures = {
+            executor.submit(render_one, path, out, fps, config.RENDER_TIMEOUT_SECONDS or None, mode, audio,
+                            profile): path
+            for path, out in pending.items()
+        }
+        for future in as_completed(futures):
+            input_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. killed by the OOM killer)
+                result = {"input": input_path, "output": pending[input_path], "status": "failed", "error": str(e)}
+            results.append(result)
+            if result["status"] == "rendered":
+                manifest[_manifest_key(result["output"], output_dir)] = {
+                    "source": input_path,
+                    "fingerprint": _source_fingerprint(input_path, settings),
+                }
+                _save_manifest(output_dir, manifest)
+                print(f"Rendered {result['output']} in {result['total_seconds']:.2f}s")
+            else:
+                print(f"Failed {input_path}: {result['error']}")
+    except KeyboardInterrupt:
+        interrupted = True
+        print("Interrupted; completed files are recorded and will be skipped on the next run")
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=True)
+
+    summary = {
+        "finished_at": datetime.now().isoformat(),
+        "wall_seconds": time.time() - batch_start,
+        "interrupted": interrupted,
+        "settings": settings,
+        "total": len(files),
+        "rendered": sum(1 for r in results if r["status"] == "rendered"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "files": sorted(results, key=lambda r: r["input"]),
+    }
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Rendered {summary['rendered']}, skipped {summary['skipped']}, failed {summary['failed']}. "
+          f"Summary written to {summary_path}")
+    return summary
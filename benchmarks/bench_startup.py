@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Start-up latency guard.
+
+Imports the modules the Streamlit app loads before its first page render
+in a fresh interpreter, several times, and fails if the median import time
+exceeds a budget or if any heavy module that should be lazy (MoviePy,
+pandas, the Supabase client, NumPy, PIL and the renderer itself) was
+pulled in at import time.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app.py imports before the first page is rendered
+STARTUP_MODULES = ["config", "metrics", "theme_manager", "job_control", "measure_range", "file_processor", "auth"]
+
+# Modules that must only be imported when first needed
+LAZY_MODULES = ["moviepy", "pandas", "supabase", "numpy", "PIL", "synthesia"]
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_ms": elapsed * 1000,
+                  "eager": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_startup(repeats=5, modules=STARTUP_MODULES):
+    """
+    Import `modules` in `repeats` fresh interpreters.
+
+    Returns:
+        dict: Median and max import time in ms, and any lazy modules that were imported eagerly
+    """
+    probe = _PROBE.format(modules=modules, lazy=LAZY_MODULES)
+    env = dict(os.environ, MUSICSYNTH_METRICS_PORT="0")
+    timings = []
+    eager = set()
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", probe], cwd=REPO_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["import_ms"])
+        eager.update(result["eager"])
+    timings.sort()
+    return {
+        "repeats": repeats,
+        "import_ms": timings[len(timings) // 2],
+        "max_import_ms": timings[-1],
+        "eager_modules": sorted(eager),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Guard app start-up import latency.")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters to time (default: 5)")
+    parser.add_argument("--max-ms", type=float, default=1500.0, help="Median import-time budget in ms (default: 1500)")
+    args = parser.parse_args()
+
+    result = measure_startup(args.repeats)
+    print(f"Start-up imports: median {result['import_ms']:.0f} ms, max {result['max_import_ms']:.0f} ms "
+          f"(budget {args.max_ms:.0f} ms)")
+
+    failed = False
+    if result["eager_modules"]:
+        print(f"FAIL: imported at start-up but should be lazy: {', '.join(result['eager_modules'])}")
+        failed = True
+    if result["import_ms"] > args.max_ms:
+        print("FAIL: start-up import time is over budget")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
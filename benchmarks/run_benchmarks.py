@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the render pipeline.
+
+Measures start-up import time, parse throughput, per-frame render time, encoder fps, end-to-end
+video fps and peak RSS on synthetic scores. Every stage runs in a fresh
+process so its peak RSS is not polluted by the stages before it. Results
+are written as JSON, and a previous results file can be passed as a
+baseline to flag regressions. Runs offline on a CPU-only machine.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import tempfile
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from score_generator import write_score
+from bench_startup import measure_startup
+
+# Metric name -> True if higher is better
+TRACKED_METRICS = {
+    "startup.import_ms": False,
+    "parse.notes_per_second": True,
+    "render.mean_ms": False,
+    "render.p95_ms": False,
+    "encode.fps": True,
+    "video.fps": True,
+    "parse.peak_rss_mb": False,
+    "render.peak_rss_mb": False,
+    "video.peak_rss_mb": False,
+}
+
+
+def _peak_rss_mb(include_children=False):
+    """Peak resident set size of this process (and optionally its children) in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if include_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is reported in KB on Linux
+    return peak / 1024.0
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_parse(score_path, repeats):
+    """Parse the same score repeatedly and report notes and bytes per second."""
+    from synthesia import parse_musicxml
+
+    size = os.path.getsize(score_path)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        notes = parse_musicxml(score_path)
+    elapsed = time.perf_counter() - start
+    return {
+        "notes": len(notes),
+        "repeats": repeats,
+        "seconds": elapsed,
+        "notes_per_second": len(notes) * repeats / elapsed,
+        "mb_per_second": size * repeats / elapsed / 1e6,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def bench_render(score_path, frames, mode="fingerboard"):
+    """
+    Time the frame renderer `make_video` uses, at the standard profile's
+    size, on frames spread evenly over the piece.
+    """
+    from synthesia import parse_musicxml, _frame_renderer
+    from render_profiles import get_profile
+
+    notes = parse_musicxml(score_path)
+    duration = notes[-1]["start_time"] + notes[-1]["duration"]
+    renderer = _frame_renderer(notes, duration, get_profile("standard").frame_size, mode)
+    try:
+        renderer.frame(0.0, 0.0)  # Warm up font loading and allocations
+        timings = []
+        for i in range(frames):
+            t = duration * i / max(1, frames - 1)
+            start = time.perf_counter()
+            renderer.frame(t, t)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        renderer.close()
+    return {
+        "mode": mode,
+        "frames": frames,
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": _percentile(timings, 0.50),
+        "p95_ms": _percentile(timings, 0.95),
+        "max_ms": max(timings),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def bench_encode(score_path, frames, fps):
+    """Feed a pre-rendered frame to the encoder to measure encode throughput alone."""
+    from synthesia import parse_musicxml, _frame_renderer
+    from render_profiles import get_profile
+    from video_encoder import VideoEncoder
+
+    profile = get_profile("standard", fps)
+    notes = parse_musicxml(score_path)
+    duration = notes[-1]["start_time"] + notes[-1]["duration"]
+    renderer = _frame_renderer(notes, duration, profile.frame_size, "fingerboard")
+    try:
+        t = notes[len(notes) // 2]["start_time"]
+        frame = renderer.frame(t, t)
+    finally:
+        renderer.close()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, "encode.mp4")
+        start = time.perf_counter()
+        with VideoEncoder(output, profile) as encoder:
+            for _ in range(frames):
+                encoder.write_frame(frame)
+        elapsed = time.perf_counter() - start
+    return {
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed,
+        "peak_rss_mb": _peak_rss_mb(include_children=True),
+    }
+
+
+def bench_video(score_path, seconds, fps):
+    """Run `make_video` end to end on the first `seconds` of the score."""
+    from synthesia import parse_musicxml, make_video
+
+    notes = parse_musicxml(score_path)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, "video.mp4")
+        start = time.perf_counter()
+        make_video(notes, output_file=output, fps=fps, duration=seconds, logger=None)
+        elapsed = time.perf_counter() - start
+    frames = int(seconds * fps)
+    return {
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed,
+        "peak_rss_mb": _peak_rss_mb(include_children=True),
+    }
+
+
+def _run_isolated(func, *args):
+    """Run one benchmark stage in a fresh process so peak RSS is per stage."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(func, *args).result()
+
+
+def run_suite(args):
+    """Run every stage and return the results document."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        score_path = os.path.join(tmp_dir, "synthetic.musicxml")
+        write_score(score_path, note_count=args.notes, chord_density=args.chord_density,
+                    tempo_changes=args.tempo_changes, length=args.length, seed=args.seed)
+
+        results = {}
+        print("Benchmarking start-up imports...")
+        results["startup"] = measure_startup(args.startup_repeats)
+        print("Benchmarking parse...")
+        results["parse"] = _run_isolated(bench_parse, score_path, args.parse_repeats)
+        print("Benchmarking frame render...")
+        results["render"] = _run_isolated(bench_render, score_path, args.render_frames, args.mode)
+        print("Benchmarking encode...")
+        results["encode"] = _run_isolated(bench_encode, score_path, args.encode_frames, args.fps)
+        print("Benchmarking end-to-end video...")
+        results["video"] = _run_isolated(bench_video, score_path, args.video_seconds, args.fps)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": vars(args),
+        },
+        "results": results,
+    }
+
+
+def _metric(document, name):
+    stage, key = name.split(".", 1)
+    return document.get("results", {}).get(stage, {}).get(key)
+
+
+def compare_to_baseline(current, baseline, threshold):
+    """
+    Compare tracked metrics against a baseline results document.
+
+    Returns:
+        list: Names of metrics that regressed by more than `threshold` (a fraction)
+    """
+    regressions = []
+    print(f"\n{'metric':<26}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, higher_is_better in TRACKED_METRICS.items():
+        old, new = _metric(baseline, name), _metric(current, name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        regressed = change < -threshold if higher_is_better else change > threshold
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<26}{old:>12.2f}{new:>12.2f}{change:>+10.1%}{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark parse, render and encode on synthetic scores.")
+    parser.add_argument("--output", "-o", default="bench_results.json", help="Results JSON file (default: bench_results.json)")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression as a fraction (default: 0.10)")
+    parser.add_argument("--notes", type=int, default=1000, help="Notes in the synthetic score (default: 1000)")
+    parser.add_argument("--chord-density", type=float, default=0.1, help="Fraction of notes in chords (default: 0.1)")
+    parser.add_argument("--tempo-changes", type=int, default=4, help="Tempo changes in the score (default: 4)")
+    parser.add_argument("--length", type=float, default=300.0, help="Score length in seconds (default: 300)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--startup-repeats", type=int, default=5, help="Fresh interpreters for start-up timing (default: 5)")
+    parser.add_argument("--parse-repeats", type=int, default=20, help="Parse repetitions (default: 20)")
+    parser.add_argument("--render-frames", type=int, default=60, help="Frames to time (default: 60)")
+    parser.add_argument("--encode-frames", type=int, default=150, help="Frames to encode (default: 150)")
+    parser.add_argument("--video-seconds", type=float, default=5.0, help="Seconds of video to render end to end (default: 5)")
+    parser.add_argument("--fps", type=int, default=30, help="Frames per second (default: 30)")
+    parser.add_argument("--mode", choices=("fingerboard", "falling"), default="fingerboard",
+                        help="Visualization whose frames are timed (default: fingerboard)")
+    args = parser.parse_args()
+
+    document = run_suite(args)
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2)
+
+    for stage, values in document["results"].items():
+        summary = ", ".join(f"{key}={value:.2f}" for key, value in values.items() if isinstance(value, float))
+        print(f"{stage}: {summary}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(document, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Synthetic MusicXML generator for the benchmark suite.
+
+Produces reproducible violin-range scores with a configurable note count,
+chord density, number of tempo changes and total length, so parse, render
+and encode measurements do not depend on any particular piece of music.
+"""
+
+import random
+import xml.etree.ElementTree as ET
+
+STEPS = [("C", 0), ("C", 1), ("D", 0), ("D", 1), ("E", 0), ("F", 0),
+         ("F", 1), ("G", 0), ("G", 1), ("A", 0), ("A", 1), ("B", 0)]
+
+# Violin range G3 (MIDI 55) to G6 (MIDI 91)
+LOWEST_MIDI = 55
+HIGHEST_MIDI = 91
+
+
+def _pitch_element(parent, midi):
+    step, alter = STEPS[midi % 12]
+    pitch = ET.SubElement(parent, "pitch")
+    ET.SubElement(pitch, "step").text = step
+    if alter:
+        ET.SubElement(pitch, "alter").text = str(alter)
+    ET.SubElement(pitch, "octave").text = str(midi // 12 - 1)
+
+
+def _split_units(total_units, count, rng):
+    """
+    Split `total_units` ticks into `count` positive durations.
+
+    Each duration is scaled by what is left of the budget, so rounding never
+    accumulates and the durations add up to exactly `total_units` (or to
+    `count` if there are fewer ticks than durations).
+    """
+    weights = [rng.choice([1, 1, 2, 2, 2, 4, 4, 8]) for _ in range(count)]
+    durations = []
+    remaining_units = total_units
+    remaining_weight = sum(weights)
+    for i, weight in enumerate(weights):
+        # Leave at least one tick for each duration still to come
+        available = remaining_units - (count - i - 1)
+        duration = max(1, min(available, round(weight * remaining_units / remaining_weight)))
+        durations.append(duration)
+        remaining_units -= duration
+        remaining_weight -= weight
+    return durations
+
+
+def generate_score(note_count=500, chord_density=0.1, tempo_changes=4, length=120.0,
+                   divisions=4, beats_per_measure=4, rest_ratio=0.05, seed=0):
+    """
+    Build a synthetic score.
+
+    Args:
+        note_count: Total number of pitched notes, including chord members (which don't add to the length)
+        chord_density: Fraction of notes that are stacked onto the previous note as a chord
+        tempo_changes: Number of <sound tempo> directions spread over the piece
+        length: Approximate length in seconds as read by `parse_musicxml` (a quarter note is one second)
+        divisions: Ticks per quarter note; doubled until every note and rest fits in `length`
+        beats_per_measure: Quarter notes per measure
+        rest_ratio: Fraction of timeline events that are rests
+        seed: Random seed, so the same arguments always give the same file
+
+    Returns:
+        xml.etree.ElementTree.ElementTree: The generated score
+    """
+    rng = random.Random(seed)
+
+    chord_notes = int(note_count * chord_density)
+    melody_notes = max(1, note_count - chord_notes)
+    rests = int(melody_notes * rest_ratio)
+    # Short, dense scores need finer ticks to give every event a duration
+    while int(length * divisions) < melody_notes + rests:
+        divisions *= 2
+    durations = _split_units(int(length * divisions), melody_notes + rests, rng)
+    events = ["note"] * melody_notes + ["rest"] * rests
+    rng.shuffle(events)
+    chord_positions = set(rng.sample(range(melody_notes), min(chord_notes, melody_notes)))
+
+    root = ET.Element("score-partwise", version="3.1")
+    part_list = ET.SubElement(root, "part-list")
+    score_part = ET.SubElement(part_list, "score-part", id="P1")
+    ET.SubElement(score_part, "part-name").text = "Violin"
+    part = ET.SubElement(root, "part", id="P1")
+
+    measure_ticks = divisions * beats_per_measure
+    total_ticks = sum(durations)
+    measure_count = max(1, -(-total_ticks // measure_ticks))
+    tempo_measures = set(rng.sample(range(measure_count), min(tempo_changes, measure_count)))
+
+    measure = None
+    measure_number = 0
+    ticks_in_measure = measure_ticks
+    melody_index = 0
+    midi = rng.randint(LOWEST_MIDI, HIGHEST_MIDI)
+    for event, duration in zip(events, durations):
+        if ticks_in_measure >= measure_ticks:
+            measure_number += 1
+            measure = ET.SubElement(part, "measure", number=str(measure_number))
+            if measure_number == 1:
+                attributes = ET.SubElement(measure, "attributes")
+                ET.SubElement(attributes, "divisions").text = str(divisions)
+            if measure_number - 1 in tempo_measures:
+                direction = ET.SubElement(measure, "direction")
+                ET.SubElement(direction, "sound", tempo=str(rng.choice([60, 72, 90, 108, 120, 144])))
+            ticks_in_measure = 0
+
+        note = ET.SubElement(measure, "note")
+        if event == "rest":
+            ET.SubElement(note, "rest")
+            ET.SubElement(note, "duration").text = str(duration)
+        else:
+            # Stepwise motion with occasional leaps keeps the line violin-like
+            midi = min(HIGHEST_MIDI, max(LOWEST_MIDI, midi + rng.choice([-2, -1, 1, 2, 3, -3, 7, -7])))
+            _pitch_element(note, midi)
+            ET.SubElement(note, "duration").text = str(duration)
+            if melody_index in chord_positions:
+                chord_note = ET.SubElement(measure, "note")
+                ET.SubElement(chord_note, "chord")
+                _pitch_element(chord_note, min(HIGHEST_MIDI, midi + rng.choice([3, 4, 7])))
+                ET.SubElement(chord_note, "duration").text = str(duration)
+            melody_index += 1
+        ticks_in_measure += duration
+
+    return ET.ElementTree(root)
+
+
+def write_score(path, **kwargs):
+    """Generate a score with `generate_score(**kwargs)` and write it to `path`."""
+    tree = generate_score(**kwargs)
+    ET.indent(tree)
+    tree.write(path, encoding="UTF-8", xml_declaration=True)
+    return path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic MusicXML score for benchmarking.")
+    parser.add_argument("output", help="Output MusicXML file")
+    parser.add_argument("--notes", type=int, default=500, help="Number of notes (default: 500)")
+    parser.add_argument("--chord-density", type=float, default=0.1, help="Fraction of notes in chords (default: 0.1)")
+    parser.add_argument("--tempo-changes", type=int, default=4, help="Number of tempo changes (default: 4)")
+    parser.add_argument("--length", type=float, default=120.0, help="Length in seconds (default: 120)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args()
+
+    write_score(args.output, note_count=args.notes, chord_density=args.chord_density,
+                tempo_changes=args.tempo_changes, length=args.length, seed=args.seed)
+    print(f"Synthetic score written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
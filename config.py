@@ -6,6 +6,61 @@ Environment Variables Required:
 - SUPABASE_ANON_KEY: Your Supabase anonymous key
 - STREAMLIT_SERVER_ENVIRONMENT: Set to 'production' for production deployment
 
+Optional:
+- SUPABASE_JWT_SECRET: Project JWT secret; when set, HS256 session tokens are
+  signature-checked locally, otherwise each token is checked once with the
+  auth server (expiry is always checked locally)
+
+Optional job limits (set a limit to 0 to disable it):
+- OMR_TIMEOUT_SECONDS: Wall-clock limit for one oemer run (default: 300)
+- OMR_CPU_SECONDS: CPU-time rlimit for the oemer process (default: 600)
+- OMR_MEMORY_MB: Address-space rlimit for the oemer process (default: 8192)
+- RENDER_TIMEOUT_SECONDS: Wall-clock limit for one video render (default: 900)
+- RENDER_MEMORY_MB: Address-space rlimit for batch render workers (default: 4096)
+- MAX_SCORE_SECONDS: Longest score duration accepted for rendering (default: 1800)
+
+Optional render output:
+- RENDER_AUDIO: Set to 'true' to add a synthesized soundtrack to every video
+- RENDER_SEGMENTS: When to encode in cached segments so re-renders of an edited score
+  reuse unchanged parts: 'auto' (default) for files the user has rendered before,
+  under the same name; 'always'; or 'off'
+
+Optional storage limits for temp/ and xml_files/:
+- STORAGE_TTL_HOURS: Evict session artifacts unused for this long (default: 24)
+- STORAGE_QUOTA_MB: Evict least recently used artifacts above this total (default: 5120)
+- STORAGE_MIN_FREE_MB: Evict until at least this much disk stays free (default: 512)
+- STORAGE_SWEEP_INTERVAL_SECONDS: How often the janitor runs (default: 300)
+
+Optional per-user render library limits:
+- LIBRARY_TTL_DAYS: Drop library entries unused for this long (default: 30)
+- LIBRARY_USER_QUOTA_MB: Library space per user; least recently used entries go first (default: 1024)
+
+Optional HTTP API settings (api_server.py):
+- API_KEY: Bearer token required by the API; leave unset only on a private network
+- API_PORT: Port of the API (default: 8600)
+- API_WORKERS: Render workers started inside the API process (default: 2; 0 with separate workers)
+- API_MAX_QUEUE: Waiting jobs before new submissions and previews get 503 (default: 100)
+- API_MAX_PREVIEWS: Storyboards drawn at once in the API process; more get 503 (default: 2)
+- API_MAX_UPLOAD_MB: Largest accepted file (default: 200)
+
+Optional job queue settings (job_queue.py, worker.py):
+- JOB_QUEUE_ENABLED: Set to 'true' to hand uploads to worker processes instead of rendering in the app
+- JOB_QUEUE_DIR: Queue directory on the shared volume (default: xml_files/queue)
+- JOB_LEASE_SECONDS: A job is handed to another worker if not heartbeated for this long (default: 60)
+- JOB_HEARTBEAT_SECONDS: How often a worker renews its lease (default: 10)
+- JOB_MAX_ATTEMPTS: Workers that may die on one job before it is failed (default: 3)
+
+Optional load-adaptive quality for queue workers (adaptive_quality.py):
+- ADAPTIVE_QUALITY: Set to 'true' to render cheaper profiles while the queue is backed up,
+  with an upgrade re-render queued for when load drops
+- ADAPTIVE_QUEUE_DEPTH: Waiting jobs above which workers are under pressure (default: 4)
+- ADAPTIVE_CPU_LOAD: 1-minute load average per CPU above which workers are under pressure (default: 1.5)
+- ADAPTIVE_QUALITY_FLOOR: Cheapest profile a job is ever degraded to (default: draft)
+
+Optional service metrics (metrics.py):
+- MUSICSYNTH_METRICS_DIR: Directory of the per-request JSON lines file (default: ./metrics)
+- MUSICSYNTH_METRICS_PORT: Port of the local Prometheus endpoint, bound to 127.0.0.1 (default: 9464; 0 disables it)
+
 Create a .env file in your project root with these variables:
 SUPABASE_URL=your_supabase_project_url
 SUPABASE_ANON_KEY=your_supabase_anon_key
@@ -26,6 +81,53 @@ SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
 STREAMLIT_SERVER_ENVIRONMENT = os.getenv("STREAMLIT_SERVER_ENVIRONMENT", "local")
 IS_PRODUCTION = STREAMLIT_SERVER_ENVIRONMENT == "production"
 
+# Job limits
+OMR_TIMEOUT_SECONDS = int(os.getenv("OMR_TIMEOUT_SECONDS", "300"))
+OMR_CPU_SECONDS = int(os.getenv("OMR_CPU_SECONDS", "600"))
+OMR_MEMORY_MB = int(os.getenv("OMR_MEMORY_MB", "8192"))
+RENDER_TIMEOUT_SECONDS = int(os.getenv("RENDER_TIMEOUT_SECONDS", "900"))
+RENDER_MEMORY_MB = int(os.getenv("RENDER_MEMORY_MB", "4096"))
+MAX_SCORE_SECONDS = int(os.getenv("MAX_SCORE_SECONDS", "1800"))
+
+# Render output
+RENDER_AUDIO = os.getenv("RENDER_AUDIO", "false").lower() in ("1", "true", "yes")
+RENDER_SEGMENTS = os.getenv("RENDER_SEGMENTS", "auto").lower()
+
+# Storage limits
+STORAGE_TTL_HOURS = float(os.getenv("STORAGE_TTL_HOURS", "24"))
+STORAGE_QUOTA_MB = int(os.getenv("STORAGE_QUOTA_MB", "5120"))
+STORAGE_MIN_FREE_MB = int(os.getenv("STORAGE_MIN_FREE_MB", "512"))
+STORAGE_SWEEP_INTERVAL_SECONDS = int(os.getenv("STORAGE_SWEEP_INTERVAL_SECONDS", "300"))
+
+# Render library limits
+LIBRARY_TTL_DAYS = float(os.getenv("LIBRARY_TTL_DAYS", "30"))
+LIBRARY_USER_QUOTA_MB = int(os.getenv("LIBRARY_USER_QUOTA_MB", "1024"))
+
+# HTTP API
+API_KEY = os.getenv("API_KEY")
+API_PORT = int(os.getenv("API_PORT", "8600"))
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "100"))
+API_MAX_PREVIEWS = int(os.getenv("API_MAX_PREVIEWS", "2"))
+API_MAX_UPLOAD_MB = int(os.getenv("API_MAX_UPLOAD_MB", "200"))
+
+# Job queue
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "false").lower() in ("1", "true", "yes")
+JOB_QUEUE_DIR = os.getenv("JOB_QUEUE_DIR")
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Load-adaptive quality
+ADAPTIVE_QUALITY = os.getenv("ADAPTIVE_QUALITY", "false").lower() in ("1", "true", "yes")
+ADAPTIVE_QUEUE_DEPTH = int(os.getenv("ADAPTIVE_QUEUE_DEPTH", "4"))
+ADAPTIVE_CPU_LOAD = float(os.getenv("ADAPTIVE_CPU_LOAD", "1.5"))
+ADAPTIVE_QUALITY_FLOOR = os.getenv("ADAPTIVE_QUALITY_FLOOR", "draft")
+
+# Service metrics
+METRICS_DIR = os.getenv("MUSICSYNTH_METRICS_DIR")
+METRICS_PORT = int(os.getenv("MUSICSYNTH_METRICS_PORT", "9464"))
+
 # Validate required environment variables
 def validate_config():
     """Validate that all required environment variables are set"""
@@ -0,0 +1,169 @@
+"""
+Scrolling "falling notes" visualization.
+
+Notes fall down their fingerboard column and reach the fingerboard when
+they start to sound. The whole note lane is rasterized once into a tall
+strip, time running upwards, so a frame is only:
+
+- a copy of the cached fingerboard for the current set of sounding notes
+- a slice (a view) of the strip pasted into the lane
+- the title line
+
+None of this depends on how many notes the piece has. Strips larger than
+STRIP_MEMMAP_BYTES are backed by an anonymous temporary file instead of RAM.
+"""
+
+import tempfile
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from fingerboard_drawing import (BASE_FRAME_HEIGHT, FB_HEIGHT, TITLE_HEIGHT, STRING_COLORS, NOTE_COLOR,
+                                 SoundingNotes, fingerboard_layout, note_position, draw_fingerboard_base,
+                                 draw_active_note, label_font, title_band, title_text)
+
+# Scroll speed of the lane at the base frame height
+PIXELS_PER_SECOND = 120
+
+# Strips above this size are memory-mapped
+STRIP_MEMMAP_BYTES = 64 * 1024 * 1024
+
+# Rows rasterized per PIL tile when building the strip
+TILE_ROWS = 2048
+
+# Sizes at the base frame height
+# Room left and right of the fingerboard for notes at position 0 and 15
+LANE_MARGIN = 20
+NOTE_WIDTH = 24
+
+
+class FallingNotesRenderer:
+    # Nothing is drawn for the piece as a whole; the lane shows only the notes near the current time
+    static_positions = ()
+
+    def __init__(self, notes, duration, frame_size=(1280, 720), pixels_per_second=PIXELS_PER_SECOND):
+        self.notes = notes
+        self.frame_size = frame_size
+        width, height = frame_size
+        self.scale = scale = height / BASE_FRAME_HEIGHT
+        self.pixels_per_second = pixels_per_second * scale
+        self.title_height = int(round(TITLE_HEIGHT * scale))
+        self.lane_margin = int(round(LANE_MARGIN * scale))
+
+        # Fingerboard at the bottom, the lane between the title and the fingerboard
+        self.layout = fingerboard_layout(frame_size, fb_y=height - int(round((FB_HEIGHT + 40) * scale)))
+        self.fb_y = self.layout.fb_y
+        self.lane_x = self.layout.fb_x - self.lane_margin
+        self.lane_width = self.layout.width + 2 * self.lane_margin
+        self.lane_y = self.title_height
+        self.lane_height = self.fb_y - self.lane_y
+        # Seconds of music visible ahead of the current time
+        self.lookahead = self.lane_height / self.pixels_per_second
+
+        self._active = None
+        self._highlighted = None
+        self.sounding = SoundingNotes(notes)
+        self._strip_file = None
+        self.strip = self._rasterize_strip(duration)
+
+    # --- Strip ---
+
+    def _strip_row(self, t):
+        """Strip row of time `t`; time runs upwards, so later times have smaller rows."""
+        return self.strip_height - int(round(t * self.pixels_per_second))
+
+    def _rasterize_strip(self, duration):
+        self.strip_height = self.lane_height + int(np.ceil(duration * self.pixels_per_second))
+        shape = (self.strip_height, self.lane_width, 3)
+        if np.prod(shape) > STRIP_MEMMAP_BYTES:
+            self._strip_file = tempfile.TemporaryFile()
+            strip = np.memmap(self._strip_file, dtype=np.uint8, mode='w+', shape=shape)
+        else:
+            strip = np.zeros(shape, dtype=np.uint8)
+
+        # (top row, bottom row, x, color, label) per note, in strip coordinates
+        boxes = []
+        for note in self.notes:
+            note_pos = note_position(note)
+            if not note_pos:
+                continue
+            pos_x, string_idx = note_pos
+            top = self._strip_row(note["start_time"] + note["duration"])
+            bottom = self._strip_row(note["start_time"]) - 1
+            x = self.lane_margin + pos_x * self.layout.fret_spacing
+            boxes.append((top, bottom, x, STRING_COLORS[string_idx], note["note"][0]))
+
+        half_width = int(round(NOTE_WIDTH * self.scale)) // 2
+        radius = max(1, int(round(5 * self.scale)))
+        outline = max(1, int(round(3 * self.scale)))
+        font = label_font(self.scale)
+        for tile_top in range(0, self.strip_height, TILE_ROWS):
+            tile_bottom = min(tile_top + TILE_ROWS, self.strip_height)
+            tile = Image.new('RGB', (self.lane_width, tile_bottom - tile_top), color=(0, 0, 0))
+            draw = ImageDraw.Draw(tile)
+            # Column guides under the notes
+            for i in range(16):
+                x = self.lane_margin + i * self.layout.fret_spacing
+                draw.line([(x, 0), (x, tile_bottom - tile_top)], fill=(30, 30, 30), width=1)
+            for top, bottom, x, color, label in boxes:
+                if bottom < tile_top or top >= tile_bottom:
+                    continue
+                box = (x - half_width, top - tile_top, x + half_width, bottom - tile_top)
+                draw.rounded_rectangle(box, radius=radius, fill=NOTE_COLOR, outline=color, width=outline)
+                if bottom - top > 16 * self.scale:
+                    draw.text((x - 4 * self.scale, bottom - tile_top - 14 * self.scale), label, fill=(0, 0, 0), font=font)
+            strip[tile_top:tile_bottom] = np.asarray(tile)
+        return strip
+
+    # --- Frames ---
+
+    def _fingerboard(self, active):
+        """
+        Full frame with the fingerboard and the given notes highlighted.
+
+        Only the last one is kept, like FingerboardRenderer: frames come in
+        time order and the set of sounding notes changes far less often than
+        once per frame, while a cache of every set would grow with the piece.
+
+        Returns:
+            tuple: (frame array, labels of the active notes)
+        """
+        if active is not self._active:
+            img = Image.new('RGB', self.frame_size, color=(0, 0, 0))
+            draw = ImageDraw.Draw(img)
+            draw_fingerboard_base(draw, self.layout)
+            labels = []
+            for note_name, position in active:
+                label = draw_active_note(draw, {"note": note_name, "position": position}, self.layout)
+                if label:
+                    labels.append(label)
+            self._active = active
+            self._highlighted = (np.asarray(img), tuple(labels))
+        return self._highlighted
+
+    def frame(self, t, clock=None):
+        """Render the frame at score time `t` as an RGB array; the title shows `clock` if given."""
+        active = self.sounding.at(t)
+        fingerboard, labels = self._fingerboard(active)
+        frame = fingerboard.copy()
+
+        bottom = self._strip_row(t)
+        top = bottom - self.lane_height
+        if top >= 0:
+            frame[self.lane_y:self.fb_y, self.lane_x:self.lane_x + self.lane_width] = self.strip[top:bottom]
+        else:
+            # Before the start of the strip (t beyond the end of the piece): show what there is
+            visible = self.strip[0:bottom]
+            frame[self.fb_y - len(visible):self.fb_y, self.lane_x:self.lane_x + self.lane_width] = visible
+
+        frame[:self.title_height] = title_band(title_text(list(labels), t if clock is None else clock),
+                                                self.frame_size[0], self.scale)
+        return frame
+
+    def close(self):
+        """Release the strip and its backing file."""
+        self.strip = None
+        self._active = self._highlighted = None
+        if self._strip_file is not None:
+            self._strip_file.close()
+            self._strip_file = None
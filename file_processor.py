@@ -1,13 +1,36 @@
 import os
-import tempfile
+import hashlib
 import subprocess
+import threading
 import time
-from datetime import datetime
-import streamlit as st
-from synthesia import parse_musicxml, make_video
+from functools import lru_cache
+from measure_range import parse_measure_range
+from render_profiler import RenderProfiler
+from job_control import CancelToken, RenderCancelled, RenderTimeout, run_limited
+from storage_janitor import get_janitor
+from artifact_store import ArtifactStore
+from render_library import get_render_library
+from segment_cache import SegmentCache, RENDERER_VERSION
+import config
+import metrics
 import shutil
 import uuid
 
+# Settings every render uses; part of the render library key
+RENDER_SETTINGS = {'audio': config.RENDER_AUDIO}
+
+
+def render_settings_key(settings):
+    """Stable text form of render settings, e.g. 'audio=False,mode=fingerboard,profile=standard'."""
+    return ','.join(f"{name}={value}" for name, value in sorted(settings.items()))
+
+
+@lru_cache(maxsize=None)
+def find_oemer():
+    """Locate the oemer executable once per process; None if it is not installed."""
+    return shutil.which("oemer")
+
+
 class FileProcessor:
     def __init__(self):
         # Get the project root directory (where app.py is located)
@@ -25,7 +48,19 @@ class FileProcessor:
                 # Ensure existing directories have proper permissions
                 os.chmod(directory, 0o777)
         
-        self.timing_stats = {}
+        # Scores are stored once per unique content and hard-linked into sessions
+        self.artifact_store = ArtifactStore(self.xml_dir)
+        
+        # Past renders of signed-in users, re-served instead of re-rendered
+        self.library = get_render_library(os.path.join(self.xml_dir, 'library'), self.artifact_store)
+        
+        # Encoded segments of earlier renders, so re-uploads of an edited score only re-encode what changed;
+        # see `_use_segments` for which renders use it
+        self.segment_cache = SegmentCache(os.path.join(self.xml_dir, 'segments'))
+        
+        # Background TTL/quota eviction of old session artifacts (one per process)
+        self.janitor = get_janitor(self.temp_dir, extra_dirs=[self.xml_dir], artifact_store=self.artifact_store,
+                                   before_sweep=[self.library.expire], caches=[self.segment_cache])
         
         # Check if we're running in Streamlit Cloud
         is_streamlit_cloud = os.environ.get('STREAMLIT_SERVER_ENVIRONMENT') == 'cloud'
@@ -33,20 +68,17 @@ class FileProcessor:
         if is_streamlit_cloud:
             self.use_cloud_omr = True
         else:
-            try:
-                result = subprocess.run(["which", "oemer"], capture_output=True, text=True)
-                if result.returncode != 0:
-                    raise RuntimeError("Oemer executable not found. Please ensure it is installed and in your PATH.")
-                self.oemer_path = result.stdout.strip()
-                self.use_cloud_omr = False
+            self.oemer_path = find_oemer()
+            self.use_cloud_omr = self.oemer_path is None
+            if self.use_cloud_omr:
+                print("Error setting up Oemer: Oemer executable not found. Please ensure it is installed and in your PATH.")
+            else:
                 print(f"Oemer path: {self.oemer_path}")
-            except Exception as e:
-                print(f"Error setting up Oemer: {str(e)}")
-                self.use_cloud_omr = True
     
-    def process_uploaded_file(self, uploaded_file):
+    def process_uploaded_file(self, uploaded_file, progress_callback=None, cancel_token=None, user_id=None,
+                              mode="fingerboard", profile="standard", measures=None):
         """
-        Process an uploaded MusicXML or image file and generate a video visualization.
+        Process a file uploaded through Streamlit; see `process_file`.
         
         Args:
             uploaded_file: The uploaded file object from Streamlit
@@ -56,120 +88,452 @@ class FileProcessor:
         """
         if uploaded_file is None:
             return False, "No file uploaded", None
+        return self.process_file(uploaded_file.name, uploaded_file.getbuffer(), progress_callback=progress_callback,
+                                 cancel_token=cancel_token, user_id=user_id, mode=mode, profile=profile,
+                                 measures=measures)
+    
+    def process_file(self, filename, data, progress_callback=None, cancel_token=None, user_id=None,
+                     mode="fingerboard", profile="standard", measures=None, score_path=None):
+        """
+        Process a MusicXML or image file and generate a video visualization.
         
-        filename = uploaded_file.name.lower()
-        is_musicxml = filename.endswith('.musicxml') or filename.endswith('.xml')
-        is_image = filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg')
+        This is the processing core shared by the Streamlit app and the HTTP
+        API; it takes plain bytes, not framework objects. Per-stage timings
+        are recorded as a structured metrics record for every request,
+        whether it succeeds or fails.
         
-        if not (is_musicxml or is_image):
-            return False, "Please upload a MusicXML file (.musicxml, .xml) or an image file (.png, .jpg, .jpeg)", None
+        Args:
+            filename: Original file name; its extension selects MusicXML or OMR
+            data: File contents (bytes, bytearray or memoryview)
+            progress_callback: Optional callable receiving `RenderProgress` updates while the video renders
+            cancel_token: Optional `CancelToken` to cancel OMR or rendering from another thread
+            user_id: Signed-in user; a previous render of the same file is re-served
+                from their library, and new renders are added to it
+            mode: Visualization, one of `synthesia.VIDEO_MODES`
+            profile: Render quality, one of `render_profiles.RENDER_PROFILES`
+            measures: Optional measure range such as "17-32" to render only that excerpt
+            score_path: MusicXML already read from `data` (the OMR result its storyboard was drawn
+                from), rendered instead of recognising the image again; the library still keys
+                the video on `filename` and `data`
+            
+        Returns:
+            tuple: (success, message, output_path)
+        """
+        # Timings are kept per request so nothing leaks between uploads
+        record = {'filename': filename, 'profile': profile, 'stages': {}}
+        start = time.time()
+        success, message, output_path = self._process_file(
+            filename, data, record, progress_callback, cancel_token or CancelToken(), user_id,
+            mode, profile, measures, score_path
+        )
+        record['total_seconds'] = time.time() - start
+        record.setdefault('status', 'ok' if success else 'error')
+        if not success:
+            record['error'] = message
+        elif output_path and os.path.exists(output_path):
+            record['output_bytes'] = os.path.getsize(output_path)
+        metrics.registry.record_request(record)
+        return success, message, output_path
+    
+    def in_library(self, user_id, filename, data, mode="fingerboard", profile="standard", measures=None):
+        """
+        Whether `user_id` has a video of this upload with these settings in their library.
+
+        `process_file` re-serves such a video without OMR or rendering, so the
+        app skips the storyboard for it.
+        """
+        if not user_id:
+            return False
+        error, filename, is_image, measures = self._check_request(filename, measures)
+        if error:
+            return False
+        # The artifact store's digest, which the library is keyed on
+        input_digest = hashlib.sha256(data).hexdigest()
+        try:
+            return self.library.lookup(user_id, input_digest, self._settings_key(mode, profile, measures)) is not None
+        except Exception as e:
+            print(f"Could not check render library: {str(e)}")
+            return False
+    
+    def preview_uploaded_file(self, uploaded_file, cancel_token=None, mode="fingerboard", measures=None):
+        """
+        Storyboard of a file uploaded through Streamlit; see `preview_file`.
         
+        Returns:
+            tuple: (success, message, storyboard)
+        """
+        if uploaded_file is None:
+            return False, "No file uploaded", None
+        return self.preview_file(uploaded_file.name, uploaded_file.getbuffer(), cancel_token=cancel_token, mode=mode,
+                                 measures=measures)
+    
+    def preview_file(self, filename, data, cancel_token=None, mode="fingerboard", measures=None):
+        """
+        Read a MusicXML or image file and draw a storyboard of its video.
+        
+        A storyboard is a dozen keyframes drawn by the video's own frame
+        renderer, nothing encoded, so users can check that the score (and
+        for an image, the OMR result) was read right before a full render.
+        
+        Args:
+            filename: Original file name; its extension selects MusicXML or OMR
+            data: File contents (bytes, bytearray or memoryview)
+            cancel_token: Optional `CancelToken` to cancel OMR or drawing from another thread
+            mode: Visualization, one of `synthesia.VIDEO_MODES`
+            measures: Optional measure range such as "17-32" to preview only that excerpt
+            
+        Returns:
+            tuple: (success, message, storyboard); the storyboard is a
+            `storyboard.Storyboard` whose `score_path` is the MusicXML that
+            was read, so an image need not be recognised again for the render
+        """
+        # The renderer pulls in NumPy and PIL, so it is imported on first use rather than at app start-up
+        from synthesia import parse_musicxml
+        from storyboard import Storyboard, make_storyboard
+        
+        record = {'filename': filename, 'stages': {}}
+        stages = record['stages']
+        error, filename, is_image, measures = self._check_request(filename, measures)
+        if error:
+            return False, error, None
+        
+        session_dir = None
+        start = time.time()
+        # Same wall-clock limit as a render, so a preview can't hold a request thread longer than one
+        cancel_token = cancel_token or CancelToken()
+        if config.RENDER_TIMEOUT_SECONDS and cancel_token.deadline is None:
+            cancel_token.set_timeout(config.RENDER_TIMEOUT_SECONDS)
+        try:
+            session_dir, musicxml_path = self._start_session(filename, data, record)
+            if is_image:
+                success, message, musicxml_path = self._recognise(musicxml_path, session_dir, stages, cancel_token)
+                if not success:
+                    return False, message, None
+            cancel_token.check()
+            
+            parse_start = time.time()
+            notes = parse_musicxml(musicxml_path, measures=measures)
+            stages['parse'] = time.time() - parse_start
+            error = self._check_notes(notes, measures)
+            if error:
+                return False, error, None
+            
+            keyframes_start = time.time()
+            keyframes = make_storyboard(notes, mode=mode, measures=measures, cancel_token=cancel_token)
+            stages['storyboard'] = time.time() - keyframes_start
+            if not keyframes:
+                return False, f"No notes found in measures {measures[0]}-{measures[1]}", None
+            metrics.registry.observe('preview', time.time() - start)
+            return True, "Storyboard ready", Storyboard(keyframes, musicxml_path)
+        
+        except RenderCancelled as e:
+            print(f"Preview stopped: {str(e)}")
+            return False, f"Processing stopped: {str(e)}", None
+        except Exception as e:
+            print(f"Error previewing file: {str(e)}")
+            return False, f"Error previewing file: {str(e)}", None
+        finally:
+            if session_dir is not None:
+                self.janitor.mark_inactive(session_dir)
+    
+    def _process_file(self, filename, data, record, progress_callback, cancel_token, user_id, mode, profile,
+                      measures, score_path):
+        """Run the processing stages, filling `record` with stage timings."""
+        from synthesia import parse_musicxml, make_video
+        
+        stages = record['stages']
+        error, filename, is_image, measures = self._check_request(filename, measures)
+        if error:
+            return False, error, None
+        
+        session_dir = None
         try:
-            # Create a unique session directory using UUID
-            session_id = str(uuid.uuid4())
-            session_dir = os.path.join(self.temp_dir, f"session_{session_id}")
-            os.makedirs(session_dir, mode=0o777, exist_ok=True)
-            print(f"Created session directory: {session_dir}")
-            
-            # Save the uploaded file to the session directory
-            save_start = time.time()
-            temp_file_path = os.path.join(session_dir, uploaded_file.name)
-            print(f"Saving uploaded file to: {temp_file_path}")
-            with open(temp_file_path, 'wb') as f:
-                f.write(uploaded_file.getbuffer())
-            # Ensure file has proper permissions
-            os.chmod(temp_file_path, 0o666)
-            self.timing_stats['file_save'] = time.time() - save_start
+            session_dir, temp_file_path = self._start_session(filename, data, record)
+            input_digest = record['input_digest']
+            
+            # Same file rendered before with the same settings: re-serve it from the user's library
+            settings = self._render_settings(mode, profile, measures)
+            settings_key = self._settings_key(mode, profile, measures)
+            if user_id:
+                entry = self.library.lookup(user_id, input_digest, settings_key)
+                if entry is not None:
+                    output_path = os.path.join(session_dir, entry['video_name'])
+                    self.artifact_store.link_into(entry['video_digest'], output_path)
+                    record['status'] = 'library'
+                    print(f"Re-served video from render library: {output_path}")
+                    return True, "Loaded from your library, no re-render needed", output_path
             
             # If image, process it based on environment
-            if is_image:
-                if self.use_cloud_omr:
-                    return False, "Image processing is currently not supported in the cloud environment. Please upload a MusicXML file instead.", None
-                else:
-                    # Use Oemer for local processing
-                    print(f"Running Oemer on image: {temp_file_path}")
-                    cmd = [self.oemer_path, "-o", session_dir, "--save-cache", "-d", temp_file_path]
-                    oemer_start = time.time()
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    if result.returncode != 0:
-                        print(f"Oemer failed with error: {result.stderr}")
-                        return False, f"Oemer failed: {result.stderr}", None
-                    self.timing_stats['oemer_processing'] = time.time() - oemer_start
-                    
-                    # Find the output MusicXML file
-                    basename = os.path.splitext(os.path.basename(temp_file_path))[0]
-                    musicxml_path = os.path.join(session_dir, f"{basename}.musicxml")
-                    if not os.path.exists(musicxml_path):
-                        musicxml_path = os.path.join(session_dir, f"{basename}.xml")
-                        if not os.path.exists(musicxml_path):
-                            print(f"Oemer did not produce a MusicXML file for {basename}")
-                            return False, f"Oemer did not produce a MusicXML file for {basename}", None
-                    
-                    # Save a copy of the MusicXML file in the xml_files directory
-                    xml_filename = f"{basename}_{session_id}.musicxml"
-                    xml_save_path = os.path.join(self.xml_dir, xml_filename)
-                    shutil.copy2(musicxml_path, xml_save_path)
-                    os.chmod(xml_save_path, 0o666)  # Ensure XML file has proper permissions
-                    print(f"Saved MusicXML file to: {xml_save_path}")
-                    
-                    print(f"Oemer produced MusicXML file: {musicxml_path}")
+            record['input_type'] = 'image' if is_image else 'musicxml'
+            if score_path is not None:
+                # Recognised for the storyboard already
+                musicxml_path = score_path
+                score_digest, _ = self.artifact_store.put_file(musicxml_path)
+                print(f"Using MusicXML read for the storyboard: {musicxml_path}")
+            elif is_image:
+                success, message, musicxml_path = self._recognise(temp_file_path, session_dir, stages, cancel_token)
+                if not success:
+                    return False, message, None
+                # Keep the recognised MusicXML in the artifact store (linked, not copied)
+                score_digest, _ = self.artifact_store.put_file(musicxml_path)
+                print(f"Stored MusicXML file as: {self.artifact_store.path(score_digest)}")
             else:
                 # Use the uploaded MusicXML file
                 musicxml_path = temp_file_path
-                # Save a copy in the xml_files directory
-                xml_filename = f"{os.path.splitext(os.path.basename(musicxml_path))[0]}_{session_id}.musicxml"
-                xml_save_path = os.path.join(self.xml_dir, xml_filename)
-                shutil.copy2(musicxml_path, xml_save_path)
-                os.chmod(xml_save_path, 0o666)  # Ensure XML file has proper permissions
-                print(f"Saved MusicXML file to: {xml_save_path}")
+                score_digest = input_digest
                 print(f"Using uploaded MusicXML file: {musicxml_path}")
             
+            # Opt-in profiling (MUSICSYNTH_PROFILE=1) writes a report next to the video.
+            # Otherwise a lightweight profiler is still used to split render and encode time.
+            profiler = RenderProfiler.from_env()
+            write_profile = profiler is not None
+            if write_profile:
+                profiler.start()
+            else:
+                profiler = RenderProfiler(trace_memory=False)
+            
             # Parse the MusicXML file
             print(f"Parsing MusicXML file: {musicxml_path}")
-            notes = parse_musicxml(musicxml_path)
+            parse_start = time.time()
+            # An excerpt is located with the measure index; the score is not read past its end
+            notes = parse_musicxml(musicxml_path, measures=measures)
+            stages['parse'] = time.time() - parse_start
+            profiler.add_stage_time('parse', stages['parse'])
+            record['score_digest'] = score_digest
+            record['notes'] = len(notes)
+            
+            error = self._check_notes(notes, measures)
+            if error:
+                return False, error, None
             
-            # Generate output video path
-            output_filename = os.path.splitext(os.path.basename(musicxml_path))[0] + '_visualization.mp4'
+            # Generate output video path, named after the upload (an image's MusicXML shares its name)
+            output_filename = os.path.splitext(filename)[0] + '_visualization.mp4'
+            if measures is not None:
+                output_filename = output_filename.replace('_visualization', f"_m{settings['measures']}_visualization")
             output_path = os.path.join(session_dir, output_filename)
             
             # Create the video
             print(f"Generating video: {output_path}")
-            video_start = time.time()
-            make_video(notes, output_file=output_path)
+            if config.RENDER_TIMEOUT_SECONDS and cancel_token.deadline is None:
+                cancel_token.set_timeout(config.RENDER_TIMEOUT_SECONDS)
+            segment_cache = self.segment_cache if self._use_segments(user_id, filename) else None
+            try:
+                make_video(notes, output_file=output_path, profiler=profiler, progress_callback=progress_callback,
+                           cancel_token=cancel_token, segment_cache=segment_cache, **settings)
+            except RenderCancelled:
+                # Don't leave a half-written video behind
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise
             os.chmod(output_path, 0o666)  # Ensure video file has proper permissions
-            self.timing_stats['video_generation'] = time.time() - video_start
+            stages['render'] = profiler.stages.get('draw', 0.0)
+            stages['encode'] = profiler.stages.get('encode', 0.0)
+            if segment_cache is not None:
+                record['segments'] = profiler.counts.get('segments', 0)
+                record['segments_reused'] = profiler.counts.get('segments_reused', 0)
+            
+            if write_profile:
+                profiler.stop()
+                for path in profiler.write_report(output_path):
+                    print(f"Profile written: {path}")
             
-            # Log timing statistics
-            self._log_timing_stats(uploaded_file.name, session_dir)
+            if user_id:
+                try:
+                    self.library.add(user_id, filename, input_digest, settings_key, output_path)
+                except Exception as e:
+                    # The video is still served from the session; it just won't be remembered
+                    print(f"Could not add video to render library: {str(e)}")
             
             return True, "Video generated successfully", output_path
             
+        except RenderCancelled as e:
+            record['status'] = 'timeout' if isinstance(e, RenderTimeout) else 'cancelled'
+            print(f"Processing stopped: {str(e)}")
+            return False, f"Processing stopped: {str(e)}", None
         except Exception as e:
             print(f"Error processing file: {str(e)}")
             return False, f"Error processing file: {str(e)}", None
+        finally:
+            if session_dir is not None:
+                self.janitor.mark_inactive(session_dir)
+    
+    def _check_request(self, filename, measures):
+        """
+        Validate the file name and measure range of a request.
+        
+        Returns:
+            tuple: (error message or None, safe file name, is_image, measures as a (first, last) tuple or None)
+        """
+        # Only the base name is used, so a client-supplied name cannot escape the session directory
+        filename = os.path.basename(filename or '')
+        lower_name = filename.lower()
+        is_musicxml = lower_name.endswith('.musicxml') or lower_name.endswith('.xml')
+        is_image = lower_name.endswith('.png') or lower_name.endswith('.jpg') or lower_name.endswith('.jpeg')
+        
+        if not (is_musicxml or is_image):
+            return ("Please upload a MusicXML file (.musicxml, .xml) or an image file (.png, .jpg, .jpeg)",
+                    filename, is_image, None)
+        if measures:
+            try:
+                measures = parse_measure_range(measures) if isinstance(measures, str) else tuple(measures)
+            except ValueError as e:
+                return str(e), filename, is_image, None
+        else:
+            measures = None
+        return None, filename, is_image, measures
+    
+    def _render_settings(self, mode, profile, measures):
+        """Keyword arguments of `make_video` for a request."""
+        settings = dict(RENDER_SETTINGS, mode=mode, profile=profile)
+        if measures is not None:
+            settings['measures'] = f"{measures[0]}-{measures[1]}"
+        return settings
+    
+    def _settings_key(self, mode, profile, measures):
+        """Render library key of the settings of a request."""
+        # The renderer version is part of the key, so videos drawn by older code are not re-served
+        return render_settings_key(dict(self._render_settings(mode, profile, measures), renderer=RENDERER_VERSION))
+    
+    def _check_notes(self, notes, measures):
+        """
+        Check that a parsed score has notes and is short enough to render.
         
-    def cleanup(self):
-        """Clean up temporary files"""
+        Returns:
+            str or None: Error message
+        """
+        if not notes:
+            if measures is not None:
+                return f"No notes found in measures {measures[0]}-{measures[1]}"
+            return "No notes found in the MusicXML file"
+        score_seconds = notes[-1]["start_time"] + notes[-1]["duration"]
+        if measures is not None:
+            score_seconds -= notes.measures.span(*measures)[0]
+        if config.MAX_SCORE_SECONDS and score_seconds > config.MAX_SCORE_SECONDS:
+            return (f"The score lasts {score_seconds / 60:.0f} minutes, which is longer than the "
+                    f"{config.MAX_SCORE_SECONDS / 60:.0f} minute limit")
+        return None
+    
+    def _start_session(self, filename, data, record):
+        """
+        Create a session directory, marked active, and save the upload into it.
+        
+        Returns:
+            tuple: (session directory, path of the saved file)
+        """
+        # Make room before writing anything, rather than failing halfway with ENOSPC
+        self.janitor.ensure_free_space()
+        
+        # Create a unique session directory using UUID
+        session_id = str(uuid.uuid4())
+        record['request_id'] = session_id
+        session_dir = os.path.join(self.temp_dir, f"session_{session_id}")
+        os.makedirs(session_dir, mode=0o777, exist_ok=True)
+        # Keep the janitor away from this directory while the job runs
+        self.janitor.mark_active(session_dir)
+        print(f"Created session directory: {session_dir}")
+        
+        # Save the uploaded file to the session directory
+        save_start = time.time()
+        temp_file_path = os.path.join(session_dir, filename)
+        print(f"Saving uploaded file to: {temp_file_path}")
+        # Hashed while written into the artifact store, then linked into the session
+        input_digest, input_size = self.artifact_store.put_buffer(data, link_to=temp_file_path)
+        record['input_digest'] = input_digest
+        record['input_bytes'] = input_size
+        record['stages']['file_save'] = time.time() - save_start
+        return session_dir, temp_file_path
+    
+    def _use_segments(self, user_id, filename):
+        """
+        Whether to encode a render in cached segments (RENDER_SEGMENTS).
+
+        Segmenting costs an extra pass joining the segments, and only pays off
+        when the same score is rendered again after an edit. With 'auto' it is
+        used for files the user already has in their library under this name.
+        """
+        if config.RENDER_SEGMENTS == 'always':
+            return True
+        if config.RENDER_SEGMENTS != 'auto' or not user_id:
+            return False
+        try:
+            return self.library.has_filename(user_id, filename)
+        except Exception as e:
+            print(f"Could not check render library: {str(e)}")
+            return False
+
+    def _recognise(self, image_path, session_dir, stages, cancel_token):
+        """
+        Run OMR on a sheet music image, writing the MusicXML into the session directory.
+        
+        Returns:
+            tuple: (success, message, musicxml_path)
+        """
+        if self.use_cloud_omr:
+            return False, "Image processing is currently not supported in the cloud environment. Please upload a MusicXML file instead.", None
+        # Use Oemer for local processing
+        print(f"Running Oemer on image: {image_path}")
+        cmd = [self.oemer_path, "-o", session_dir, "--save-cache", "-d", image_path]
+        oemer_start = time.time()
         try:
-            # Clean up all session directories
-            for item in os.listdir(self.temp_dir):
-                item_path = os.path.join(self.temp_dir, item)
-                if os.path.isdir(item_path) and item.startswith('session_'):
+            result = run_limited(cmd, timeout=config.OMR_TIMEOUT_SECONDS or None,
+                                 cpu_seconds=config.OMR_CPU_SECONDS or None,
+                                 memory_mb=config.OMR_MEMORY_MB or None,
+                                 cancel_token=cancel_token)
+        except subprocess.TimeoutExpired:
+            print(f"Oemer timed out after {config.OMR_TIMEOUT_SECONDS} seconds")
+            return False, f"Sheet music recognition took longer than {config.OMR_TIMEOUT_SECONDS} seconds and was stopped", None
+        if result.returncode != 0:
+            print(f"Oemer failed with error: {result.stderr}")
+            return False, f"Oemer failed: {result.stderr}", None
+        stages['omr'] = time.time() - oemer_start
+        
+        # Find the output MusicXML file
+        basename = os.path.splitext(os.path.basename(image_path))[0]
+        musicxml_path = os.path.join(session_dir, f"{basename}.musicxml")
+        if not os.path.exists(musicxml_path):
+            musicxml_path = os.path.join(session_dir, f"{basename}.xml")
+            if not os.path.exists(musicxml_path):
+                print(f"Oemer did not produce a MusicXML file for {basename}")
+                return False, f"Oemer did not produce a MusicXML file for {basename}", None
+        
+        print(f"Oemer produced MusicXML file: {musicxml_path}")
+        return True, "Sheet music recognised", musicxml_path
+        
+    def cleanup(self, session_dirs=None):
+        """
+        Clean up temporary files.
+        
+        Args:
+            session_dirs: Session directories to remove (e.g. the current user's).
+                If None, every session directory is considered. Directories of
+                jobs that are still running are always skipped.
+        """
+        try:
+            if session_dirs is None:
+                session_dirs = [os.path.join(self.temp_dir, item) for item in os.listdir(self.temp_dir)
+                                if item.startswith('session_')]
+            for item_path in session_dirs:
+                if os.path.isdir(item_path) and not self.janitor.is_active(item_path):
                     shutil.rmtree(item_path, ignore_errors=True)
             # Recreate the base temp directory with proper permissions
             os.makedirs(self.temp_dir, mode=0o777, exist_ok=True)
         except Exception as e:
             print(f"Error during cleanup: {str(e)}")
+
+
+_file_processor = None
+_file_processor_lock = threading.Lock()
+
+
+def get_file_processor():
+    """
+    Return the process-wide FileProcessor.
     
-    def _log_timing_stats(self, filename, session_dir):
-        """Log timing statistics to a file."""
-        log_entry = f"\n{datetime.now()}\n"
-        log_entry += f"File: {filename}\n"
-        for step, duration in self.timing_stats.items():
-            log_entry += f"{step}: {duration:.2f} seconds\n"
-        log_entry += "-" * 50
-        
-        log_path = os.path.join(session_dir, 'processing_stats.log')
-        with open(log_path, 'a') as f:
-            f.write(log_entry)
-        os.chmod(log_path, 0o666)  # Ensure log file has proper permissions 
\ No newline at end of file
+    It holds no per-request state, so every Streamlit session shares one
+    instance instead of repeating directory setup and tool discovery.
+    """
+    global _file_processor
+    with _file_processor_lock:
+        if _file_processor is None:
+            _file_processor = FileProcessor()
+    return _file_processor
@@ -0,0 +1,201 @@
+"""
+Drawing shared by the visualizations: the fingerboard, its note dots and
+labels, the title line, and the set of notes sounding at any time.
+
+Sizes are given at BASE_FRAME_HEIGHT and scaled to the frame height through
+a FingerboardLayout, so every profile draws the same picture.
+"""
+
+import bisect
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from fingering import default_position
+
+# Violin string notes (G3, D4, A4, E5)
+VIOLIN_STRINGS = ["G", "D", "A", "E"]
+STRING_COLORS = [(139, 69, 19), (165, 42, 42), (205, 133, 63), (210, 180, 140)]  # Brown colors for strings
+NOTE_COLOR = (0, 191, 255)  # Deep sky blue for notes
+HIGHLIGHT_COLOR = (255, 0, 0)  # Red for currently playing note
+
+# Define the fingerboard dimensions, at the base frame height of 720 pixels
+BASE_FRAME_HEIGHT = 720
+FB_WIDTH = 800
+FB_HEIGHT = 300
+STRING_SPACING = FB_HEIGHT // 5
+FRET_SPACING = FB_WIDTH // 16
+NOTE_RADIUS = 10
+# Band at the top of the frame that holds the title line
+TITLE_HEIGHT = 60
+
+# Fingerboard geometry in pixels for one frame size; everything scales with the frame height
+FingerboardLayout = namedtuple('FingerboardLayout', ['fb_x', 'fb_y', 'width', 'height', 'string_spacing',
+                                                     'fret_spacing', 'scale'])
+
+
+def fingerboard_layout(frame_size, fb_y=None):
+    """Layout of a fingerboard centred in `frame_size`, or with its top edge at `fb_y`."""
+    scale = frame_size[1] / BASE_FRAME_HEIGHT
+    width = int(round(FB_WIDTH * scale))
+    height = int(round(FB_HEIGHT * scale))
+    if fb_y is None:
+        fb_y = (frame_size[1] - height) // 2
+    return FingerboardLayout((frame_size[0] - width) // 2, fb_y, width, height, height // 5, width // 16, scale)
+
+
+@lru_cache(maxsize=None)
+def title_font(scale=1.0):
+    """Load the title font once per process and scale instead of once per frame."""
+    try:
+        return ImageFont.truetype("Arial", int(round(24 * scale)))
+    except Exception:
+        return ImageFont.load_default(size=max(1, int(round(10 * scale))))
+
+
+@lru_cache(maxsize=None)
+def label_font(scale=1.0):
+    """Font for string, position and note labels."""
+    return ImageFont.load_default(size=max(1, int(round(10 * scale))))
+
+
+# Notes are placed on the fingerboard by the fingering engine (fingering.py):
+# column 0 is the open string, each further column one semitone higher.
+
+def note_position(note):
+    """(position, string index) of a note on the fingerboard, or None if it is out of range."""
+    if "position" in note:
+        return note["position"]
+    # Notes that didn't come from parse_musicxml
+    return default_position(note["note"])
+
+
+def position_label(pos_x):
+    """Finger position label for a fingerboard column: 0, -1, 1, 2, 2+, 3, ..."""
+    if pos_x == 0:
+        return "0"
+    elif pos_x == 1:
+        return "-1"
+    elif pos_x == 2:
+        return "1"
+    elif pos_x == 3:
+        return "2"
+    elif pos_x == 4:
+        return "2+"
+    else: # pos_x >= 5
+        return str(pos_x - 2)
+
+
+def draw_fingerboard_base(draw, layout):
+    """Draw the fingerboard, strings and position labels, without any notes."""
+    fb_x, fb_y, width, height = layout.fb_x, layout.fb_y, layout.width, layout.height
+    scale = layout.scale
+    font = label_font(scale)
+    
+    # Draw the fingerboard
+    draw.rectangle([fb_x, fb_y, fb_x + width, fb_y + height], fill=(50, 50, 50), outline=(100, 100, 100))
+    
+    # Draw the strings
+    for i, string in enumerate(VIOLIN_STRINGS):
+        y = fb_y + (i + 1) * layout.string_spacing
+        draw.line([(fb_x, y), (fb_x + width, y)], fill=STRING_COLORS[i], width=max(1, int(round(3 * scale))))
+        # Label the strings
+        draw.text((fb_x - 30 * scale, y - 10 * scale), string, fill=(255, 255, 255), font=font)
+    
+    # Draw fret markers and label the positions
+    # Label position 0
+    draw.text((fb_x - 5 * scale, fb_y - 20 * scale), "0", fill=(150, 150, 150), font=font)
+    # Label the rest of the positions
+    for i in range(1, 16):
+        x = fb_x + i * layout.fret_spacing
+        draw.line([(x, fb_y), (x, fb_y + height)], fill=(100, 100, 100), width=1)
+        # Adjust x-position for better alignment
+        draw.text((x - 5 * scale, fb_y - 20 * scale), position_label(i), fill=(150, 150, 150), font=font)
+
+
+def note_center(note_pos, layout):
+    pos_x, string_idx = note_pos
+    return layout.fb_x + pos_x * layout.fret_spacing, layout.fb_y + (string_idx + 1) * layout.string_spacing
+
+
+def draw_note_dot(draw, note_pos, layout, color):
+    x, y = note_center(note_pos, layout)
+    r = NOTE_RADIUS * layout.scale
+    draw.ellipse((x - r, y - r, x + r, y + r), fill=color, outline=(255, 255, 255))
+
+
+def draw_active_note(draw, note, layout):
+    """
+    Highlight a sounding note and label it with its finger position.
+    
+    Returns:
+        str or None: The label (e.g. 'E1', 'C2+'), or None if the note is off the fingerboard
+    """
+    note_pos = note_position(note)
+    if not note_pos:
+        return None
+    
+    # Draw the active note in highlight color (overwriting if necessary)
+    draw_note_dot(draw, note_pos, layout, HIGHLIGHT_COLOR)
+    
+    # Display note name above using the finger position label
+    step = note["note"][0]  # Get the note letter (e.g., 'E')
+    label = f"{step}{position_label(note_pos[0])}"
+    x, y = note_center(note_pos, layout)
+    draw.text((x - 15 * layout.scale, y - 30 * layout.scale), label, fill=(255, 255, 255), font=label_font(layout.scale))
+    return label
+
+
+def title_text(active_note_names, current_time):
+    # Display active note name(s) at the top, or just the time
+    if active_note_names:
+        return f"Now Playing: {', '.join(active_note_names)} (Time: {current_time:.2f}s)"
+    return f"Time: {current_time:.2f}s"
+
+
+@lru_cache(maxsize=8)
+def empty_fingerboard_image(frame_size):
+    """Canvas with the fingerboard and its labels drawn, shared by every frame of that size; copy before drawing."""
+    img = Image.new('RGB', frame_size, color=(0, 0, 0))
+    draw_fingerboard_base(ImageDraw.Draw(img), fingerboard_layout(frame_size))
+    return img
+
+
+def title_band(text, frame_width, scale):
+    """The title line as an RGB array, TITLE_HEIGHT rows (scaled) tall."""
+    img = Image.new('RGB', (frame_width, int(round(TITLE_HEIGHT * scale))), color=(0, 0, 0))
+    ImageDraw.Draw(img).text((frame_width // 2 - 150 * scale, 30 * scale), text, fill=(255, 255, 255),
+                             font=title_font(scale))
+    return np.asarray(img)
+
+
+class SoundingNotes:
+    """
+    The notes sounding at any time, as a tuple of (name, position) in score order.
+    
+    The sets are computed once for every interval between note boundaries,
+    so a lookup is a binary search and the same tuple object is returned for
+    the whole interval.
+    """
+    def __init__(self, notes):
+        ends = [note["start_time"] + note["duration"] for note in notes]
+        self.boundaries = sorted({note["start_time"] for note in notes} | set(ends))
+        by_start = sorted(range(len(notes)), key=lambda i: notes[i]["start_time"])
+        by_end = sorted(range(len(notes)), key=ends.__getitem__)
+        self.sets = []
+        active = set()
+        next_start = next_end = 0
+        for boundary in self.boundaries:
+            while next_start < len(by_start) and notes[by_start[next_start]]["start_time"] <= boundary:
+                active.add(by_start[next_start])
+                next_start += 1
+            while next_end < len(by_end) and ends[by_end[next_end]] <= boundary:
+                active.discard(by_end[next_end])
+                next_end += 1
+            self.sets.append(tuple((notes[i]["note"], notes[i]["position"]) for i in sorted(active)))
+    
+    def at(self, t):
+        i = bisect.bisect_right(self.boundaries, t) - 1
+        return self.sets[i] if i >= 0 else ()
@@ -0,0 +1,136 @@
+"""
+Fingering engine: picks a string and position for every note of a score.
+
+Most violin notes can be played on more than one string. For each pitch
+FINGERING_OPTIONS lists every (position, string index) on the fingerboard
+that produces it, and `assign_fingering` runs a dynamic-programming pass
+over the notes in time order to choose the sequence with the least hand
+movement, keeping notes that sound together on different strings. There
+are at most four options per note, so the pass is linear in the number of
+notes.
+"""
+
+import re
+from functools import lru_cache
+
+# Open strings G3, D4, A4, E5 as MIDI note numbers, in fingerboard order
+OPEN_STRING_MIDI = (55, 62, 69, 76)
+
+# Fingerboard columns per string, one semitone apart; column 0 is the open string
+POSITIONS = 16
+
+STEP_SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+
+def _build_options():
+    options = {}
+    for string_idx, open_midi in enumerate(OPEN_STRING_MIDI):
+        for position in range(POSITIONS):
+            options.setdefault(open_midi + position, []).append((position, string_idx))
+    return {midi: tuple(choices) for midi, choices in options.items()}
+
+
+# Every playable (position, string index) per MIDI pitch
+FINGERING_OPTIONS = _build_options()
+
+# The hand covers this many columns without shifting
+HAND_SPAN = 4
+SHIFT_COST = 1.0
+STRING_CROSSING_COST = 0.3
+# Slight preference for low positions, where notes are easiest to find
+POSITION_COST = 0.05
+# Two notes sounding together can't be stopped on the same string
+SAME_STRING_CHORD_COST = 100.0
+
+_NOTE_NAME = re.compile(r"^([A-G])(#{1,2}|b{1,2})?(-?\d+)$")
+
+
+@lru_cache(maxsize=None)
+def note_to_midi(note_name):
+    """MIDI number of a note name such as 'C#4' or 'Bb3', or None if it can't be read."""
+    match = _NOTE_NAME.match(note_name)
+    if not match:
+        return None
+    step, accidental, octave = match.groups()
+    alter = 0
+    if accidental:
+        alter = len(accidental) if accidental[0] == "#" else -len(accidental)
+    return 12 * (int(octave) + 1) + STEP_SEMITONES[step] + alter
+
+
+def fingering_options(note_name):
+    """All (position, string index) choices for a note; empty if it is off the fingerboard."""
+    return FINGERING_OPTIONS.get(note_to_midi(note_name), ())
+
+
+def default_position(note_name):
+    """Best choice for a note on its own: the lowest position."""
+    options = fingering_options(note_name)
+    return min(options) if options else None
+
+
+def _transition_cost(previous, current, overlapping):
+    prev_pos, prev_string = previous
+    pos, string = current
+    cost = STRING_CROSSING_COST * abs(string - prev_string)
+    if overlapping and string == prev_string:
+        cost += SAME_STRING_CHORD_COST
+    # Open strings need no stopping finger, so they never force a shift
+    if pos and prev_pos:
+        cost += SHIFT_COST * max(0, abs(pos - prev_pos) - HAND_SPAN) + 0.1 * abs(pos - prev_pos)
+    return cost
+
+
+def assign_fingering(notes):
+    """
+    Store the chosen (position, string index) in each note's "position" key.
+
+    Notes that can't be played on the violin get None. The notes are
+    updated in place and returned.
+
+    A state of the pass is the choice for the current note together with
+    the choices of the earlier notes still sounding when it starts, so
+    every note of a chord is kept off the strings of all the others, not
+    just the one before it. A violin sounds at most four notes at once,
+    so a state holds at most a few notes and the pass stays linear.
+    """
+    playable = []
+    for note in sorted(notes, key=lambda n: n["start_time"]):
+        options = fingering_options(note["note"])
+        if options:
+            playable.append((note, options))
+        else:
+            note["position"] = None
+    if not playable:
+        return notes
+
+    def sounding_at(j, i):
+        earlier, later = playable[j][0], playable[i][0]
+        return later["start_time"] < earlier["start_time"] + earlier["duration"]
+
+    # A state is a tuple of (note index, option), the current note last;
+    # steps[i] maps each state ending in note i to (cost, previous state)
+    steps = [{((0, option),): (POSITION_COST * option[0], None) for option in playable[0][1]}]
+    for i in range(1, len(playable)):
+        options = playable[i][1]
+        overlapping = sounding_at(i - 1, i)
+        states = {}
+        for state, (cost, _) in steps[-1].items():
+            previous = state[-1][1]
+            held = tuple((j, option) for j, option in state if sounding_at(j, i))
+            for option in options:
+                new_cost = cost + _transition_cost(previous, option, overlapping) + POSITION_COST * option[0]
+                # Notes sounding from before the previous one; the previous note's clash is in the transition
+                new_cost += sum(SAME_STRING_CHORD_COST for j, other in held
+                                if j != i - 1 and other[1] == option[1])
+                key = held + ((i, option),)
+                if key not in states or new_cost < states[key][0]:
+                    states[key] = (new_cost, state)
+        steps.append(states)
+
+    # Walk back from the cheapest final state
+    state = min(steps[-1], key=lambda key: steps[-1][key][0])
+    for i in range(len(playable) - 1, -1, -1):
+        playable[i][0]["position"] = state[-1][1]
+        state = steps[i][state][1]
+    return notes
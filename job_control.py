@@ -0,0 +1,135 @@
+"""
+Cancellation, timeouts and resource limits for OMR and render jobs.
+
+Render jobs check a `CancelToken` between frames, so they stop promptly
+when a user cancels or a wall-clock deadline passes. Child processes such
+as oemer run in their own process group with CPU and address-space
+rlimits and are killed as a group on timeout or cancellation, so one bad
+input cannot pin a core or exhaust memory on the node.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; limits are skipped there
+    resource = None
+
+
+class RenderCancelled(Exception):
+    """Raised inside a job when its CancelToken has been cancelled."""
+
+
+class RenderTimeout(RenderCancelled):
+    """Raised inside a job when its wall-clock deadline has passed."""
+
+
+class CancelToken:
+    def __init__(self, timeout=None):
+        self._event = threading.Event()
+        self.deadline = None
+        self.timeout = None
+        if timeout:
+            self.set_timeout(timeout)
+
+    def set_timeout(self, seconds):
+        """Start (or restart) a wall-clock deadline `seconds` from now."""
+        self.timeout = seconds
+        self.deadline = time.monotonic() + seconds
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def remaining(self):
+        """Seconds until the deadline, or None if there is no deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """Raise if the job has been cancelled or has run past its deadline."""
+        if self._event.is_set():
+            raise RenderCancelled("Job was cancelled")
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise RenderTimeout(f"Job exceeded its time limit of {self.timeout:g} seconds")
+
+
+def apply_resource_limits(cpu_seconds=None, memory_mb=None):
+    """
+    Apply CPU-time and address-space limits to the current process.
+
+    Used as a subprocess `preexec_fn` and as a process pool initializer.
+    """
+    if resource is None:
+        return
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def run_limited(cmd, timeout=None, cpu_seconds=None, memory_mb=None, cancel_token=None, poll_interval=0.5):
+    """
+    Run a command with a wall-clock timeout, rlimits and cooperative cancellation.
+
+    Args:
+        cmd: Command list for subprocess
+        timeout: Wall-clock limit in seconds
+        cpu_seconds: RLIMIT_CPU for the child
+        memory_mb: RLIMIT_AS for the child, in MB
+        cancel_token: Optional CancelToken polled while the command runs
+
+    Returns:
+        subprocess.CompletedProcess with text stdout/stderr
+
+    Raises:
+        subprocess.TimeoutExpired: The command ran past `timeout`
+        RenderCancelled: The token was cancelled or its deadline passed
+    """
+    preexec_fn = None
+    if resource is not None and (cpu_seconds or memory_mb):
+        preexec_fn = lambda: apply_resource_limits(cpu_seconds, memory_mb)
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               preexec_fn=preexec_fn, start_new_session=os.name == 'posix')
+    start = time.monotonic()
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=poll_interval)
+                return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+            except subprocess.TimeoutExpired:
+                if cancel_token is not None:
+                    cancel_token.check()
+                if timeout is not None and time.monotonic() - start > timeout:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+    except BaseException:
+        _kill_process_group(process)
+        raise
+
+
+def _kill_process_group(process):
+    """Kill the child and anything it spawned, then reap it."""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'posix':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+    process.communicate()
@@ -0,0 +1,334 @@
+"""
+Durable job queue shared by UI replicas, the HTTP API and worker processes.
+
+Jobs live in a SQLite database on the shared volume (JOB_QUEUE_DIR), and
+their input files in the artifact store, so any process that mounts the
+volume can submit work or take it. Workers claim a job by taking a lease
+and keep it alive with heartbeats, which also carry render progress back
+to whoever is polling. A job whose lease runs out (its worker died or lost
+the volume) is handed to the next worker, up to JOB_MAX_ATTEMPTS times.
+
+An upgrade job re-renders a job that was rendered at a cheaper profile
+under load (see adaptive_quality.py). Upgrades are claimed after every
+ordinary job and don't count towards the queue depth.
+
+SQLite needs working POSIX file locks: hosts sharing the volume must use a
+filesystem that provides them (a local disk or a block volume, not most
+NFS/SMB mounts).
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from render_progress import RenderProgress
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    input_digest TEXT NOT NULL,
+    input_bytes INTEGER NOT NULL,
+    score_digest TEXT,
+    user_id TEXT,
+    mode TEXT NOT NULL DEFAULT 'fingerboard',
+    profile TEXT NOT NULL DEFAULT 'standard',
+    measures TEXT,
+    rendered_profile TEXT,
+    upgrade_of TEXT,
+    upgrade_job TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    progress TEXT,
+    message TEXT,
+    output_path TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+# Columns added after the first release, with their definitions, for queues created before them
+_ADDED_COLUMNS = {
+    'mode': "TEXT NOT NULL DEFAULT 'fingerboard'",
+    'profile': "TEXT NOT NULL DEFAULT 'standard'",
+    'measures': "TEXT",
+    'rendered_profile': "TEXT",
+    'upgrade_of': "TEXT",
+    'upgrade_job': "TEXT",
+    'score_digest': "TEXT",
+}
+
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+class JobQueue:
+    def __init__(self, root, artifact_store, lease_seconds=60, max_attempts=3):
+        self.root = root
+        self.artifact_store = artifact_store
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.inputs_dir = os.path.join(root, 'inputs')
+        self.db_path = os.path.join(root, 'queue.sqlite3')
+        os.makedirs(self.inputs_dir, mode=0o777, exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            db.executescript(_SCHEMA)
+            columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+        finally:
+            db.close()
+
+    @contextmanager
+    def _connect(self, immediate=False):
+        # One short-lived connection per call, shared by no other thread
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            # IMMEDIATE takes the write lock up front, so two workers can't claim the same job
+            db.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def input_path(self, job):
+        """Path of a job's input file; a link that keeps the store object from eviction."""
+        return os.path.join(self.inputs_dir, job['id'])
+
+    def score_path(self, job):
+        """Path of the MusicXML submitted with an image job, or None; linked like the input."""
+        if not job['score_digest']:
+            return None
+        return os.path.join(self.inputs_dir, f"{job['id']}.musicxml")
+
+    # --- Producers (UI, API) ---
+
+    def submit(self, filename, data, user_id=None, mode="fingerboard", profile="standard", measures=None,
+               score=None):
+        """
+        Queue a file for processing; `measures` ("17-32") renders only that excerpt.
+
+        `score` is MusicXML already recognised from an image `data` (for its
+        storyboard), which the worker renders instead of running OMR again.
+
+        Returns:
+            dict: The new job
+        """
+        job_id = uuid.uuid4().hex
+        digest, size = self.artifact_store.put_buffer(data, link_to=os.path.join(self.inputs_dir, job_id))
+        score_digest = None
+        if score is not None:
+            score_link = os.path.join(self.inputs_dir, f"{job_id}.musicxml")
+            score_digest, _ = self.artifact_store.put_buffer(score, link_to=score_link)
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, filename, input_digest, input_bytes, score_digest, user_id, mode, "
+                       "profile, measures, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+                       (job_id, os.path.basename(filename), digest, size, score_digest, user_id, mode, profile,
+                        measures, time.time()))
+        return self.get(job_id)
+
+    def submit_upgrade(self, job, profile):
+        """
+        Queue a re-render of `job` at `profile`, from the same input file.
+
+        Call it while the worker still holds `job`, before `complete` drops its input.
+
+        Returns:
+            dict: The upgrade job
+        """
+        upgrade_id = uuid.uuid4().hex
+        self.artifact_store.link_into(job['input_digest'], os.path.join(self.inputs_dir, upgrade_id))
+        if job['score_digest']:
+            self.artifact_store.link_into(job['score_digest'], os.path.join(self.inputs_dir, f"{upgrade_id}.musicxml"))
+        with self._connect() as db:
+            db.execute("INSERT INTO jobs (id, filename, input_digest, input_bytes, score_digest, user_id, mode, "
+                       "profile, measures, upgrade_of, status, created_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+                       (upgrade_id, job['filename'], job['input_digest'], job['input_bytes'], job['score_digest'],
+                        job['user_id'], job['mode'], profile, job['measures'], job['id'], time.time()))
+            db.execute("UPDATE jobs SET upgrade_job = ? WHERE id = ?", (upgrade_id, job['id']))
+        return self.get(upgrade_id)
+
+    def get(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list(self, limit=100):
+        """Most recent jobs first."""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def queued_count(self, upgrades=False):
+        """Jobs waiting for a worker; upgrade jobs only with `upgrades`."""
+        with self._connect() as db:
+            query = "SELECT COUNT(*) FROM jobs WHERE status = 'queued'"
+            if not upgrades:
+                query += " AND upgrade_of IS NULL"
+            return db.execute(query).fetchone()[0]
+
+    def cancel(self, job_id):
+        """Cancel a queued job now, or ask the worker running it to stop."""
+        with self._connect(immediate=True) as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', message = 'Job was cancelled', finished_at = ? "
+                       "WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        job = self.get(job_id)
+        if job and job['status'] == 'cancelled':
+            self._drop_input(job)
+        return job
+
+    def wait(self, job_id, progress_callback=None, poll_interval=0.5):
+        """
+        Block until a job finishes, passing its progress to `progress_callback`.
+
+        Returns:
+            tuple: (success, message, output_path), like FileProcessor.process_file
+        """
+        last_progress = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return False, "Job not found", None
+            if progress_callback is not None and job['progress'] and job['progress'] != last_progress:
+                last_progress = job['progress']
+                progress_callback(RenderProgress(**last_progress))
+            if job['status'] in FINISHED:
+                return job['status'] == 'done', job['message'], job['output_path']
+            time.sleep(poll_interval)
+
+    # --- Workers ---
+
+    def claim(self, worker_id, upgrades=True):
+        """
+        Lease the oldest runnable job: queued, or running under an expired lease.
+
+        Upgrade jobs come after all others, and queued ones are left alone
+        unless `upgrades` is set.
+
+        Returns:
+            dict or None: The claimed job
+        """
+        now = time.time()
+        with self._connect(immediate=True) as db:
+            # Jobs whose workers died too often are given up on
+            abandoned = db.execute("SELECT id FROM jobs WHERE status = 'running' AND lease_expires < ? "
+                                   "AND attempts >= ?", (now, self.max_attempts)).fetchall()
+            db.execute("UPDATE jobs SET status = 'failed', finished_at = ?, message = ? "
+                       "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                       (now, f"Gave up after {self.max_attempts} attempts; the worker stopped responding",
+                        now, self.max_attempts))
+            queued = "status = 'queued'" if upgrades else "(status = 'queued' AND upgrade_of IS NULL)"
+            row = db.execute(f"SELECT id FROM jobs WHERE {queued} OR (status = 'running' AND lease_expires < ?) "
+                             "ORDER BY upgrade_of IS NOT NULL, created_at LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                           "lease_expires = ?, started_at = ?, progress = NULL WHERE id = ?",
+                           (worker_id, now + self.lease_seconds, now, row['id']))
+        for abandoned_row in abandoned:
+            self._drop_input({'id': abandoned_row['id']})
+        return self.get(row['id']) if row is not None else None
+
+    def heartbeat(self, job_id, worker_id, progress=None):
+        """
+        Extend the lease on a job and publish its progress.
+
+        Returns:
+            tuple: (still_owned, cancel_requested)
+        """
+        with self._connect() as db:
+            if progress is not None:
+                db.execute("UPDATE jobs SET lease_expires = ?, progress = ? WHERE id = ? AND worker = ? "
+                           "AND status = 'running'",
+                           (time.time() + self.lease_seconds, json.dumps(progress._asdict()), job_id, worker_id))
+            else:
+                db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                           (time.time() + self.lease_seconds, job_id, worker_id))
+            row = db.execute("SELECT worker, status, cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        owned = row is not None and row['worker'] == worker_id and row['status'] == 'running'
+        return owned, bool(row and row['cancel_requested'])
+
+    def complete(self, job_id, worker_id, success, message, output_path=None, cancelled=False, rendered_profile=None):
+        """
+        Record the outcome of a job, if this worker still holds it; `rendered_profile` is the profile used.
+
+        Returns:
+            bool: False if the lease was lost (the job was reclaimed by another worker, or already
+            finished), in which case nothing is recorded and the input is left to the job's owner
+        """
+        status = 'done' if success else 'cancelled' if cancelled else 'failed'
+        with self._connect() as db:
+            cursor = db.execute("UPDATE jobs SET status = ?, message = ?, output_path = ?, rendered_profile = ?, "
+                                "finished_at = ?, lease_expires = NULL WHERE id = ? AND worker = ? "
+                                "AND status = 'running'",
+                                (status, message, output_path, rendered_profile, time.time(), job_id, worker_id))
+            owned = cursor.rowcount == 1
+        if owned:
+            self._drop_input({'id': job_id})
+        return owned
+
+    def release(self, job_id, worker_id):
+        """Hand a job back to the queue (e.g. the worker is shutting down) without using up an attempt."""
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'queued', worker = NULL, lease_expires = NULL, progress = NULL, "
+                       "attempts = MAX(attempts - 1, 0) WHERE id = ? AND worker = ? AND status = 'running'",
+                       (job_id, worker_id))
+
+    def prune(self, max_age_seconds):
+        """Forget finished jobs older than `max_age_seconds`."""
+        with self._connect() as db:
+            db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?",
+                       (time.time() - max_age_seconds,))
+
+    def _drop_input(self, job):
+        # Unlinks the queue's references; the store objects are left to the storage janitor
+        for path in (self.input_path(job), os.path.join(self.inputs_dir, f"{job['id']}.musicxml")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _to_job(self, row):
+        job = dict(row)
+        job['progress'] = json.loads(job['progress']) if job['progress'] else None
+        return job
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue on the shared volume, creating it on first use."""
+    global _queue
+    import config
+    from artifact_store import ArtifactStore
+
+    with _queue_lock:
+        if _queue is None:
+            # Same store as FileProcessor, so queued inputs and processed scores share blobs
+            artifact_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'xml_files')
+            _queue = JobQueue(
+                config.JOB_QUEUE_DIR or os.path.join(artifact_dir, 'queue'),
+                ArtifactStore(artifact_dir),
+                lease_seconds=config.JOB_LEASE_SECONDS,
+                max_attempts=config.JOB_MAX_ATTEMPTS,
+            )
+    return _queue
@@ -0,0 +1,19 @@
+"""
+Measure ranges such as "17-32", for rendering an excerpt of a score.
+
+Kept apart from the renderer so the app and the API can validate a range
+without importing NumPy and PIL.
+"""
+
+
+def parse_measure_range(text):
+    """(first, last) measure numbers from "17-32", or (17, 17) from "17"."""
+    first, _, last = text.strip().partition('-')
+    try:
+        first = int(first)
+        last = int(last) if last else first
+    except ValueError:
+        raise ValueError(f"Invalid measure range '{text}'; expected e.g. 17-32")
+    if first < 0 or last < first:
+        raise ValueError(f"Invalid measure range '{text}'; expected e.g. 17-32")
+    return first, last
@@ -0,0 +1,204 @@
+"""
+Structured service metrics for MusicSynth.
+
+Three outputs replace the old free-text processing_stats.log files:
+
+- per-request records appended as JSON lines to a central file that
+  session cleanup never touches (MUSICSYNTH_METRICS_DIR, default ./metrics)
+- in-process counters and latency histograms for file save, OMR, parse,
+  render and encode
+- a local Prometheus-format text endpoint (MUSICSYNTH_METRICS_PORT, default
+  9464, bound to 127.0.0.1; set to 0 to disable), which also serves p50/p95
+  summaries as JSON at /metrics.json
+"""
+
+import os
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = config.METRICS_DIR or os.path.join(PROJECT_DIR, 'metrics')
+METRICS_PORT = config.METRICS_PORT
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float('inf'))
+
+# Raw samples kept per histogram for in-process percentiles
+RESERVOIR_SIZE = 2048
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+        self.samples.append(value)
+
+    def percentile(self, fraction):
+        """Percentile over the most recent samples, or None if nothing was observed."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class MetricsRegistry:
+    def __init__(self, metrics_dir=METRICS_DIR):
+        self.metrics_dir = metrics_dir
+        self.requests_path = os.path.join(metrics_dir, 'requests.jsonl')
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def increment(self, name, amount=1, **labels):
+        """Increase a counter identified by `name` and its labels."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, stage, seconds):
+        """Record a latency for one pipeline stage."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def record_request(self, record):
+        """
+        Record one processed request.
+
+        Updates the request counter and stage histograms, then appends the
+        record (with a timestamp) to requests.jsonl.
+
+        Args:
+            record: dict with at least `status` and a `stages` dict of stage -> seconds
+        """
+        record = dict(record)
+        record.setdefault('timestamp', datetime.now().isoformat())
+        self.increment('musicsynth_requests_total', status=record.get('status', 'unknown'))
+        for stage, seconds in record.get('stages', {}).items():
+            self.observe(stage, seconds)
+        if record.get('total_seconds') is not None:
+            self.observe('total', record['total_seconds'])
+
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            with open(self.requests_path, 'a') as f:
+                f.write(line)
+
+    def summary(self):
+        """p50/p95/count per stage, for capacity planning."""
+        with self._lock:
+            return {
+                stage: {
+                    'count': histogram.count,
+                    'p50': histogram.percentile(0.50),
+                    'p95': histogram.percentile(0.95),
+                    'mean': histogram.total / histogram.count if histogram.count else None,
+                }
+                for stage, histogram in self._histograms.items()
+            }
+
+    def render_prometheus(self):
+        """Render all counters and histograms in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counter_names = sorted({name for name, _ in self._counters})
+            for name in counter_names:
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, labels), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+            name = 'musicsynth_stage_duration_seconds'
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    lines.append(f'{name}_bucket{_format_labels([("stage", stage), ("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels([("stage", stage)])} {histogram.total}')
+                lines.append(f'{name}_count{_format_labels([("stage", stage)])} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+def _escape_label(value):
+    """A label value as the text format quotes it: backslash, double quote and newline escaped."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Process-wide registry shared by the app, FileProcessor and the endpoint
+registry = MetricsRegistry()
+
+_server = None
+_server_started = False
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = registry.render_prometheus().encode()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body = json.dumps(registry.summary()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise flood stderr
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, host='127.0.0.1'):
+    """
+    Start the Prometheus endpoint in a daemon thread, once per process.
+
+    Safe to call on every Streamlit rerun. Returns the server, or None if
+    disabled (port 0) or the port is already taken by another process.
+    """
+    global _server, _server_started
+    if not port:
+        return None
+    with _server_lock:
+        if not _server_started:
+            _server_started = True
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                print(f"Metrics endpoint not started on port {port}: {str(e)}")
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True, name='metrics-server').start()
+            print(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return _server
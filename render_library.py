@@ -0,0 +1,221 @@
+"""
+Per-user render library.
+
+Every video rendered for a signed-in user is adopted into the artifact
+store and indexed in a small SQLite database keyed on the Supabase user ID,
+the digest of the uploaded file and the render settings. Uploading the same
+file again is answered from the library without running OMR or encoding,
+and past renders can be listed, replayed and re-downloaded.
+
+Each entry keeps a hard link under `library/<user_id>/`, so the store
+object stays referenced and the storage janitor leaves it alone. Entries
+expire after a TTL of no use, and each user's library is capped by a quota
+with least recently used entries evicted first.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS renders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    input_digest TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    video_digest TEXT NOT NULL,
+    video_name TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    UNIQUE (user_id, input_digest, settings)
+);
+CREATE INDEX IF NOT EXISTS renders_by_user ON renders (user_id, last_used);
+"""
+
+_COLUMNS = "id, user_id, filename, input_digest, settings, video_digest, video_name, size_bytes, created_at, last_used"
+
+
+class RenderLibrary:
+    def __init__(self, root, artifact_store, ttl_seconds=30 * 24 * 3600, user_quota_bytes=None):
+        self.root = root
+        self.artifact_store = artifact_store
+        self.ttl_seconds = ttl_seconds
+        self.user_quota_bytes = user_quota_bytes
+        self.db_path = os.path.join(root, 'library.sqlite3')
+        self._lock = threading.Lock()
+        os.makedirs(root, mode=0o777, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call; sqlite3 connections are not shared across threads
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _user_dir(self, user_id):
+        # User IDs are Supabase UUIDs; keep anything else from escaping the library
+        safe_id = ''.join(c for c in str(user_id) if c.isalnum() or c in '-_')
+        return os.path.join(self.root, safe_id)
+
+    def video_path(self, entry):
+        """Path of an entry's video inside the library."""
+        return os.path.join(self._user_dir(entry['user_id']), f"{entry['video_digest']}.mp4")
+
+    def lookup(self, user_id, input_digest, settings):
+        """
+        Find a previous render of the same input with the same settings.
+
+        Returns:
+            dict or None: The entry, with its use recorded, if the video is still on disk
+        """
+        with self._connect() as db:
+            row = db.execute(f"SELECT {_COLUMNS} FROM renders WHERE user_id = ? AND input_digest = ? AND settings = ?",
+                             (user_id, input_digest, settings)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        if not os.path.exists(self.video_path(entry)):
+            self.remove(user_id, entry['id'])
+            return None
+        self.touch(entry['id'])
+        return entry
+
+    def add(self, user_id, filename, input_digest, settings, video_path):
+        """
+        Adopt a rendered video into the store and record it for `user_id`.
+
+        The video is hard-linked, not copied: `video_path` stays where it is.
+        Older entries are evicted to make room; the new one never is.
+
+        Returns:
+            dict: The new entry
+
+        Raises:
+            ValueError: The video alone is larger than the user quota
+        """
+        if self.user_quota_bytes and os.path.getsize(video_path) > self.user_quota_bytes:
+            raise ValueError(f"{os.path.basename(video_path)} is larger than the "
+                             f"{self.user_quota_bytes / (1024 * 1024):.0f} MB library quota")
+        video_digest, size = self.artifact_store.put_file(video_path)
+        user_dir = self._user_dir(user_id)
+        os.makedirs(user_dir, mode=0o777, exist_ok=True)
+        link_path = os.path.join(user_dir, f"{video_digest}.mp4")
+        if not os.path.exists(link_path):
+            self.artifact_store.link_into(video_digest, link_path)
+        now = time.time()
+        with self._lock, self._connect() as db:
+            entry_id = db.execute(
+                "INSERT OR REPLACE INTO renders (user_id, filename, input_digest, settings, video_digest, "
+                "video_name, size_bytes, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, filename, input_digest, settings, video_digest, os.path.basename(video_path), size, now, now)
+            ).lastrowid
+        if self.user_quota_bytes:
+            self._enforce_quota(user_id, keep=entry_id)
+        return self.lookup(user_id, input_digest, settings)
+
+    def has_filename(self, user_id, filename):
+        """Whether `user_id` has rendered a file of this name before, in any version or settings."""
+        with self._connect() as db:
+            row = db.execute("SELECT 1 FROM renders WHERE user_id = ? AND filename = ? LIMIT 1",
+                             (user_id, filename)).fetchone()
+        return row is not None
+
+    def list(self, user_id):
+        """Entries of `user_id`, most recently used first."""
+        with self._connect() as db:
+            rows = db.execute(f"SELECT {_COLUMNS} FROM renders WHERE user_id = ? ORDER BY last_used DESC",
+                              (user_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def usage(self, user_id):
+        """
+        Storage used by `user_id`.
+
+        Returns:
+            dict: Entry count and bytes, counting a video shared by several entries once
+        """
+        with self._connect() as db:
+            count = db.execute("SELECT COUNT(*) FROM renders WHERE user_id = ?", (user_id,)).fetchone()[0]
+            size = db.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM (SELECT DISTINCT video_digest, size_bytes "
+                              "FROM renders WHERE user_id = ?)", (user_id,)).fetchone()[0]
+        return {"entries": count, "bytes": size, "quota_bytes": self.user_quota_bytes}
+
+    def touch(self, entry_id):
+        """Record a use (replay or re-download); resets the entry's expiry."""
+        with self._lock, self._connect() as db:
+            db.execute("UPDATE renders SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+
+    def remove(self, user_id, entry_id):
+        """Delete an entry, and its link once no other entry of the user shares the video."""
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT video_digest FROM renders WHERE id = ? AND user_id = ?",
+                             (entry_id, user_id)).fetchone()
+            if row is None:
+                return False
+            db.execute("DELETE FROM renders WHERE id = ?", (entry_id,))
+            shared = db.execute("SELECT 1 FROM renders WHERE user_id = ? AND video_digest = ?",
+                                (user_id, row['video_digest'])).fetchone()
+        if shared is None:
+            try:
+                os.remove(os.path.join(self._user_dir(user_id), f"{row['video_digest']}.mp4"))
+            except FileNotFoundError:
+                pass
+        # The store object itself becomes unreferenced and is left to the storage janitor
+        return True
+
+    def _enforce_quota(self, user_id, keep=None):
+        """Evict the user's least recently used entries, other than `keep`, until they fit in the quota."""
+        for entry in reversed(self.list(user_id)):
+            if self.usage(user_id)['bytes'] <= self.user_quota_bytes:
+                break
+            if entry['id'] != keep:
+                self.remove(user_id, entry['id'])
+
+    def expire(self):
+        """
+        Remove entries unused for longer than the TTL.
+
+        Returns:
+            int: Number of entries removed
+        """
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as db:
+            rows = db.execute("SELECT id, user_id FROM renders WHERE last_used < ?", (cutoff,)).fetchall()
+        for row in rows:
+            self.remove(row['user_id'], row['id'])
+        if rows:
+            print(f"Render library expired {len(rows)} entries")
+        return len(rows)
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_render_library(root, artifact_store):
+    """Return the process-wide render library, creating it on first use."""
+    global _library
+    import config
+
+    with _library_lock:
+        if _library is None:
+            _library = RenderLibrary(
+                root,
+                artifact_store,
+                ttl_seconds=config.LIBRARY_TTL_DAYS * 24 * 3600,
+                user_quota_bytes=config.LIBRARY_USER_QUOTA_MB * 1024 * 1024 if config.LIBRARY_USER_QUOTA_MB else None,
+            )
+    return _library
@@ -0,0 +1,137 @@
+"""
+Opt-in profiling for the render pipeline.
+
+Enable with the `--profile` CLI flag or the MUSICSYNTH_PROFILE environment
+variable (`1` for timers and memory, `cprofile` to also dump a cProfile
+trace). Reports are written next to the output video:
+
+    <output>.profile.json   per-stage timers, per-frame histograms, peak memory
+    <output>.prof           cProfile dump (only when cProfile is enabled)
+"""
+
+import os
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_ENV_VAR = 'MUSICSYNTH_PROFILE'
+
+# Upper bounds (in milliseconds) of the per-frame histogram buckets
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, float('inf')]
+
+
+class RenderProfiler:
+    def __init__(self, use_cprofile=False, trace_memory=True, top_allocations=15):
+        self.use_cprofile = use_cprofile
+        self.trace_memory = trace_memory
+        self.top_allocations = top_allocations
+        self.stages = {}
+        self.counts = {}
+        self.frame_draw_ms = []
+        self._cprofile = None
+        self._memory_peak = None
+        self._memory_top = []
+
+    @classmethod
+    def from_env(cls):
+        """Create a profiler if MUSICSYNTH_PROFILE is set, otherwise return None."""
+        value = os.environ.get(PROFILE_ENV_VAR, '').strip().lower()
+        if value in ('', '0', 'false', 'no', 'off'):
+            return None
+        return cls(use_cprofile=value == 'cprofile')
+
+    def start(self):
+        """Start memory tracing and cProfile collection."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.use_cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        """Stop collection and take the peak-memory snapshot."""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if tracemalloc.is_tracing():
+            _, self._memory_peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            self._memory_top = [
+                {"location": str(stat.traceback), "size_kb": stat.size / 1024, "count": stat.count}
+                for stat in snapshot.statistics('lineno')[:self.top_allocations]
+            ]
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """Accumulate wall time spent inside the block under `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.perf_counter() - start)
+
+    def add_stage_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        """Add `amount` to the counter `name` (e.g. reused segments)."""
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def record_frame(self, draw_seconds):
+        """Record the time spent drawing one frame (as an RGB array, ready to encode)."""
+        self.frame_draw_ms.append(draw_seconds * 1000)
+
+    @staticmethod
+    def _histogram(values_ms):
+        counts = [0] * len(HISTOGRAM_BUCKETS_MS)
+        for value in values_ms:
+            for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+        return {f"le_{bound:g}ms": count for bound, count in zip(HISTOGRAM_BUCKETS_MS, counts)}
+
+    @staticmethod
+    def _summary(values_ms):
+        if not values_ms:
+            return {}
+        ordered = sorted(values_ms)
+        return {
+            "count": len(ordered),
+            "total_ms": sum(ordered),
+            "mean_ms": sum(ordered) / len(ordered),
+            "p50_ms": ordered[len(ordered) // 2],
+            "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max_ms": ordered[-1],
+        }
+
+    def report(self):
+        """Build the profile report as a dict."""
+        return {
+            "stages_seconds": self.stages,
+            "counts": self.counts,
+            "frame_draw": self._summary(self.frame_draw_ms),
+            "frame_draw_histogram": self._histogram(self.frame_draw_ms),
+            "memory_peak_mb": self._memory_peak / (1024 * 1024) if self._memory_peak is not None else None,
+            "memory_top_allocations": self._memory_top,
+        }
+
+    def write_report(self, output_file):
+        """
+        Write the report (and cProfile dump, if enabled) next to `output_file`.
+
+        Returns:
+            list: Paths of the files that were written
+        """
+        written = []
+        report_path = f"{output_file}.profile.json"
+        with open(report_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        written.append(report_path)
+        if self._cprofile is not None:
+            prof_path = f"{output_file}.prof"
+            self._cprofile.dump_stats(prof_path)
+            written.append(prof_path)
+        return written
@@ -0,0 +1,94 @@
+"""
+Named render quality profiles.
+
+A profile fixes everything that trades render time against quality:
+resolution, frame rate and the x264 encoder settings. Drawing scales with
+the resolution, so a draft is cheaper to draw as well as to encode.
+
+- draft: 640x360 at 10 fps, ultrafast preset; a quick check of the result,
+  about a tenth of the cost of standard
+- standard: 1280x720 at 30 fps; what the app serves
+- archive: 1920x1080 at 30 fps, slow preset, full chroma; for downloads and editing
+
+A Rendition is an extra output of the same render: the frames are drawn
+once, at the largest size asked for, and every output encodes its own
+scaled copy (see `synthesia.make_video`).
+"""
+
+import os
+
+from collections import namedtuple
+
+RenderProfile = namedtuple('RenderProfile', ['name', 'frame_size', 'fps', 'preset', 'crf', 'threads', 'pixel_format'])
+
+# threads=0 lets x264 pick one thread per core
+RENDER_PROFILES = {
+    "draft": RenderProfile("draft", (640, 360), 10, "ultrafast", 30, 2, "yuv420p"),
+    "standard": RenderProfile("standard", (1280, 720), 30, "medium", 23, 0, "yuv420p"),
+    "archive": RenderProfile("archive", (1920, 1080), 30, "slow", 18, 0, "yuv444p"),
+}
+
+DEFAULT_PROFILE = "standard"
+
+# `frame_size` defaults to the profile's; `bitrate` (e.g. "800k") targets a bitrate instead of the
+# profile's CRF; `container` is one of CONTAINER_FORMATS and defaults to the file extension
+Rendition = namedtuple('Rendition', ['output_file', 'frame_size', 'bitrate', 'container'], defaults=(None, None, None))
+
+# Containers that take H.264, with their ffmpeg muxer names
+CONTAINER_FORMATS = {"mp4": "mp4", "mov": "mov", "mkv": "matroska"}
+
+
+def get_profile(profile, fps=None):
+    """
+    Look up a profile by name (a RenderProfile is returned as is).
+
+    Args:
+        profile: Profile name or RenderProfile
+        fps: Optional frame rate overriding the profile's
+
+    Raises:
+        ValueError: If there is no profile with that name
+    """
+    if not isinstance(profile, RenderProfile):
+        if profile not in RENDER_PROFILES:
+            raise ValueError(f"Unknown render profile '{profile}'; expected one of {', '.join(RENDER_PROFILES)}")
+        profile = RENDER_PROFILES[profile]
+    if fps is not None and fps != profile.fps:
+        profile = profile._replace(fps=fps)
+    return profile
+
+
+def rendition_container(rendition):
+    """Container of a rendition: the one given, else the output file's extension."""
+    container = rendition.container or os.path.splitext(rendition.output_file)[1].lstrip('.').lower()
+    if container not in CONTAINER_FORMATS:
+        raise ValueError(f"Unsupported container '{container}' for {rendition.output_file}; "
+                         f"expected one of {', '.join(CONTAINER_FORMATS)}")
+    return container
+
+
+def parse_rendition(spec):
+    """
+    Read a rendition from the command line form PATH[=WIDTHxHEIGHT][@BITRATE].
+
+    For example "phone.mp4=640x360@800k" or "projector.mkv=1920x1080".
+
+    Raises:
+        ValueError: If the spec can't be read
+    """
+    bitrate = None
+    frame_size = None
+    if '@' in spec:
+        spec, bitrate = spec.rsplit('@', 1)
+    if '=' in spec:
+        spec, size = spec.rsplit('=', 1)
+        try:
+            width, height = (int(value) for value in size.lower().split('x'))
+        except ValueError:
+            raise ValueError(f"Invalid rendition size '{size}'; expected WIDTHxHEIGHT")
+        frame_size = (width, height)
+    if not spec:
+        raise ValueError("Rendition has no output file")
+    rendition = Rendition(spec, frame_size, bitrate or None)
+    rendition_container(rendition)
+    return rendition
@@ -0,0 +1,73 @@
+"""
+Progress reporting for video renders.
+
+`make_video` accepts a `progress_callback` that is called with a
+`RenderProgress` snapshot (frames done, total frames, current render fps and
+ETA). Frames are counted rather than timestamped, so the same reporter works
+for serial renderers and for renderers that complete frames out of order
+from several threads. Callbacks are throttled so the per-frame overhead is a
+counter increment.
+"""
+
+import sys
+import time
+import threading
+from collections import namedtuple
+
+RenderProgress = namedtuple('RenderProgress', ['frames_done', 'total_frames', 'fps', 'eta_seconds'])
+
+
+class ProgressReporter:
+    def __init__(self, total_frames, callback, min_interval=0.25):
+        self.total_frames = max(1, int(total_frames))
+        self.callback = callback
+        self.min_interval = min_interval
+        self.frames_done = 0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_report = self._start
+        self._last_frames = 0
+        self._fps = 0.0
+
+    def frame_done(self, count=1):
+        """Count finished frames; safe to call from several threads."""
+        with self._lock:
+            self.frames_done += count
+            now = time.perf_counter()
+            if now - self._last_report < self.min_interval:
+                return
+            snapshot = self._snapshot(now)
+        self.callback(snapshot)
+
+    def finish(self):
+        """Report the final state, with the average fps of the whole render."""
+        with self._lock:
+            self.frames_done = max(self.frames_done, self.total_frames)
+            snapshot = self._snapshot(time.perf_counter(), final=True)
+        self.callback(snapshot)
+
+    def _snapshot(self, now, final=False):
+        elapsed = now - self._start
+        overall_fps = self.frames_done / elapsed if elapsed > 0 else 0.0
+        window = now - self._last_report
+        if final:
+            self._fps = overall_fps
+        elif window > 0 and self.frames_done > self._last_frames:
+            self._fps = (self.frames_done - self._last_frames) / window
+        remaining = max(0, self.total_frames - self.frames_done)
+        # ETA uses the overall rate, which is steadier than the windowed fps
+        eta = remaining / overall_fps if overall_fps > 0 else None
+        self._last_report = now
+        self._last_frames = self.frames_done
+        return RenderProgress(min(self.frames_done, self.total_frames), self.total_frames, self._fps, eta)
+
+
+def print_progress(progress, stream=sys.stdout):
+    """CLI progress callback that rewrites a single status line."""
+    percent = 100.0 * progress.frames_done / progress.total_frames
+    eta = f"{progress.eta_seconds:.0f}s" if progress.eta_seconds is not None else "--"
+    stream.write(f"\rRendering: {progress.frames_done}/{progress.total_frames} frames "
+                 f"({percent:.0f}%) at {progress.fps:.1f} fps, ETA {eta}   ")
+    if progress.frames_done >= progress.total_frames:
+        stream.write("\n")
+    stream.flush()
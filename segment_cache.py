@@ -0,0 +1,125 @@
+"""
+Cache of encoded video segments for incremental re-renders.
+
+Videos are encoded in fixed-length segments. Each segment is stored under a
+key hashed from everything that determines its pixels: the render
+settings, its frame range, the notes sounding inside its window with their
+fingering and the fingerboard positions drawn on every frame (the dots of
+the fingerboard view; none for falling notes).
+Re-rendering an edited score re-encodes only the segments whose key
+changed; the rest are concatenated from the cache with a stream copy.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import subprocess
+
+# Bump when drawing or parsing changes, so segments and library videos made by older code are not reused
+RENDERER_VERSION = 5
+
+# Length of one cached segment
+SEGMENT_SECONDS = 4
+
+
+def segment_key(notes, static_positions, start_frame, end_frame, fps, settings, lookahead=0):
+    """
+    Cache key for frames [start_frame, end_frame).
+
+    Args:
+        notes: Notes of the score, as parsed
+        static_positions: Sorted fingerboard positions drawn on every frame, whatever sounds
+        settings: Render settings that affect the pixels or the encoding
+        lookahead: Seconds before they sound that notes are already visible
+    """
+    first_t = start_frame / fps
+    last_t = (end_frame - 1) / fps + lookahead
+    window = [(note["note"], note["position"], note["start_time"], note["duration"]) for note in notes
+              if note["start_time"] <= last_t and note["start_time"] + note["duration"] > first_t]
+    payload = json.dumps({
+        "version": RENDERER_VERSION,
+        "settings": settings,
+        "frames": [start_frame, end_frame, fps],
+        "static": static_positions,
+        "window": window,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SegmentCache:
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self.tmp_dir, mode=0o777, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.mp4")
+
+    def get(self, key):
+        """Path of a cached segment, or None; a hit counts as a use for LRU eviction."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def new_temp_path(self):
+        """A fresh file to encode a segment into before `put`."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.mp4')
+        os.close(fd)
+        return tmp_path
+
+    def put(self, key, tmp_path):
+        """Move a fully encoded segment into the cache."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), mode=0o777, exist_ok=True)
+        os.replace(tmp_path, path)
+        return path
+
+    def iter_entries(self):
+        """Yield (path, size, last_used) for every cached segment, for the storage janitor."""
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix == 'tmp' or not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, max(stat.st_mtime, stat.st_atime)
+
+
+def concat_segments(segment_paths, output_file, audio_file=None, container=None):
+    """
+    Join encoded segments into one video without re-encoding, muxing in
+    `audio_file` if given. `container` (a CONTAINER_FORMATS key) overrides
+    the one picked from the file extension.
+    """
+    from moviepy.config import FFMPEG_BINARY
+    from render_profiles import CONTAINER_FORMATS
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as list_file:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            list_file.write(f"file '{escaped}'\n")
+    command = [FFMPEG_BINARY, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_file.name]
+    if audio_file is not None:
+        command += ['-i', audio_file, '-map', '0:v', '-map', '1:a', '-c:v', 'copy', '-c:a', 'aac', '-shortest']
+    else:
+        command += ['-c', 'copy']
+    if container is not None:
+        command += ['-f', CONTAINER_FORMATS[container]]
+    command += ['-movflags', '+faststart', output_file]
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Joining video segments failed: {e.stderr.decode(errors='replace').strip()}")
+    finally:
+        os.remove(list_file.name)
+    return output_file
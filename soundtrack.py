@@ -0,0 +1,177 @@
+"""
+Soundtrack synthesis for the rendered videos.
+
+The note timeline is synthesized with NumPy: every note is a sum of
+harmonic partials shaped by an attack/release envelope. The partials are
+read from a wavetable once per pitch (kept in a cache of bounded size,
+shared by the renders of the process) and the envelopes are computed once
+per note length, so mixing a piece is one vectorized multiply-add per note
+into the output. The result is written as a 16-bit WAV that the video
+encoder muxes into the MP4.
+"""
+
+import threading
+import wave
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from fingering import note_to_midi
+
+SAMPLE_RATE = 44100
+
+# Relative amplitudes of the harmonics; a bright, string-like tone
+PARTIALS = (1.0, 0.5, 0.33, 0.25, 0.2, 0.12, 0.08, 0.05)
+
+# Samples per period in the wavetables; a power of two
+WAVETABLE_SIZE = 4096
+
+ATTACK_SECONDS = 0.02
+RELEASE_SECONDS = 0.08
+# Gentle decay over the note, per second
+DECAY_PER_SECOND = 0.6
+
+# Peak level of the mix, leaving headroom for the AAC encoder
+PEAK_LEVEL = 0.8
+
+# Memory for the sustained tones kept between notes and renders, per sample rate;
+# about six minutes of float32 samples at 44.1 kHz
+PARTIALS_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def midi_to_hz(midi):
+    return 440.0 * 2 ** ((midi - 69) / 12)
+
+
+class _PartialsCache:
+    """
+    Sustained tone per pitch, grown to the longest note seen for that pitch.
+
+    The least recently used tones are dropped once they take more than
+    `max_bytes`; a tone larger than that on its own is not kept. Tones are
+    read-only, so a slice handed out stays valid after its tone is dropped.
+    """
+
+    def __init__(self, sample_rate, max_bytes=PARTIALS_CACHE_BYTES):
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self._tones = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, midi, n_samples):
+        with self._lock:
+            tone = self._tones.get(midi)
+            if tone is not None:
+                self._tones.move_to_end(midi)
+        if tone is None or len(tone) < n_samples:
+            tone = self._render(midi, n_samples)
+            self._store(midi, tone)
+        return tone[:n_samples]
+
+    def _store(self, midi, tone):
+        with self._lock:
+            old = self._tones.get(midi)
+            if old is not None and len(old) >= len(tone):
+                # Another render grew this pitch further in the meantime
+                self._tones.move_to_end(midi)
+                return
+            if old is not None:
+                self._bytes -= old.nbytes
+                del self._tones[midi]
+            if tone.nbytes > self.max_bytes:
+                return
+            self._tones[midi] = tone
+            self._bytes += tone.nbytes
+            while self._bytes > self.max_bytes:
+                _, dropped = self._tones.popitem(last=False)
+                self._bytes -= dropped.nbytes
+
+    def _render(self, midi, n_samples):
+        frequency = midi_to_hz(midi)
+        # Partials above Nyquist would alias
+        n_partials = sum(1 for k in range(1, len(PARTIALS) + 1) if frequency * k < self.sample_rate / 2)
+        table = _wavetable(n_partials)
+        step = frequency * WAVETABLE_SIZE / self.sample_rate
+        indices = (np.arange(n_samples, dtype=np.float64) * step).astype(np.int64) & (WAVETABLE_SIZE - 1)
+        tone = table[indices]
+        tone.flags.writeable = False
+        return tone
+
+
+@lru_cache(maxsize=None)
+def _wavetable(n_partials):
+    """One period of the first `n_partials` partials."""
+    phase = np.arange(WAVETABLE_SIZE) * (2 * np.pi / WAVETABLE_SIZE)
+    table = sum(amplitude * np.sin(k * phase) for k, amplitude in enumerate(PARTIALS[:n_partials], start=1))
+    return table.astype(np.float32)
+
+
+@lru_cache(maxsize=256)
+def _envelope(n_samples, sample_rate):
+    """Attack, decay and release for a note of `n_samples`; read-only, shared between notes."""
+    t = np.arange(n_samples, dtype=np.float32) / sample_rate
+    envelope = np.exp(-DECAY_PER_SECOND * t)
+    attack = min(n_samples, int(ATTACK_SECONDS * sample_rate))
+    release = min(n_samples - attack, int(RELEASE_SECONDS * sample_rate))
+    envelope[:attack] *= np.linspace(0, 1, attack, endpoint=False, dtype=np.float32)
+    if release:
+        envelope[n_samples - release:] *= np.linspace(1, 0, release, dtype=np.float32)
+    envelope.flags.writeable = False
+    return envelope
+
+
+_partials_caches = {}
+_partials_lock = threading.Lock()
+
+
+def _partials(sample_rate):
+    """The process-wide tone cache for a sample rate."""
+    with _partials_lock:
+        cache = _partials_caches.get(sample_rate)
+        if cache is None:
+            cache = _partials_caches[sample_rate] = _PartialsCache(sample_rate)
+        return cache
+
+
+def synthesize(notes, duration, sample_rate=SAMPLE_RATE):
+    """
+    Mix the notes into one mono track.
+
+    Args:
+        notes: Notes of the score, as parsed
+        duration: Length of the track in seconds (the video's duration)
+        sample_rate: Samples per second
+
+    Returns:
+        numpy.ndarray: float32 samples in [-PEAK_LEVEL, PEAK_LEVEL]
+    """
+    total = int(np.ceil(duration * sample_rate))
+    mix = np.zeros(total, dtype=np.float32)
+    tones = _partials(sample_rate)
+    for note in notes:
+        midi = note_to_midi(note["note"])
+        if midi is None:
+            continue
+        start = int(round(note["start_time"] * sample_rate))
+        n_samples = min(int(round(note["duration"] * sample_rate)), total - start)
+        if n_samples <= 0:
+            continue
+        mix[start:start + n_samples] += tones.get(midi, n_samples) * _envelope(n_samples, sample_rate)
+
+    peak = float(np.abs(mix).max()) if total else 0.0
+    if peak > 0:
+        mix *= PEAK_LEVEL / peak
+    return mix
+
+
+def write_soundtrack(notes, duration, output_file, sample_rate=SAMPLE_RATE):
+    """Synthesize the notes into a 16-bit mono WAV file."""
+    samples = (synthesize(notes, duration, sample_rate) * 32767).astype(np.int16)
+    with wave.open(output_file, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+    return output_file
@@ -0,0 +1,300 @@
+"""
+Background janitor for temporary session storage.
+
+Every upload leaves a `temp/session_<uuid>` directory behind, and every
+processed score is kept in the artifact store under `xml_files/`. The
+janitor keeps both bounded:
+
+- entries unused for longer than a TTL are evicted
+- when usage exceeds the disk quota, or free disk space drops below a
+  floor, the least recently used entries are evicted first
+- directories of jobs that are still running are never touched; a job marks
+  itself active with a `.active` marker file for as long as it runs
+- store objects are only evicted once no session links to them any more
+- caches passed as `caches` (e.g. encoded video segments) are evicted by
+  the same TTL and LRU rules
+- at start-up, markers left by processes that died are cleared and
+  half-finished session directories are removed
+
+Files hard-linked into several entries (a store object linked into two
+sessions) are counted once, with the most recently used of them, which is
+the last to be evicted and so the one whose eviction frees the bytes.
+Links from outside the swept entries are not seen: a session video also
+linked into the render library counts in full, though evicting the
+session frees nothing until the library lets go of it too.
+
+Callables passed as `before_sweep` (e.g. render library expiry) run at the
+start of every sweep, so whatever they release is reclaimed in the same pass.
+"""
+
+import os
+import time
+import shutil
+import socket
+import threading
+from contextlib import contextmanager
+
+ACTIVE_MARKER = '.active'
+SESSION_PREFIX = 'session_'
+# File system timestamps can lag time.time() slightly; never touch directories this fresh at start-up
+STARTUP_GRACE_SECONDS = 60
+
+
+def _path_files_and_mtime(path):
+    """Size in bytes per file (keyed by device and inode) and most recent modification time under `path`."""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return {(stat.st_dev, stat.st_ino): stat.st_size}, stat.st_mtime
+    files = {}
+    latest = os.stat(path).st_mtime
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            files[(stat.st_dev, stat.st_ino)] = stat.st_size
+            latest = max(latest, stat.st_mtime)
+    return files, latest
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class StorageJanitor:
+    def __init__(self, temp_dir, extra_dirs=(), artifact_store=None, ttl_seconds=24 * 3600, quota_bytes=None,
+                 min_free_bytes=None, interval_seconds=300, active_stale_seconds=3600, before_sweep=(), caches=()):
+        self.temp_dir = temp_dir
+        self.extra_dirs = list(extra_dirs)
+        self.artifact_store = artifact_store
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.interval_seconds = interval_seconds
+        self.active_stale_seconds = active_stale_seconds
+        self.before_sweep = list(before_sweep)
+        self.caches = list(caches)
+        self.hostname = socket.gethostname()
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Active job protection ---
+
+    def mark_active(self, session_dir):
+        """Protect `session_dir` from eviction until `mark_inactive` is called."""
+        with open(os.path.join(session_dir, ACTIVE_MARKER), 'w') as f:
+            f.write(f"{self.hostname} {os.getpid()}\n")
+
+    def mark_inactive(self, session_dir):
+        try:
+            os.remove(os.path.join(session_dir, ACTIVE_MARKER))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def active_job(self, session_dir):
+        """Protect `session_dir` from eviction while the block runs."""
+        self.mark_active(session_dir)
+        try:
+            yield
+        finally:
+            self.mark_inactive(session_dir)
+
+    def is_active(self, path):
+        """Whether a live job still owns `path`."""
+        marker = os.path.join(path, ACTIVE_MARKER)
+        try:
+            age = time.time() - os.path.getmtime(marker)
+            with open(marker) as f:
+                hostname, pid = f.read().split()
+        except (OSError, ValueError):
+            return False
+        if age > self.active_stale_seconds:
+            return False
+        if hostname == self.hostname:
+            return _pid_alive(int(pid))
+        # Owned by another host sharing the volume; trust the marker until it goes stale
+        return True
+
+    def touch(self, path):
+        """Record a use of `path` (e.g. a re-download) so LRU eviction keeps it."""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # --- Eviction ---
+
+    def _entries(self):
+        """
+        Yield (path, files, last_used) for every evictable entry, `files`
+        mapping a key per file to its size; hard links share a key.
+        """
+        if os.path.isdir(self.temp_dir):
+            for name in os.listdir(self.temp_dir):
+                path = os.path.join(self.temp_dir, name)
+                if not (name.startswith(SESSION_PREFIX) and os.path.isdir(path)) or self.is_active(path):
+                    continue
+                try:
+                    files, last_used = _path_files_and_mtime(path)
+                except OSError:
+                    continue
+                yield path, files, last_used
+        # Loose files, e.g. per-upload copies written before the artifact store existed
+        for directory in self.extra_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.isfile(path):
+                    files, last_used = _path_files_and_mtime(path)
+                    yield path, files, last_used
+        # Unreferenced objects and cache entries are linked nowhere else
+        if self.artifact_store is not None:
+            for path, size, last_used in self.artifact_store.iter_unreferenced():
+                yield path, {path: size}, last_used
+        for cache in self.caches:
+            for path, size, last_used in cache.iter_entries():
+                yield path, {path: size}, last_used
+
+    def _sized_entries(self):
+        """
+        (path, size, last_used) of every evictable entry, least recently used
+        first, with each file's bytes counted in the last entry to link it.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        counted = set()
+        sized = []
+        for path, files, last_used in reversed(entries):
+            sized.append((path, sum(size for key, size in files.items() if key not in counted), last_used))
+            counted.update(files)
+        sized.reverse()
+        return sized
+
+    def _remove(self, path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _free_bytes(self):
+        return shutil.disk_usage(self.temp_dir).free
+
+    def sweep(self):
+        """
+        Evict expired entries, then least recently used ones until usage is
+        under the quota and free space is above the floor.
+
+        Returns:
+            dict: Counts and bytes of what was evicted
+        """
+        for hook in self.before_sweep:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Janitor pre-sweep hook failed: {str(e)}")
+        with self._lock:
+            now = time.time()
+            entries = self._sized_entries()
+            usage = sum(size for _, size, _ in entries)
+            evicted, freed = 0, 0
+            for path, size, last_used in entries:
+                expired = self.ttl_seconds and now - last_used > self.ttl_seconds
+                over_quota = self.quota_bytes is not None and usage - freed > self.quota_bytes
+                low_disk = self.min_free_bytes is not None and self._free_bytes() < self.min_free_bytes
+                if not (expired or over_quota or low_disk):
+                    # Entries are oldest first, so nothing later is expired either
+                    break
+                self._remove(path)
+                evicted += 1
+                freed += size
+            if evicted:
+                print(f"Janitor evicted {evicted} entries, freed {freed / (1024 * 1024):.1f} MB")
+            return {"evicted": evicted, "freed_bytes": freed, "usage_bytes": usage - freed}
+
+    def startup_sweep(self):
+        """
+        Clear markers of dead jobs and drop session directories, left over
+        from before this process started, that never produced a video.
+        """
+        if os.path.isdir(self.temp_dir):
+            for name in os.listdir(self.temp_dir):
+                path = os.path.join(self.temp_dir, name)
+                if not (name.startswith(SESSION_PREFIX) and os.path.isdir(path)):
+                    continue
+                marker = os.path.join(path, ACTIVE_MARKER)
+                if os.path.exists(marker) and not self.is_active(path):
+                    os.remove(marker)
+                if self.is_active(path) or os.path.getmtime(path) >= self.started_at - STARTUP_GRACE_SECONDS:
+                    continue
+                if not any(f.endswith('.mp4') for f in os.listdir(path)):
+                    self._remove(path)
+        return self.sweep()
+
+    def ensure_free_space(self):
+        """Sweep right away if free disk space is below the floor; call before starting a job."""
+        if self.min_free_bytes is not None and self._free_bytes() < self.min_free_bytes:
+            self.sweep()
+
+    # --- Background thread ---
+
+    def start(self):
+        """Run the start-up sweep, then sweep every `interval_seconds` in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name='storage-janitor')
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        try:
+            self.startup_sweep()
+        except Exception as e:
+            print(f"Janitor start-up sweep failed: {str(e)}")
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Janitor sweep failed: {str(e)}")
+
+
+_janitor = None
+_janitor_lock = threading.Lock()
+
+
+def get_janitor(temp_dir, extra_dirs=(), artifact_store=None, before_sweep=(), caches=()):
+    """Return the process-wide janitor, creating and starting it on first use."""
+    global _janitor
+    import config
+
+    with _janitor_lock:
+        if _janitor is None:
+            _janitor = StorageJanitor(
+                temp_dir,
+                extra_dirs=extra_dirs,
+                artifact_store=artifact_store,
+                ttl_seconds=config.STORAGE_TTL_HOURS * 3600,
+                quota_bytes=config.STORAGE_QUOTA_MB * 1024 * 1024 if config.STORAGE_QUOTA_MB else None,
+                min_free_bytes=config.STORAGE_MIN_FREE_MB * 1024 * 1024 if config.STORAGE_MIN_FREE_MB else None,
+                interval_seconds=config.STORAGE_SWEEP_INTERVAL_SECONDS,
+                # Jobs are bounded by the OMR and render timeouts, so older markers are stale
+                active_stale_seconds=(config.OMR_TIMEOUT_SECONDS or 3600) + (config.RENDER_TIMEOUT_SECONDS or 6 * 3600) + 600,
+                before_sweep=before_sweep,
+                caches=caches,
+            )
+            _janitor.start()
+    return _janitor
@@ -0,0 +1,110 @@
+"""
+Storyboard previews of a video.
+
+Before a full render, a handful of keyframes is enough to see whether a
+score was read correctly (a wrong clef or key from OMR shows up as notes
+on the wrong strings). The keyframes are drawn by the same frame renderer
+as the video, at the draft frame size, so they show exactly what the video
+will; with nothing encoded, a storyboard takes about as long as setting up
+the renderer.
+
+Keyframes are taken where the set of sounding notes changes, spread over
+the piece, since a frame between two such boundaries shows nothing new.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+from fingering import assign_fingering
+from render_profiles import RENDER_PROFILES
+from synthesia import VIDEO_MODES, _excerpt, _frame_renderer
+
+KEYFRAME_COUNT = 12
+
+# Keyframes are drawn at the draft size; large enough to read the note labels
+KEYFRAME_SIZE = RENDER_PROFILES["draft"].frame_size
+
+# `time` is the time in the piece, `measure` its measure number (None without a measure index),
+# `notes` the names of the sounding notes and `image` the frame as an RGB array
+Keyframe = namedtuple('Keyframe', ['time', 'measure', 'notes', 'image'])
+
+# The keyframes of a file, and the MusicXML they were drawn from (for an image, what OMR produced)
+Storyboard = namedtuple('Storyboard', ['keyframes', 'score_path'])
+
+
+def keyframe_times(sounding, count=KEYFRAME_COUNT):
+    """
+    Up to `count` score times at which a new set of notes starts to sound.
+
+    Args:
+        sounding: `fingerboard_drawing.SoundingNotes` of the score
+
+    Returns:
+        list: Times in seconds, in order, evenly spread over the note changes
+    """
+    # Rests say nothing about how the score was read
+    candidates = [t for t, active in zip(sounding.boundaries, sounding.sets) if active]
+    if len(candidates) <= count:
+        return candidates
+    if count == 1:
+        return candidates[:1]
+    return [candidates[round(k * (len(candidates) - 1) / (count - 1))] for k in range(count)]
+
+
+def make_storyboard(notes, duration=None, mode="fingerboard", count=KEYFRAME_COUNT, frame_size=KEYFRAME_SIZE,
+                    measures=None, cancel_token=None):
+    """
+    Draw the keyframes of the video `synthesia.make_video` would render.
+
+    The arguments are those of `make_video`; with `measures`, the keyframes
+    are of that excerpt and show the times and measure numbers of the piece.
+    A `cancel_token` is checked before each keyframe.
+
+    Returns:
+        list: Keyframe per chosen time, empty if there are no notes
+    """
+    if mode not in VIDEO_MODES:
+        raise ValueError(f"Unknown video mode '{mode}'; expected one of {', '.join(VIDEO_MODES)}")
+    if any("position" not in note for note in notes):
+        assign_fingering(notes)
+
+    index = getattr(notes, "measures", None)
+    clock_offset = 0
+    if measures is not None:
+        notes, duration, clock_offset = _excerpt(notes, measures, duration)
+    if not notes:
+        return []
+    if duration is None:
+        last_note = notes[-1]
+        duration = last_note["start_time"] + last_note["duration"] + 1
+
+    renderer = _frame_renderer(notes, duration, frame_size, mode)
+    try:
+        keyframes = []
+        for t in keyframe_times(renderer.sounding, count):
+            if cancel_token is not None:
+                cancel_token.check()
+            clock = clock_offset + t
+            measure = index.measure_at(clock) if index else None
+            notes_sounding = tuple(name for name, _ in renderer.sounding.at(t))
+            keyframes.append(Keyframe(clock, measure, notes_sounding, renderer.frame(t, clock)))
+    finally:
+        renderer.close()
+    return keyframes
+
+
+def contact_sheet(keyframes, columns=4, gap=8):
+    """The keyframes as one PIL image, in rows of `columns`."""
+    if not keyframes:
+        raise ValueError("A contact sheet needs at least one keyframe")
+    height, width = keyframes[0].image.shape[:2]
+    columns = min(columns, len(keyframes))
+    rows = -(-len(keyframes) // columns)
+    sheet = np.full((rows * height + (rows - 1) * gap, columns * width + (columns - 1) * gap, 3), 40, dtype=np.uint8)
+    for i, keyframe in enumerate(keyframes):
+        y = (i // columns) * (height + gap)
+        x = (i % columns) * (width + gap)
+        sheet[y:y + height, x:x + width] = keyframe.image
+    return Image.fromarray(sheet)
@@ -5,65 +5,128 @@ of notes to play on a violin fingerboard from a musicxml file.
 """
 
 import os
+import re
+import glob
+import time
+import bisect
 import xml.etree.ElementTree as ET
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
-from moviepy import *
+from PIL import ImageDraw
+from render_profiler import RenderProfiler, PROFILE_ENV_VAR
+from render_progress import ProgressReporter, print_progress
+from fingering import assign_fingering
+from fingerboard_drawing import (NOTE_COLOR, TITLE_HEIGHT, SoundingNotes, fingerboard_layout, note_position,
+                                 draw_note_dot, draw_active_note, empty_fingerboard_image, title_font, title_text,
+                                 title_band)
+from measure_range import parse_measure_range
+from render_profiles import (RENDER_PROFILES, DEFAULT_PROFILE, Rendition, get_profile, parse_rendition,
+                             rendition_container)
+from video_encoder import VideoEncoder, EncoderFanout, FramePipeline
 
-# Violin string notes (G3, D4, A4, E5)
-VIOLIN_STRINGS = ["G", "D", "A", "E"]
-STRING_COLORS = [(139, 69, 19), (165, 42, 42), (205, 133, 63), (210, 180, 140)]  # Brown colors for strings
-NOTE_COLOR = (0, 191, 255)  # Deep sky blue for notes
-HIGHLIGHT_COLOR = (255, 0, 0)  # Red for currently playing note
+# Visualizations make_video can draw
+VIDEO_MODES = ("fingerboard", "falling")
 
-# Define the fingerboard dimensions
-FB_WIDTH = 800
-FB_HEIGHT = 300
-STRING_SPACING = FB_HEIGHT // 5
-FRET_SPACING = FB_WIDTH // 16
+class MeasureIndex:
+    """
+    Start time in seconds of every measure of a score, in measure number order.
+    
+    Only the first part is indexed: parts are read one after the other, so
+    a later part starts the measure numbers again.
+    """
+    def __init__(self):
+        self.numbers = []
+        self.starts = []
+        # End of the last indexed measure
+        self.end = 0.0
+        self._complete = False
+    
+    def add(self, number, start):
+        if self._complete:
+            return
+        if self.numbers and number < self.numbers[-1]:
+            self.finish(start)
+            return
+        self.numbers.append(number)
+        self.starts.append(start)
+    
+    def finish(self, end):
+        if not self._complete:
+            self.end = end
+            self._complete = True
+    
+    def __len__(self):
+        return len(self.numbers)
+    
+    def measure_at(self, t):
+        """Number of the measure playing at time `t`, or None before the first one."""
+        i = bisect.bisect_right(self.starts, t) - 1
+        return self.numbers[i] if i >= 0 else None
+    
+    def span(self, first, last):
+        """
+        (start, end) in seconds of measures `first` to `last`, inclusive.
+        
+        Raises:
+            ValueError: If none of those measures is in the score
+        """
+        i = bisect.bisect_left(self.numbers, first)
+        j = bisect.bisect_right(self.numbers, last)
+        if i >= j:
+            raise ValueError(f"Measures {first}-{last} are not in the score")
+        return self.starts[i], self.starts[j] if j < len(self.starts) else self.end
 
-# Define the note positions on each string
-# This is a simplified mapping of notes to finger positions
-NOTE_POSITIONS = {
-    # G string (G3 to G5)
-    "G3": (0, 0), "G#3": (1, 0), "A3": (2, 0), "A#3": (3, 0), 
-    "B3": (4, 0), "C4": (5, 0), "C#4": (6, 0), "D4": (7, 0),
-    "D#4": (8, 0), "E4": (9, 0), "F4": (10, 0), "F#4": (11, 0),
-    "G4": (12, 0), "G#4": (13, 0), "A4": (14, 0), "A#4": (15, 0),
-    
-    # D string (D4 to D6)
-    "D4": (0, 1), "D#4": (1, 1), "E4": (2, 1), "F4": (3, 1),
-    "F#4": (4, 1), "G4": (5, 1), "G#4": (6, 1), "A4": (7, 1),
-    "A#4": (8, 1), "B4": (9, 1), "C5": (10, 1), "C#5": (11, 1),
-    "D5": (12, 1), "D#5": (13, 1), "E5": (14, 1), "F5": (15, 1),
-    
-    # A string (A4 to A6)
-    "A4": (0, 2), "A#4": (1, 2), "B4": (2, 2), "C5": (3, 2),
-    "C#5": (4, 2), "D5": (5, 2), "D#5": (6, 2), "E5": (7, 2),
-    "F5": (8, 2), "F#5": (9, 2), "G5": (10, 2), "G#5": (11, 2),
-    "A5": (12, 2), "A#5": (13, 2), "B5": (14, 2), "C6": (15, 2),
-    
-    # E string (E5 to E7)
-    "E5": (0, 3), "F5": (1, 3), "F#5": (2, 3), "G5": (3, 3),
-    "G#5": (4, 3), "A5": (5, 3), "A#5": (6, 3), "B5": (7, 3),
-    "C6": (8, 3), "C#6": (9, 3), "D6": (10, 3), "D#6": (11, 3),
-    "E6": (12, 3), "F6": (13, 3), "F#6": (14, 3), "G6": (15, 3),
-}
+class ParsedScore(list):
+    """The notes of a score, with its MeasureIndex as `measures`."""
+    def __init__(self, notes=(), measures=None):
+        super().__init__(notes)
+        self.measures = measures if measures is not None else MeasureIndex()
 
-def parse_musicxml(file_path):
-    """Parse musicxml file and extract notes with timing information."""
-    tree = ET.parse(file_path)
-    root = tree.getroot()
+def _measure_number(measure, previous):
+    # Numbers such as "12a" (a measure split by a repeat) count as measure 12; unnumbered ones as the previous
+    digits = re.match(r'\d+', measure.get('number', ''))
+    return int(digits.group()) if digits else previous
+
+def parse_musicxml(file_path, measures=None):
+    """
+    Parse musicxml file and extract notes with timing information.
+    
+    Each note also gets its fingering as "position": (position, string index),
+    or None if it is out of the violin's range.
+    
+    With `measures` as (first, last) measure numbers, only the notes of those
+    measures are kept, at their times in the whole piece; measures before
+    them are only timed, and the file is not read past the last one.
     
+    Returns:
+        ParsedScore: The notes, a list, with the start time of every measure
+        read in its `measures` index
+    """
     notes = []
+    index = MeasureIndex()
     current_time = 0
+    # Start of the last note that was not a chord member
+    chord_start = 0
+    number = 0
+    divisions = None
+    first, last = measures if measures is not None else (None, None)
     
-    # Find divisions (ticks per quarter note)
-    divisions = int(root.find('.//divisions').text)
-    
-    # Process each measure
-    for measure in root.findall('.//measure'):
+    # Measures are handled as they are read, so a window can stop reading the file early
+    for _, measure in ET.iterparse(file_path):
+        if measure.tag != 'measure':
+            continue
+        number = _measure_number(measure, number)
+        index.add(number, current_time)
+        in_window = measures is None or first <= number <= last
+        
+        # Find divisions (ticks per quarter note), given in the first measure's attributes
+        if divisions is None:
+            divisions_elem = measure.find('.//divisions')
+            if divisions_elem is not None:
+                divisions = int(divisions_elem.text)
+        
         for note in measure.findall('note'):
+            if divisions is None:
+                raise ValueError("The score has notes before its <divisions>")
             # Skip rests
             if note.find('rest') is not None:
                 if note.find('duration') is not None:
@@ -75,80 +138,116 @@ def parse_musicxml(file_path):
             pitch = note.find('pitch')
             if pitch is None:
                 continue
+            
+            # Get duration
+            duration = int(note.find('duration').text)
+            duration_in_seconds = duration / divisions
+            if note.find('chord') is not None:
+                # A chord member sounds with the previous note instead of after it
+                start_time = chord_start
+            else:
+                start_time = chord_start = current_time
+                current_time += duration_in_seconds
+            if not in_window:
+                continue
                 
             step = pitch.find('step').text
             octave = pitch.find('octave').text
             
-            # Check for accidentals
+            # Check for accidentals; <alter> is in semitones and may be fractional ("1.0", or microtones)
             alter_elem = pitch.find('alter')
             alter = 0
             if alter_elem is not None:
-                alter = int(alter_elem.text)
+                alter = round(float(alter_elem.text))
             
-            # Determine the note name
-            accidental = ""
-            if alter == 1:
-                accidental = "#"
-            elif alter == -1:
-                accidental = "b"
+            # Determine the note name: "#"/"b" per semitone, so double sharps and flats read "##"/"bb"
+            accidental = "#" * alter if alter > 0 else "b" * -alter
             
             note_name = f"{step}{accidental}{octave}"
             
-            # Get duration
-            duration = int(note.find('duration').text)
-            duration_in_seconds = duration / divisions
-            
             # Add the note to our list
             notes.append({
                 "note": note_name,
-                "start_time": current_time,
+                "start_time": start_time,
                 "duration": duration_in_seconds
             })
-            
-            current_time += duration_in_seconds
+        
+        # Parsed measures are not needed again
+        measure.clear()
+        if measures is not None and number >= last:
+            break
     
-    return notes
+    index.finish(current_time)
+    return ParsedScore(assign_fingering(notes), index)
 
 def create_fingerboard_frame(notes, current_time, frame_size=(1280, 720)):
     """Create a single frame of the fingerboard with the current note highlighted."""
-    # Create a blank canvas
-    img = Image.new('RGB', frame_size, color=(0, 0, 0))
-    draw = ImageDraw.Draw(img)
+    return np.array(draw_fingerboard_image(notes, current_time, frame_size), dtype=np.uint8)
+
+class FingerboardRenderer:
+    """
+    Frames of the fingerboard visualization.
+    
+    The fingerboard with the dots of every note is drawn once, the sounding
+    notes are highlighted on a copy of it only when they change, and a frame
+    is that image with the title line written in. Produces the same pixels
+    as `create_fingerboard_frame`.
+    """
+    def __init__(self, notes, frame_size=(1280, 720)):
+        self.frame_size = frame_size
+        self.layout = fingerboard_layout(frame_size)
+        self.title_height = int(round(TITLE_HEIGHT * self.layout.scale))
+        self.sounding = SoundingNotes(notes)
+        
+        self._dots = empty_fingerboard_image(frame_size).copy()
+        draw = ImageDraw.Draw(self._dots)
+        positions = [pos for pos in dict.fromkeys(note_position(note) for note in notes) if pos]
+        for note_pos in positions:
+            draw_note_dot(draw, note_pos, self.layout, NOTE_COLOR)
+        # What every frame shows of the piece as a whole; a dot marks a position, whichever note is played there
+        self.static_positions = sorted(positions)
+        self._active = None
+        self._highlighted = None
     
-    # Calculate the position of the fingerboard in the frame
-    fb_x = (frame_size[0] - FB_WIDTH) // 2
-    fb_y = (frame_size[1] - FB_HEIGHT) // 2
-    
-    # Draw the fingerboard
-    draw.rectangle([fb_x, fb_y, fb_x + FB_WIDTH, fb_y + FB_HEIGHT], fill=(50, 50, 50), outline=(100, 100, 100))
-    
-    # Draw the strings
-    for i, string in enumerate(VIOLIN_STRINGS):
-        y = fb_y + (i + 1) * STRING_SPACING
-        draw.line([(fb_x, y), (fb_x + FB_WIDTH, y)], fill=STRING_COLORS[i], width=3)
-        # Label the strings
-        draw.text((fb_x - 30, y - 10), string, fill=(255, 255, 255))
-    
-    # Draw fret markers and label the positions
-    # Label position 0
-    draw.text((fb_x - 5, fb_y - 20), "0", fill=(150, 150, 150))
-    # Label the rest of the positions
-    for i in range(1, 16):
-        x = fb_x + i * FRET_SPACING
-        draw.line([(x, fb_y), (x, fb_y + FB_HEIGHT)], fill=(100, 100, 100), width=1)
-        # Label the positions: 0, -1, 1, 2, 2+, 3, ..., 13
-        if i == 1:
-            label = "-1"
-        elif i == 2:
-            label = "1"
-        elif i == 3:
-            label = "2"
-        elif i == 4:
-            label = "2+"
-        else: # i >= 5
-            label = str(i - 2)
-        # Adjust x-position for better alignment
-        draw.text((x - 5, fb_y - 20), label, fill=(150, 150, 150))
+    def _highlight(self, active):
+        """(frame array, labels) with the notes of `active` highlighted; redrawn only when `active` changes."""
+        if active is not self._active:
+            img = self._dots.copy()
+            draw = ImageDraw.Draw(img)
+            labels = []
+            for note_name, position in active:
+                label = draw_active_note(draw, {"note": note_name, "position": position}, self.layout)
+                if label:
+                    labels.append(label)
+            self._active = active
+            self._highlighted = (np.asarray(img), labels)
+        return self._highlighted
+    
+    # Notes appear only when they sound
+    lookahead = 0
+    
+    def frame(self, t, clock=None):
+        """
+        Render the frame at score time `t` as an RGB array.
+        
+        The title shows `clock` as the time if given, e.g. the playback time
+        of a slowed-down video, and `t` otherwise.
+        """
+        fingerboard, labels = self._highlight(self.sounding.at(t))
+        frame = fingerboard.copy()
+        frame[:self.title_height] = title_band(title_text(labels, t if clock is None else clock),
+                                                self.frame_size[0], self.layout.scale)
+        return frame
+    
+    def close(self):
+        self._active = self._highlighted = None
+
+def draw_fingerboard_image(notes, current_time, frame_size=(1280, 720)):
+    """Draw a single frame of the fingerboard as a PIL image."""
+    # Start from the empty fingerboard, which is the same on every frame
+    layout = fingerboard_layout(frame_size)
+    img = empty_fingerboard_image(frame_size).copy()
+    draw = ImageDraw.Draw(img)
     
     # --- Determine Active Notes --- 
     active_notes_this_frame = []
@@ -160,147 +259,452 @@ def create_fingerboard_frame(notes, current_time, frame_size=(1280, 720)):
     # --- Draw Inactive Notes (Blue) --- 
     for note in notes:
         if note not in active_notes_this_frame:
-            note_name = note["note"]
-            base_note = note_name # Reset base_note
-
-            # Handle accidentals
-            if "#" in note_name: base_note = note_name.replace("#", "")
-            elif "b" in note_name:
-                step, octave = note_name[0], note_name[-1]
-                if step == "A": base_note = f"G#{octave}"
-                elif step == "B": base_note = f"A#{octave}"
-                elif step == "C": base_note = f"B{int(octave)-1}"
-                elif step == "D": base_note = f"C#{octave}"
-                elif step == "E": base_note = f"D#{octave}"
-                elif step == "F": base_note = f"E{octave}"
-                elif step == "G": base_note = f"F#{octave}"
-            
-            # Get position
-            try:
-                note_pos = NOTE_POSITIONS.get(note_name) or NOTE_POSITIONS.get(base_note)
-                if note_pos:
-                    pos_x, string_idx = note_pos
-                    x = fb_x + pos_x * FRET_SPACING
-                    y = fb_y + (string_idx + 1) * STRING_SPACING
-                    # Draw inactive note
-                    draw.ellipse((x - 10, y - 10, x + 10, y + 10), fill=NOTE_COLOR, outline=(255, 255, 255))
-            except Exception: pass # Ignore errors for inactive notes
+            note_pos = note_position(note)
+            if note_pos:
+                # Draw inactive note
+                draw_note_dot(draw, note_pos, layout, NOTE_COLOR)
     # --- End Draw Inactive Notes ---
 
     # --- Draw Active Notes (Red) and Labels --- 
     active_note_names = []
     for note in active_notes_this_frame: # Iterate only through active notes
-        note_name = note["note"]
-        base_note = note_name # Reset base_note
+        label = draw_active_note(draw, note, layout)
+        if label:
+            active_note_names.append(label) # Add the new label to list for title
+    # --- End Draw Active Notes ---
 
-        # Handle accidentals (same logic as above)
-        if "#" in note_name: base_note = note_name.replace("#", "")
-        elif "b" in note_name:
-            step, octave = note_name[0], note_name[-1]
-            if step == "A": base_note = f"G#{octave}"
-            elif step == "B": base_note = f"A#{octave}"
-            elif step == "C": base_note = f"B{int(octave)-1}"
-            elif step == "D": base_note = f"C#{octave}"
-            elif step == "E": base_note = f"D#{octave}"
-            elif step == "F": base_note = f"E{octave}"
-            elif step == "G": base_note = f"F#{octave}"
+    # Add some information at the top
+    font = title_font(layout.scale)
+    title = title_text(active_note_names, current_time)
+    draw.text((frame_size[0] // 2 - 150 * layout.scale, 30 * layout.scale), title, fill=(255, 255, 255), font=font)
+    
+    return img
 
-        # Get position
-        try:
-            note_pos = NOTE_POSITIONS.get(note_name) or NOTE_POSITIONS.get(base_note)
-            if note_pos:
-                pos_x, string_idx = note_pos
-                x = fb_x + pos_x * FRET_SPACING
-                y = fb_y + (string_idx + 1) * STRING_SPACING
+def make_video(notes, output_file="violin_tutorial.mp4", fps=None, duration=None, logger="bar", profiler=None,
+               progress_callback=None, cancel_token=None, segment_cache=None, mode="fingerboard", audio=False,
+               profile=DEFAULT_PROFILE, renditions=(), measures=None):
+    """
+    Create a video tutorial of the notes to be played on the violin.
+    
+    `profile` names one of `render_profiles.RENDER_PROFILES` ("draft",
+    "standard", "archive"), which sets the resolution, frame rate and encoder
+    settings; `fps` overrides the profile's frame rate. With
+    `logger="bar"` and no `progress_callback`, progress is printed to the
+    terminal.
+    
+    Pass a `render_profiler.RenderProfiler` as `profiler` to time frame
+    drawing, numpy conversion and encoding separately, and a callable as
+    `progress_callback` to receive `render_progress.RenderProgress` updates.
+    A `job_control.CancelToken` passed as `cancel_token` is checked before
+    every frame; cancelling it (or passing its deadline) aborts the render
+    with `RenderCancelled`.
+    
+    With a `segment_cache.SegmentCache` as `segment_cache`, the video is
+    encoded in fixed-length segments and only segments whose content
+    changed since an earlier render are drawn and encoded again.
+    
+    `mode` is one of VIDEO_MODES: "fingerboard" highlights the sounding
+    notes on a static fingerboard, "falling" scrolls the notes down toward
+    the fingerboard (see `falling_notes`).
+    
+    With `audio`, a soundtrack of the notes is synthesized (see `soundtrack`)
+    and muxed into the video by the encoder.
+    
+    `renditions` lists further outputs of the same video as
+    `render_profiles.Rendition`s (or "PATH=WxH@BITRATE" strings), e.g. a
+    small, low-bitrate copy for phones next to the main output. Frames are
+    drawn once at the largest size asked for and each output is scaled from
+    them by its own encoder, so a rendition costs its encode and not another
+    render. All sizes must share the profile's aspect ratio.
+    
+    `measures` as (first, last) measure numbers (or "17-32") renders only
+    that excerpt of a score from `parse_musicxml`, located with its measure
+    index; `duration` then defaults to the excerpt's length. The title keeps
+    showing the time in the whole piece.
+    """
+    if mode not in VIDEO_MODES:
+        raise ValueError(f"Unknown video mode '{mode}'; expected one of {', '.join(VIDEO_MODES)}")
+    profile = get_profile(profile, fps)
+    fps = profile.fps
+    outputs = _resolve_outputs(output_file, profile, renditions)
+    # Draw at the largest output size; the smaller outputs are scaled down from it
+    frame_size = max((output.frame_size for output in outputs), key=lambda size: size[1])
+    profile = profile._replace(frame_size=frame_size)
+    if progress_callback is None and logger == "bar":
+        progress_callback = print_progress
+    
+    if any("position" not in note for note in notes):
+        assign_fingering(notes)
+    
+    clock_offset = 0
+    if measures is not None:
+        notes, duration, clock_offset = _excerpt(notes, measures, duration)
+    
+    if duration is None:
+        # Calculate duration from the last note
+        last_note = notes[-1]
+        duration = last_note["start_time"] + last_note["duration"] + 1  # Add 1 second buffer at the end
+    
+    renderer = _frame_renderer(notes, duration, frame_size, mode)
+    draw_frame = renderer.frame
+    if clock_offset:
+        def draw_frame(t, clock=None):
+            return renderer.frame(t, t + clock_offset if clock is None else clock)
+    if cancel_token is not None:
+        cancel_token.check()
+    reporter = None
+    if progress_callback is not None:
+        reporter = ProgressReporter(int(np.ceil(duration * fps)), progress_callback)
+    make_frame = _instrument(draw_frame, profiler, cancel_token, reporter)
+    
+    audio_file = None
+    if audio:
+        from soundtrack import write_soundtrack
+        audio_start = time.perf_counter()
+        audio_file = write_soundtrack(notes, duration, os.path.splitext(output_file)[0] + ".soundtrack.wav")
+        if profiler is not None:
+            profiler.add_stage_time("audio", time.perf_counter() - audio_start)
+    
+    try:
+        if segment_cache is not None:
+            # Falling notes are on screen `lookahead` seconds before they sound
+            _write_segmented(make_frame, notes, duration, profile, outputs, segment_cache, reporter,
+                             mode=mode, lookahead=renderer.lookahead, static_positions=renderer.static_positions,
+                             audio_file=audio_file,
+                             clock_offset=clock_offset, profiler=profiler)
+        else:
+            encoder = _open_encoders(outputs, profile, [output.output_file for output in outputs], audio_file)
+            _pipe_frames(encoder, make_frame, 0, int(np.ceil(duration * fps)), fps, profiler)
+    finally:
+        renderer.close()
+        if audio_file is not None and os.path.exists(audio_file):
+            os.remove(audio_file)
+    
+    if reporter is not None:
+        reporter.finish()
+    
+    if profiler is not None:
+        profiler.add_stage_time("draw", sum(profiler.frame_draw_ms) / 1000)
+    
+    return output_file
 
-                # Draw the active note in highlight color (overwriting if necessary)
-                draw.ellipse((x - 10, y - 10, x + 10, y + 10), fill=HIGHLIGHT_COLOR, outline=(255, 255, 255))
+def _excerpt(notes, measures, duration=None):
+    """
+    The notes of measures (first, last) of a ParsedScore, moved to start at 0.
+    
+    Returns:
+        tuple: (notes, duration, clock offset); the offset is the excerpt's
+        start in the piece, for the time shown in the title
+    """
+    if isinstance(measures, str):
+        measures = parse_measure_range(measures)
+    index = getattr(notes, "measures", None)
+    if index is None:
+        raise ValueError("Rendering measures needs a score from parse_musicxml, which has the measure index")
+    start, end = index.span(*measures)
+    excerpt = [dict(note, start_time=note["start_time"] - start) for note in notes
+               if start <= note["start_time"] < end]
+    if duration is None:
+        duration = end - start + 1  # Same 1 second buffer as a whole piece
+    return excerpt, duration, start
 
-                # Determine the finger position label based on pos_x
-                if pos_x == 0:
-                    fret_label = "0"
-                elif pos_x == 1:
-                    fret_label = "-1"
-                elif pos_x == 2:
-                    fret_label = "1"
-                elif pos_x == 3:
-                    fret_label = "2"
-                elif pos_x == 4:
-                    fret_label = "2+"
-                else: # pos_x >= 5
-                    fret_label = str(pos_x - 2)
+def _frame_renderer(notes, duration, frame_size, mode):
+    """The renderer for a video mode; `frame(t, clock=None)` draws a frame, `close()` releases it."""
+    if mode == "falling":
+        from falling_notes import FallingNotesRenderer
+        return FallingNotesRenderer(notes, duration, frame_size=frame_size)
+    return FingerboardRenderer(notes, frame_size)
 
-                # Display note name above using the finger position label
-                step = note["note"][0]  # Get the note letter (e.g., 'E')
-                new_label = f"{step}{fret_label}"  # Create the new label (e.g., 'E1', 'C2+')
-                draw.text((x - 15, y - 30), new_label, fill=(255, 255, 255))
+def _instrument(make_frame, profiler=None, cancel_token=None, reporter=None):
+    """Wrap `make_frame(t, clock=None)` with frame timing, cancellation checks and progress reports."""
+    if profiler is not None:
+        draw_frame = make_frame
+        def make_frame(t, clock=None):
+            start = time.perf_counter()
+            frame = draw_frame(t, clock)
+            profiler.record_frame(time.perf_counter() - start)
+            return frame
+    
+    if cancel_token is not None:
+        render_frame = make_frame
+        def make_frame(t, clock=None):
+            cancel_token.check()
+            return render_frame(t, clock)
+    
+    if reporter is not None:
+        report_frame = make_frame
+        def make_frame(t, clock=None):
+            frame = report_frame(t, clock)
+            reporter.frame_done()
+            return frame
+    return make_frame
 
-                active_note_names.append(new_label) # Add the new label to list for title
-        except Exception as e:
-             # print(f"Warning: Could not process active note {note} at time {current_time}: {e}") # Optional debug
-             pass
-    # --- End Draw Active Notes ---
+def _resolve_outputs(output_file, profile, renditions):
+    """The main output and the renditions, with their frame sizes and containers filled in."""
+    outputs = [Rendition(output_file, profile.frame_size)]
+    for rendition in renditions:
+        if isinstance(rendition, str):
+            rendition = parse_rendition(rendition)
+        rendition = Rendition(*rendition)
+        outputs.append(rendition._replace(frame_size=tuple(rendition.frame_size or profile.frame_size),
+                                          container=rendition_container(rendition)))
+    
+    width, height = profile.frame_size
+    seen = set()
+    for output in outputs:
+        out_width, out_height = output.frame_size
+        if out_width % 2 or out_height % 2:
+            raise ValueError(f"Frame size {out_width}x{out_height} of {output.output_file} must be even")
+        if abs(out_width / out_height - width / height) > 0.01:
+            raise ValueError(f"Frame size {out_width}x{out_height} of {output.output_file} doesn't match the "
+                             f"{width}x{height} aspect ratio of the render")
+        path = os.path.abspath(output.output_file)
+        if path in seen:
+            raise ValueError(f"{output.output_file} is listed as more than one output")
+        seen.add(path)
+    return outputs
 
-    # Add some information at the top
+def _open_encoders(outputs, profile, paths, audio_file=None, faststart=True):
+    """One encoder per output, writing to `paths`; several are fed through an EncoderFanout."""
+    encoders = []
     try:
-        font = ImageFont.truetype("Arial", 24)
-    except:
-        font = ImageFont.load_default()
-
-    # Display active note name(s) at the top, or just the time
-    if active_note_names:
-        title = f"Now Playing: {', '.join(active_note_names)} (Time: {current_time:.2f}s)"
-    else:
-        title = f"Time: {current_time:.2f}s"
+        for output, path in zip(outputs, paths):
+            encoders.append(VideoEncoder(path, profile, audio_file=audio_file, faststart=faststart,
+                                         frame_size=output.frame_size, bitrate=output.bitrate,
+                                         container=output.container))
+    except BaseException:
+        for encoder in encoders:
+            encoder.abort()
+        raise
+    return encoders[0] if len(encoders) == 1 else EncoderFanout(encoders)
 
-    draw.text((frame_size[0] // 2 - 150, 30), title, fill=(255, 255, 255), font=font)
+def _pipe_frames(encoder, make_frame, start_frame, end_frame, fps, profiler=None):
+    """
+    Draw frames start_frame..end_frame-1 while a FramePipeline encodes the earlier ones, then finish `encoder`.
     
-    return np.array(img, dtype=np.uint8)
+    The profiler's "encode" stage gets the time drawing waited on the encoder: handing it frames (all
+    of encoding when frames are written inline) and finishing the file.
+    """
+    encode_seconds = 0.0
+    with FramePipeline(encoder) as pipeline:
+        for i in range(start_frame, end_frame):
+            # `frame` keeps the previous frame alive while the next one is drawn; freeing it
+            # first lets malloc return the memory and page-fault it back in on every frame
+            frame = make_frame(i / fps)
+            write_start = time.perf_counter()
+            pipeline.write_frame(frame)
+            encode_seconds += time.perf_counter() - write_start
+        close_start = time.perf_counter()
+    encode_seconds += time.perf_counter() - close_start
+    if profiler is not None:
+        profiler.add_stage_time("encode", encode_seconds)
 
-def make_video(notes, output_file="violin_tutorial.mp4", fps=30, duration=None):
-    """Create a video tutorial of the notes to be played on the violin."""
-    if duration is None:
-        # Calculate duration from the last note
-        last_note = notes[-1]
-        duration = last_note["start_time"] + last_note["duration"] + 1  # Add 1 second buffer at the end
+def _write_segmented(make_frame, notes, duration, profile, outputs, segment_cache, reporter=None,
+                     mode="fingerboard", lookahead=0, static_positions=(), audio_file=None, clock_offset=0,
+                     profiler=None):
+    """
+    Encode changed segments of every output, reuse cached ones, and join each output's segments.
     
-    # Create a clip using MoviePy
-    clip = VideoClip(lambda t: create_fingerboard_frame(notes, t), duration=duration)
+    The profiler, if any, counts the "segments" and how many were "segments_reused".
+    """
+    from segment_cache import SEGMENT_SECONDS, segment_key, concat_segments
     
-    # Set the frame rate
-    clip = clip.with_fps(fps)
+    fps = profile.fps
+    output_settings = []
+    for output in outputs:
+        settings = dict(profile._asdict(), codec="libx264", mode=mode)
+        if output.frame_size != profile.frame_size:
+            settings["output_size"] = output.frame_size
+        if output.bitrate is not None:
+            settings["bitrate"] = output.bitrate
+        if clock_offset:
+            # The title of an excerpt shows the time in the whole piece
+            settings["clock_offset"] = clock_offset
+        output_settings.append(settings)
+    total_frames = int(np.ceil(duration * fps))
+    frames_per_segment = SEGMENT_SECONDS * fps
     
-    # Write the result to a file
-    clip.write_videofile(output_file, codec="libx264", fps=fps)
+    segment_paths = [[] for _ in outputs]
+    segments = 0
+    reused = 0
+    for start_frame in range(0, total_frames, frames_per_segment):
+        end_frame = min(start_frame + frames_per_segment, total_frames)
+        keys = [segment_key(notes, static_positions, start_frame, end_frame, fps, settings, lookahead=lookahead)
+                for settings in output_settings]
+        paths = [segment_cache.get(key) for key in keys]
+        # Outputs that need this segment encoded; the frames are drawn once for all of them
+        missing = [k for k, path in enumerate(paths) if path is None]
+        if not missing:
+            reused += 1
+            if reporter is not None:
+                reporter.frame_done(end_frame - start_frame)
+        else:
+            tmp_paths = [segment_cache.new_temp_path() for _ in missing]
+            try:
+                # Segments are always MP4; the container of an output is set when they are joined
+                encoder = _open_encoders([outputs[k]._replace(container=None) for k in missing], profile, tmp_paths,
+                                         faststart=False)
+                _pipe_frames(encoder, make_frame, start_frame, end_frame, fps, profiler)
+            except BaseException:
+                for tmp_path in tmp_paths:
+                    os.remove(tmp_path)
+                raise
+            for k, tmp_path in zip(missing, tmp_paths):
+                paths[k] = segment_cache.put(keys[k], tmp_path)
+        for k, path in enumerate(paths):
+            segment_paths[k].append(path)
+        segments += 1
     
-    return output_file
+    # The soundtrack is not segmented; it is muxed in while the segments are joined
+    for output, paths in zip(outputs, segment_paths):
+        concat_segments(paths, output.output_file, audio_file=audio_file, container=output.container)
+    if profiler is not None:
+        profiler.count("segments", segments)
+        profiler.count("segments_reused", reused)
+    return reused, segments
+
+def _rendition_arg(spec):
+    try:
+        return parse_rendition(spec)
+    except ValueError as e:
+        import argparse
+        raise argparse.ArgumentTypeError(str(e))
+
+def _measures_arg(text):
+    try:
+        return parse_measure_range(text)
+    except ValueError as e:
+        import argparse
+        raise argparse.ArgumentTypeError(str(e))
 
 def main():
     """Main function to run the application."""
     import argparse
     
     parser = argparse.ArgumentParser(description="Generate a Synthesia-like video for violin from a MusicXML file.")
-    parser.add_argument("input_file", help="Input MusicXML file")
+    parser.add_argument("inputs", nargs="+", metavar="input_file",
+                        help="Input MusicXML file, or directories/globs of MusicXML files for batch mode")
     parser.add_argument("--output", "-o", default="violin_tutorial.mp4", help="Output video file (default: violin_tutorial.mp4)")
-    parser.add_argument("--fps", type=int, default=30, help="Frames per second (default: 30)")
+    parser.add_argument("--quality", choices=list(RENDER_PROFILES), default=DEFAULT_PROFILE,
+                        help="Render profile: draft for a quick preview, standard, or archive "
+                             f"(default: {DEFAULT_PROFILE})")
+    parser.add_argument("--fps", type=int, default=None, help="Frames per second (default: set by the profile)")
+    parser.add_argument("--rendition", action="append", default=[], type=_rendition_arg, metavar="PATH[=WxH][@BITRATE]",
+                        help="Also write the video to PATH, scaled to WxH and/or at BITRATE (e.g. phone.mp4=640x360@800k); "
+                             "repeat for more outputs. The frames are drawn once for all of them")
+    batch_group = parser.add_argument_group("batch mode")
+    batch_group.add_argument("--output-dir", default="videos", help="Output directory for batch mode (default: videos)")
+    batch_group.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes for batch mode (default: CPU count)")
+    batch_group.add_argument("--summary", default=None, help="JSON summary path for batch mode (default: <output-dir>/batch_summary.json)")
+    batch_group.add_argument("--force", action="store_true", help="Re-render outputs even if they are up to date")
+    parser.add_argument("--mode", choices=VIDEO_MODES, default="fingerboard",
+                        help="Visualization: highlighted fingerboard, or notes falling toward it (default: fingerboard)")
+    parser.add_argument("--audio", action="store_true", help="Add a synthesized soundtrack of the notes")
+    parser.add_argument("--measures", type=_measures_arg, default=None, metavar="FIRST-LAST",
+                        help="Render only these measures, e.g. 17-32; the rest of the score is not read")
+    parser.add_argument("--tempos", default=None, metavar="PERCENTS",
+                        help="Write practice versions at these tempos in one pass, e.g. 50,75,100; each goes to "
+                             "<output>_<tempo>pct.mp4")
+    parser.add_argument("--storyboard", metavar="PNG", default=None,
+                        help="Instead of the video, write a contact sheet of a dozen keyframes to PNG, to check that "
+                             "the score was read correctly")
+    parser.add_argument("--segment-cache", metavar="DIR", default=None,
+                        help="Cache encoded segments in DIR; re-rendering an edited score only re-encodes changed passages")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Write per-stage timers and memory peaks next to the output (or set {PROFILE_ENV_VAR}=1)")
+    parser.add_argument("--cprofile", action="store_true", help="With --profile, also dump a cProfile trace")
     
     args = parser.parse_args()
     
-    if not os.path.exists(args.input_file):
-        print(f"Error: Input file '{args.input_file}' not found.")
+    if args.profile or args.cprofile:
+        # Set through the environment so batch worker processes pick it up too
+        os.environ[PROFILE_ENV_VAR] = "cprofile" if args.cprofile else "1"
+    
+    if len(args.inputs) > 1 or not os.path.isfile(args.inputs[0]):
+        if len(args.inputs) == 1 and not os.path.isdir(args.inputs[0]) and not glob.has_magic(args.inputs[0]):
+            print(f"Error: Input file '{args.inputs[0]}' not found.")
+            return
+        if args.rendition or args.tempos or args.measures or args.storyboard:
+            print("Error: --rendition, --tempos, --measures and --storyboard need a single input file.")
+            return
+        from batch_renderer import run_batch
+        summary = run_batch(args.inputs, args.output_dir, fps=args.fps, profile=args.quality, jobs=args.jobs,
+                            summary_path=args.summary, force=args.force, mode=args.mode,
+                            audio=args.audio)
+        if summary["failed"]:
+            raise SystemExit(1)
         return
     
-    print(f"Parsing MusicXML file: {args.input_file}")
-    notes = parse_musicxml(args.input_file)
+    input_file = args.inputs[0]
+    profiler = RenderProfiler.from_env()
+    if profiler is not None:
+        profiler.start()
+    
+    print(f"Parsing MusicXML file: {input_file}")
+    if profiler is not None:
+        with profiler.stage("parse"):
+            notes = parse_musicxml(input_file, measures=args.measures)
+    else:
+        notes = parse_musicxml(input_file, measures=args.measures)
     
     if not notes:
         print("No notes found in the input file.")
         return
+    if args.measures:
+        try:
+            notes.measures.span(*args.measures)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+    
+    if args.storyboard:
+        from storyboard import make_storyboard, contact_sheet
+        keyframes = make_storyboard(notes, mode=args.mode, measures=args.measures)
+        contact_sheet(keyframes).save(args.storyboard)
+        print(f"Storyboard of {len(keyframes)} keyframes written: {args.storyboard}")
+        return
+    
+    if args.tempos:
+        from tempo_variants import make_tempo_variants, parse_speeds
+        if args.rendition or args.segment_cache:
+            print("Error: --tempos can't be combined with --rendition or --segment-cache.")
+            return
+        try:
+            speeds = parse_speeds(args.tempos)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        print(f"Found {len(notes)} notes. Generating {len(speeds)} tempo variants...")
+        paths = make_tempo_variants(notes, output_file=args.output, speeds=speeds, fps=args.fps, profile=args.quality,
+                                    logger=None, progress_callback=print_progress, mode=args.mode, audio=args.audio,
+                                    measures=args.measures)
+        for speed, path in paths.items():
+            print(f"Video generated ({speed:.0%} tempo): {path}")
+        return
+    
+    segment_cache = None
+    stats = profiler
+    if args.segment_cache:
+        from segment_cache import SegmentCache
+        segment_cache = SegmentCache(args.segment_cache)
+        # Counts the reused segments even when not profiling
+        stats = profiler or RenderProfiler(trace_memory=False)
     
     print(f"Found {len(notes)} notes. Generating video...")
-    output_file = make_video(notes, output_file=args.output, fps=args.fps)
+    output_file = make_video(notes, output_file=args.output, fps=args.fps, profile=args.quality, profiler=stats,
+                             logger=None, progress_callback=print_progress, segment_cache=segment_cache,
+                             mode=args.mode, audio=args.audio, renditions=args.rendition, measures=args.measures)
     
     print(f"Video generated: {output_file}")
+    if segment_cache is not None:
+        print(f"Reused {stats.counts.get('segments_reused', 0)} of {stats.counts.get('segments', 0)} cached segments")
+    for rendition in args.rendition:
+        print(f"Rendition generated: {rendition.output_file}")
+    
+    if profiler is not None:
+        profiler.stop()
+        for path in profiler.write_report(output_file):
+            print(f"Profile written: {path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,158 @@
+"""
+Practice-tempo variants of a video.
+
+Students learn a piece slowly before playing it at full speed, so
+`make_tempo_variants` writes the video at several speeds in one job. All
+variants are rendered in a single pass over the score: their frames are
+drawn in order of score time from one frame renderer, so the fingerboard
+(or the falling-notes strip) and the highlighting of each set of sounding
+notes are drawn once for every speed together. What differs per variant is
+only which score times its frames show and the playback time in the title.
+
+Drawing is the small part of a render, though: encoding is most of it, and
+every variant encodes all of its own frames. A variant at `speed` has
+1 / speed times the frames of the full-speed video, so 50%, 75% and 100%
+cost about 4x one render (43 s against 11 s for 20 s of the standard
+profile), not the little more than one that sharing the drawing would give
+if drawing dominated.
+"""
+
+import heapq
+import os
+
+import numpy as np
+
+from fingering import assign_fingering
+from render_profiles import DEFAULT_PROFILE, get_profile
+from render_progress import ProgressReporter, print_progress
+from synthesia import VIDEO_MODES, _excerpt, _frame_renderer, _instrument
+from video_encoder import VideoEncoder, FramePipeline
+
+# Speeds as fractions of the written tempo
+DEFAULT_SPEEDS = (0.5, 0.75, 1.0)
+
+
+def variant_path(output_file, speed):
+    """Output path of one speed, e.g. score_75pct.mp4 for 0.75."""
+    base, ext = os.path.splitext(output_file)
+    return f"{base}_{round(speed * 100)}pct{ext}"
+
+
+def _check_distinct(speeds):
+    """Raise ValueError if two speeds would be written to the same file (0.755 and 0.76 are both 76%)."""
+    seen = {}
+    for speed in speeds:
+        percent = round(speed * 100)
+        if percent in seen and seen[percent] != speed:
+            raise ValueError(f"Tempos {seen[percent] * 100:g}% and {speed * 100:g}% are both written as {percent}%; "
+                             f"use tempos that differ by at least 1%")
+        seen[percent] = speed
+
+
+def parse_speeds(text):
+    """Speeds from a comma-separated list of percentages such as "50,75,100"."""
+    try:
+        speeds = [float(value) / 100 for value in text.split(',') if value.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid tempo list '{text}'; expected percentages such as 50,75,100")
+    if not speeds or any(speed <= 0 for speed in speeds):
+        raise ValueError(f"Invalid tempo list '{text}'; tempos must be positive percentages")
+    _check_distinct(speeds)
+    return speeds
+
+
+def _scaled_notes(notes, speed):
+    """The notes on the timeline of a variant played at `speed`."""
+    return [dict(note, start_time=note["start_time"] / speed, duration=note["duration"] / speed) for note in notes]
+
+
+def _frame_times(variant, speed, frame_count, fps):
+    """(score time, variant, frame index) of every frame of a variant, in order."""
+    for i in range(frame_count):
+        yield (i / fps) * speed, variant, i
+
+
+def make_tempo_variants(notes, output_file="violin_tutorial.mp4", speeds=DEFAULT_SPEEDS, fps=None, duration=None,
+                        logger="bar", progress_callback=None, cancel_token=None, mode="fingerboard", audio=False,
+                        profile=DEFAULT_PROFILE, measures=None):
+    """
+    Write the video at each of `speeds` (1.0 is the written tempo).
+
+    The arguments are those of `synthesia.make_video`; `duration` is the
+    length of the piece at full speed. Each variant goes to
+    `variant_path(output_file, speed)`, and with `audio` gets a soundtrack
+    synthesized at its own tempo. With `measures`, every variant is of that
+    excerpt only, which is how a passage is usually practised.
+
+    Returns:
+        dict: Output path per speed
+    """
+    if mode not in VIDEO_MODES:
+        raise ValueError(f"Unknown video mode '{mode}'; expected one of {', '.join(VIDEO_MODES)}")
+    speeds = sorted(set(speeds))
+    if not speeds or speeds[0] <= 0:
+        raise ValueError("Tempo variants need positive speeds")
+    _check_distinct(speeds)
+    profile = get_profile(profile, fps)
+    fps = profile.fps
+    if progress_callback is None and logger == "bar":
+        progress_callback = print_progress
+
+    if any("position" not in note for note in notes):
+        assign_fingering(notes)
+
+    clock_offset = 0
+    if measures is not None:
+        notes, duration, clock_offset = _excerpt(notes, measures, duration)
+
+    if duration is None:
+        last_note = notes[-1]
+        duration = last_note["start_time"] + last_note["duration"] + 1
+
+    paths = {speed: variant_path(output_file, speed) for speed in speeds}
+    frame_counts = [int(np.ceil(duration / speed * fps)) for speed in speeds]
+
+    renderer = _frame_renderer(notes, duration, profile.frame_size, mode)
+    if cancel_token is not None:
+        cancel_token.check()
+    reporter = None
+    if progress_callback is not None:
+        reporter = ProgressReporter(sum(frame_counts), progress_callback)
+    make_frame = _instrument(renderer.frame, cancel_token=cancel_token, reporter=reporter)
+
+    audio_files = []
+    pipelines = []
+    try:
+        for speed in speeds:
+            audio_file = None
+            if audio:
+                from soundtrack import write_soundtrack
+                audio_file = write_soundtrack(_scaled_notes(notes, speed), duration / speed,
+                                              os.path.splitext(paths[speed])[0] + ".soundtrack.wav")
+                audio_files.append(audio_file)
+            pipelines.append(FramePipeline(VideoEncoder(paths[speed], profile, audio_file=audio_file)))
+
+        # Frame i of the variant at `speed` shows score time i / fps * speed; taking the frames of all
+        # variants in score order means each set of sounding notes is highlighted only once
+        schedule = heapq.merge(*[_frame_times(k, speed, count, fps)
+                                 for k, (speed, count) in enumerate(zip(speeds, frame_counts))])
+        for t, k, i in schedule:
+            # The clock is the variant's playback time, from the start of the piece at that tempo
+            frame = make_frame(t, clock_offset / speeds[k] + i / fps)
+            pipelines[k].write_frame(frame)
+
+        for pipeline in pipelines:
+            pipeline.close()
+    except BaseException:
+        for pipeline in pipelines:
+            pipeline.abort()
+        raise
+    finally:
+        renderer.close()
+        for audio_file in audio_files:
+            if os.path.exists(audio_file):
+                os.remove(audio_file)
+
+    if reporter is not None:
+        reporter.finish()
+    return paths
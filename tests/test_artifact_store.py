@@ -0,0 +1,57 @@
+"""Deduplication and reference counting in artifact_store.ArtifactStore."""
+
+import hashlib
+import os
+
+import pytest
+
+from artifact_store import CHUNK_SIZE, ArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "store"))
+
+
+def stored_objects(store):
+    return [name for prefix in os.listdir(store.objects_dir)
+            for name in os.listdir(os.path.join(store.objects_dir, prefix))]
+
+
+def test_identical_buffers_are_stored_once(store):
+    data = os.urandom(CHUNK_SIZE + 100)
+
+    first = store.put_buffer(data)
+    second = store.put_buffer(bytearray(data))
+
+    assert first == second == (hashlib.sha256(data).hexdigest(), len(data))
+    assert stored_objects(store) == [first[0]]
+    with open(store.path(first[0]), "rb") as f:
+        assert f.read() == data
+    # Nothing is left behind in the store's temp directory
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_linked_object_is_referenced(store, tmp_path):
+    link = str(tmp_path / "session.musicxml")
+
+    digest, _ = store.put_buffer(b"<score/>", link_to=link)
+
+    assert os.path.samefile(link, store.path(digest))
+    assert list(store.iter_unreferenced()) == []
+    # A second upload of the same bytes gets its own link to the same object
+    second_link = str(tmp_path / "other_session.musicxml")
+    store.put_buffer(b"<score/>", link_to=second_link)
+    assert os.path.samefile(second_link, store.path(digest))
+    assert os.stat(store.path(digest)).st_nlink == 3
+
+
+def test_unlinked_object_becomes_unreferenced(store, tmp_path):
+    link = str(tmp_path / "session.musicxml")
+    digest, size = store.put_buffer(b"<score/>", link_to=link)
+    kept, _ = store.put_buffer(b"<other/>", link_to=str(tmp_path / "kept.musicxml"))
+
+    os.remove(link)
+
+    assert [(path, found_size) for path, found_size, _ in store.iter_unreferenced()] == [(store.path(digest), size)]
+    assert store.exists(kept)
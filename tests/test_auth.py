@@ -0,0 +1,214 @@
+"""
+Session checks in auth.py against a local stand-in for the Supabase auth
+server (the /auth/v1/user and /auth/v1/token endpoints), driven through the
+real supabase client.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("supabase")
+import streamlit as st
+
+import auth
+
+SECRET = "test-jwt-secret"
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def make_token(expires_in, secret=SECRET, alg="HS256", subject="user-1"):
+    header = _b64url(json.dumps({"alg": alg, "typ": "JWT"}).encode())
+    payload = _b64url(json.dumps({"sub": subject, "exp": int(time.time()) + expires_in}).encode())
+    signature = hmac.new((secret or "").encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{_b64url(signature)}"
+
+
+USER = {
+    "id": "user-1",
+    "aud": "authenticated",
+    "email": "player@example.com",
+    "app_metadata": {},
+    "user_metadata": {},
+    "created_at": "2024-01-01T00:00:00Z",
+}
+
+
+class FakeAuthServer:
+    """Accepts the tokens it issued; refresh tokens are single-use, as on Supabase."""
+
+    def __init__(self):
+        self.access_tokens = set()
+        self.refresh_tokens = set()
+        self.refresh_fails = False
+        self.refresh_delay = 0
+        self.requests = []
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def issue(self, expires_in=3600, **token_args):
+        access_token = make_token(expires_in, **token_args)
+        refresh_token = f"refresh-{len(self.refresh_tokens)}-{time.monotonic_ns()}"
+        with self.lock:
+            self.access_tokens.add(access_token)
+            self.refresh_tokens.add(refresh_token)
+        return access_token, refresh_token
+
+    def count(self, path):
+        return sum(1 for request in self.requests if request == path)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                server.requests.append(urlparse(self.path).path)
+                token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                if urlparse(self.path).path == "/auth/v1/user" and token in server.access_tokens:
+                    self._reply(200, USER)
+                else:
+                    self._reply(403, {"code": "bad_jwt", "msg": "invalid JWT"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                server.requests.append(url.path)
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if url.path != "/auth/v1/token" or parse_qs(url.query).get("grant_type") != ["refresh_token"]:
+                    self._reply(404, {"msg": "not found"})
+                    return
+                time.sleep(server.refresh_delay)
+                with server.lock:
+                    valid = not server.refresh_fails and body.get("refresh_token") in server.refresh_tokens
+                    server.refresh_tokens.discard(body.get("refresh_token"))
+                if not valid:
+                    self._reply(400, {"error_code": "refresh_token_not_found", "msg": "Invalid Refresh Token"})
+                    return
+                access_token, refresh_token = server.issue()
+                self._reply(200, {
+                    "access_token": access_token,
+                    "refresh_token": refresh_token,
+                    "token_type": "bearer",
+                    "expires_in": 3600,
+                    "expires_at": int(time.time()) + 3600,
+                    "user": USER,
+                })
+
+        return Handler
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeAuthServer()
+    monkeypatch.setenv("SUPABASE_URL", fake.url)
+    monkeypatch.setenv("SUPABASE_ANON_KEY", "anon-key")
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(auth, "_client", None)
+    auth.decode_access_token.cache_clear()
+    auth.accepted_by_server.cache_clear()
+    yield fake
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    fake.close()
+
+
+def sign_in(access_token, refresh_token):
+    auth_session = auth.AuthSession(USER, access_token, refresh_token, None)
+    st.session_state.auth_session = auth_session
+    st.session_state.user = USER
+    st.session_state.access_token = access_token
+    st.session_state.authenticated = True
+    return auth_session
+
+
+def test_valid_token_is_checked_locally(server):
+    sign_in(*server.issue())
+
+    assert auth.SupabaseAuth().is_authenticated()
+    assert server.requests == []
+
+
+def test_token_without_secret_is_checked_by_server_once(server, monkeypatch):
+    monkeypatch.delenv("SUPABASE_JWT_SECRET")
+    sign_in(*server.issue())
+    supabase_auth = auth.SupabaseAuth()
+
+    assert supabase_auth.is_authenticated()
+    assert supabase_auth.is_authenticated()
+    assert server.count("/auth/v1/user") == 1
+
+
+def test_asymmetric_token_is_checked_by_server(server):
+    sign_in(*server.issue(alg="ES256", secret="signing-key"))
+
+    assert auth.SupabaseAuth().is_authenticated()
+    assert server.count("/auth/v1/user") == 1
+
+
+def test_forged_token_is_rejected_by_server(server, monkeypatch):
+    monkeypatch.delenv("SUPABASE_JWT_SECRET")
+    _, refresh_token = server.issue()
+    sign_in(make_token(3600, secret="forged"), refresh_token)
+
+    assert not auth.SupabaseAuth().is_authenticated()
+    assert "authenticated" not in st.session_state
+
+
+def test_expired_token_is_refreshed(server):
+    expired_token, refresh_token = server.issue(expires_in=-3600)
+    sign_in(expired_token, refresh_token)
+
+    assert auth.SupabaseAuth().is_authenticated()
+    assert st.session_state.access_token != expired_token
+    assert st.session_state.access_token in server.access_tokens
+    assert server.count("/auth/v1/token") == 1
+
+
+def test_failed_refresh_signs_out(server):
+    sign_in(*server.issue(expires_in=-3600))
+    server.refresh_fails = True
+
+    assert not auth.SupabaseAuth().is_authenticated()
+    assert "authenticated" not in st.session_state
+    assert "auth_session" not in st.session_state
+
+
+def test_expired_token_waits_for_refresh_in_flight(server):
+    expired_token, refresh_token = server.issue(expires_in=-3600)
+    auth_session = sign_in(expired_token, refresh_token)
+    server.refresh_delay = 0.5
+    supabase_auth = auth.SupabaseAuth()
+
+    # A refresh from an earlier rerun is still running when the next check comes in
+    supabase_auth._refresh_in_background(auth_session)
+    assert auth_session.refreshing
+
+    assert supabase_auth.is_authenticated()
+    assert st.session_state.access_token != expired_token
+    assert server.count("/auth/v1/token") == 1
@@ -0,0 +1,72 @@
+"""Fingerings chosen by fingering.assign_fingering."""
+
+from fingering import HAND_SPAN, assign_fingering, fingering_options, note_to_midi
+
+
+def notes_at(*events):
+    """Notes from (name, start_time, duration) triples."""
+    return [{"note": name, "start_time": start, "duration": duration} for name, start, duration in events]
+
+
+def positions(notes):
+    return [note["position"] for note in assign_fingering(notes)]
+
+
+def test_scale_stays_in_one_hand_position():
+    scale = ["G3", "A3", "B3", "C4", "D4", "E4", "F#4", "G4"]
+    chosen = positions(notes_at(*[(name, i * 0.5, 0.5) for i, name in enumerate(scale)]))
+
+    stopped = [pos for pos, _ in chosen if pos]
+    assert max(stopped) - min(stopped) <= HAND_SPAN
+    # Strings are only ever crossed upwards in a rising scale
+    strings = [string for _, string in chosen]
+    assert strings == sorted(strings)
+
+
+def test_each_note_gets_one_of_its_options():
+    passage = notes_at(("A4", 0, 1), ("C#5", 1, 1), ("E5", 2, 1), ("A5", 3, 1), ("E4", 4, 1))
+
+    for note in assign_fingering(passage):
+        assert note["position"] in fingering_options(note["note"])
+
+
+def test_three_note_chord_uses_three_strings():
+    # The third note must stay off the first note's string too, not only the second's
+    chord = positions(notes_at(("D4", 0, 1), ("E4", 0, 1), ("B4", 0, 1)))
+
+    assert len({string for _, string in chord}) == 3
+
+
+def test_four_note_chord_of_open_strings():
+    chord = positions(notes_at(("G3", 0, 2), ("D4", 0, 2), ("A4", 0, 2), ("E5", 0, 2)))
+
+    assert chord == [(0, 0), (0, 1), (0, 2), (0, 3)]
+
+
+def test_held_note_keeps_its_string_under_a_moving_line():
+    # D4 sounds through both later notes, though only E4 directly follows it
+    held, first, second = positions(notes_at(("D4", 0, 4), ("E4", 1, 1), ("B4", 2, 1)))
+
+    assert first[1] != held[1]
+    assert second[1] != held[1]
+
+
+def test_double_accidentals_are_fingered_like_their_enharmonics():
+    assert note_to_midi("F##4") == note_to_midi("G4")
+    assert note_to_midi("Bbb4") == note_to_midi("A4")
+    assert positions(notes_at(("F##4", 0, 1))) == positions(notes_at(("G4", 0, 1)))
+    assert positions(notes_at(("Bbb4", 0, 1))) == positions(notes_at(("A4", 0, 1)))
+
+
+def test_off_range_notes_get_no_position():
+    chosen = positions(notes_at(("F3", 0, 1), ("A4", 1, 1), ("C8", 2, 1), ("not a note", 3, 1)))
+
+    assert chosen[0] is None
+    assert chosen[1] in fingering_options("A4")
+    assert chosen[2] is None
+    assert chosen[3] is None
+
+
+def test_no_playable_notes():
+    assert positions(notes_at(("C2", 0, 1))) == [None]
+    assert assign_fingering([]) == []
@@ -0,0 +1,116 @@
+"""Leases, reclaiming and attempts in job_queue.JobQueue, and worker.Worker handing jobs back."""
+
+import threading
+import time
+
+import pytest
+
+from artifact_store import ArtifactStore
+from job_control import RenderCancelled
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue"), ArtifactStore(str(tmp_path / "store")), lease_seconds=60, max_attempts=2)
+
+
+def expire_leases(queue):
+    """Let every running job's lease run out, as if its worker had died."""
+    with queue._connect() as db:
+        db.execute("UPDATE jobs SET lease_expires = 0 WHERE status = 'running'")
+
+
+def test_two_workers_claim_different_jobs(queue):
+    first = queue.submit("a.musicxml", b"<a/>")
+    second = queue.submit("b.musicxml", b"<b/>")
+
+    claimed = [queue.claim("worker-1"), queue.claim("worker-2")]
+
+    assert [job["id"] for job in claimed] == [first["id"], second["id"]]
+    assert [job["worker"] for job in claimed] == ["worker-1", "worker-2"]
+    assert queue.claim("worker-3") is None
+
+
+def test_expired_lease_is_reclaimed(queue):
+    job = queue.submit("a.musicxml", b"<a/>")
+    queue.claim("worker-1")
+
+    assert queue.claim("worker-2") is None
+    expire_leases(queue)
+    reclaimed = queue.claim("worker-2")
+
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["worker"] == "worker-2"
+    assert reclaimed["attempts"] == 2
+    assert queue.heartbeat(job["id"], "worker-1") == (False, False)
+
+
+def test_complete_after_losing_the_lease_is_discarded(queue):
+    job = queue.submit("a.musicxml", b"<a/>")
+    queue.claim("worker-1")
+    expire_leases(queue)
+    queue.claim("worker-2")
+
+    assert not queue.complete(job["id"], "worker-1", True, "done by the old owner", "/tmp/old.mp4")
+
+    job = queue.get(job["id"])
+    assert job["status"] == "running"
+    assert job["worker"] == "worker-2"
+    assert job["output_path"] is None
+    # The new owner still has its input
+    with open(queue.input_path(job), "rb") as f:
+        assert f.read() == b"<a/>"
+    assert queue.complete(job["id"], "worker-2", True, "done", "/tmp/new.mp4")
+    assert queue.get(job["id"])["status"] == "done"
+
+
+def test_job_fails_after_max_attempts(queue):
+    job = queue.submit("a.musicxml", b"<a/>")
+    for worker_id in ("worker-1", "worker-2"):
+        assert queue.claim(worker_id)["id"] == job["id"]
+        expire_leases(queue)
+
+    assert queue.claim("worker-3") is None
+
+    job = queue.get(job["id"])
+    assert job["status"] == "failed"
+    assert "2 attempts" in job["message"]
+
+
+class BlockingProcessor:
+    """Stands in for FileProcessor: renders until cancelled."""
+
+    def __init__(self):
+        self.started = threading.Event()
+
+    def process_file(self, filename, data, cancel_token=None, **kwargs):
+        self.started.set()
+        while not cancel_token.cancelled:
+            time.sleep(0.05)
+        raise RenderCancelled("Job was cancelled")
+
+
+def test_stopped_worker_hands_its_job_back(queue, monkeypatch):
+    file_processor = pytest.importorskip("file_processor")
+    import worker
+
+    processor = BlockingProcessor()
+    monkeypatch.setattr(file_processor, "get_file_processor", lambda: processor)
+    job = queue.submit("a.musicxml", b"<a/>")
+    stopping = worker.Worker(queue, heartbeat_interval=0.05)
+    stopping.worker_id = "worker-1"
+
+    thread = threading.Thread(target=stopping.run, kwargs={"once": True})
+    thread.start()
+    assert processor.started.wait(5)
+    stopping.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    job = queue.get(job["id"])
+    assert job["status"] == "queued"
+    assert job["worker"] is None
+    # Handing back doesn't use up an attempt
+    assert job["attempts"] == 0
+    assert queue.claim("worker-2")["id"] == job["id"]
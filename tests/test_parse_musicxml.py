@@ -0,0 +1,67 @@
+"""Note names read from <pitch> by synthesia.parse_musicxml."""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from fingering import note_to_midi
+from synthesia import parse_musicxml
+
+SCORE = """<?xml version="1.0" encoding="UTF-8"?>
+<score-partwise version="3.1"><part-list><score-part id="P1"><part-name>Violin</part-name></score-part></part-list>
+<part id="P1">
+<measure number="1"><attributes><divisions>1</divisions></attributes>
+{notes}
+</measure>
+</part></score-partwise>
+"""
+
+
+def parse_pitches(tmp_path, pitches):
+    """Note names parsed from a one-measure score of (step, alter, octave) quarter notes."""
+    notes = []
+    for step, alter, octave in pitches:
+        alter_elem = f"<alter>{alter}</alter>" if alter is not None else ""
+        notes.append(f"<note><pitch><step>{step}</step>{alter_elem}<octave>{octave}</octave></pitch>"
+                     f"<duration>1</duration></note>")
+    path = tmp_path / "score.musicxml"
+    path.write_text(SCORE.format(notes="\n".join(notes)))
+    return [note["note"] for note in parse_musicxml(str(path))]
+
+
+def test_single_accidentals(tmp_path):
+    names = parse_pitches(tmp_path, [("G", None, 4), ("F", 1, 5), ("B", -1, 4)])
+
+    assert names == ["G4", "F#5", "Bb4"]
+
+
+def test_double_accidentals(tmp_path):
+    names = parse_pitches(tmp_path, [("F", 2, 4), ("B", -2, 4)])
+
+    assert names == ["F##4", "Bbb4"]
+    # Spelled differently, the same pitches as G4 and A4
+    assert [note_to_midi(name) for name in names] == [note_to_midi("G4"), note_to_midi("A4")]
+
+
+def test_decimal_alter(tmp_path):
+    names = parse_pitches(tmp_path, [("C", "1.0", 5), ("E", "-1.0", 4)])
+
+    assert names == ["C#5", "Eb4"]
+
+
+def test_chord_members_share_a_start_time(tmp_path):
+    # A half-note G/D/B chord, then a quarter A4; <chord/> marks the notes that sound with the one before
+    path = tmp_path / "score.musicxml"
+    path.write_text(SCORE.format(notes="""
+        <note><pitch><step>G</step><octave>3</octave></pitch><duration>2</duration></note>
+        <note><chord/><pitch><step>D</step><octave>4</octave></pitch><duration>2</duration></note>
+        <note><chord/><pitch><step>B</step><octave>4</octave></pitch><duration>2</duration></note>
+        <note><pitch><step>A</step><octave>4</octave></pitch><duration>1</duration></note>
+    """))
+
+    notes = parse_musicxml(str(path))
+
+    assert [note["note"] for note in notes] == ["G3", "D4", "B4", "A4"]
+    assert [note["start_time"] for note in notes] == [0, 0, 0, 2]
+    assert [note["duration"] for note in notes] == [2, 2, 2, 1]
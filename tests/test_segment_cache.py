@@ -0,0 +1,61 @@
+"""Which segments segment_cache.segment_key invalidates when a score or its render settings change."""
+
+from segment_cache import SEGMENT_SECONDS, segment_key
+
+FPS = 30
+SETTINGS = {"width": 1280, "height": 720, "fps": FPS, "codec": "libx264", "mode": "fingerboard"}
+STATIC = [(0, 0), (2, 1), (4, 2)]
+
+
+def scale(count=20):
+    """One-second notes, back to back, over `count` seconds."""
+    names = ["G3", "A3", "B3", "C4", "D4", "E4", "F#4", "G4"]
+    return [{"note": names[i % len(names)], "position": (i % 5, i % 4), "start_time": float(i), "duration": 1.0}
+            for i in range(count)]
+
+
+def keys(notes, static_positions=STATIC, settings=SETTINGS, lookahead=0, seconds=20):
+    frames_per_segment = SEGMENT_SECONDS * FPS
+    total_frames = seconds * FPS
+    return [segment_key(notes, static_positions, start, min(start + frames_per_segment, total_frames), FPS,
+                        settings, lookahead=lookahead)
+            for start in range(0, total_frames, frames_per_segment)]
+
+
+def changed(before, after):
+    return [i for i, (old, new) in enumerate(zip(before, after)) if old != new]
+
+
+def test_editing_a_note_changes_only_its_segments():
+    notes = scale()
+    before = keys(notes)
+
+    notes[9]["note"] = "C#4"  # Sounds 9-10 s, inside the third segment
+    after_pitch = keys(notes)
+    notes[7]["duration"] = 1.5  # Now sounds 7-8.5 s, across the second and third
+    after_duration = keys(notes)
+
+    assert changed(before, after_pitch) == [2]
+    assert changed(after_pitch, after_duration) == [1, 2]
+
+
+def test_lookahead_widens_a_segment_to_the_notes_it_shows_early():
+    notes = scale()
+    before = keys(notes, lookahead=2)
+
+    notes[13]["position"] = (3, 3)  # Sounds 13-14 s, and is on screen from 11 s
+
+    assert changed(before, keys(notes, lookahead=2)) == [2, 3]
+
+
+def test_static_positions_and_settings_invalidate_every_segment():
+    notes = scale()
+    before = keys(notes)
+
+    moved_dots = keys(notes, static_positions=STATIC + [(5, 3)])
+    other_mode = keys(notes, settings=dict(SETTINGS, mode="falling"))
+    other_bitrate = keys(notes, settings=dict(SETTINGS, bitrate="2M"))
+
+    for after in (moved_dots, other_mode, other_bitrate):
+        assert changed(before, after) == list(range(len(before)))
+    assert keys(scale()) == before
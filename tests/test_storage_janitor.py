@@ -0,0 +1,66 @@
+"""Quota sweeps of storage_janitor.StorageJanitor over a temp directory."""
+
+import os
+import time
+
+import pytest
+
+from artifact_store import ArtifactStore
+from storage_janitor import StorageJanitor
+
+KB = 1024
+
+
+def make_session(temp_dir, name, size, age_seconds):
+    """A session directory holding one `size`-byte file, last used `age_seconds` ago."""
+    path = temp_dir / f"session_{name}"
+    path.mkdir()
+    (path / "score.musicxml").write_bytes(b"x" * size)
+    used = time.time() - age_seconds
+    for item in (path / "score.musicxml", path):
+        os.utime(item, (used, used))
+    return path
+
+
+@pytest.fixture
+def temp_dir(tmp_path):
+    path = tmp_path / "temp"
+    path.mkdir()
+    return path
+
+
+def test_quota_sweep_evicts_oldest_inactive_sessions_first(temp_dir):
+    active = make_session(temp_dir, "active", 4 * KB, age_seconds=3000)
+    oldest = make_session(temp_dir, "oldest", 4 * KB, age_seconds=2000)
+    older = make_session(temp_dir, "older", 4 * KB, age_seconds=1000)
+    newest = make_session(temp_dir, "newest", 4 * KB, age_seconds=10)
+    janitor = StorageJanitor(str(temp_dir), ttl_seconds=None, quota_bytes=5 * KB)
+    janitor.mark_active(str(active))
+
+    result = janitor.sweep()
+
+    assert not oldest.exists()
+    assert not older.exists()
+    assert newest.exists()
+    # The oldest of all, but its job is still running
+    assert active.exists()
+    assert result["evicted"] == 2
+    assert result["usage_bytes"] == 4 * KB
+
+    # A job that has just finished counts as just used
+    janitor.mark_inactive(str(active))
+    janitor.sweep()
+    assert active.exists()
+    assert not newest.exists()
+
+
+def test_hard_linked_bytes_are_counted_once(temp_dir, tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"))
+    first = make_session(temp_dir, "first", 0, age_seconds=100)
+    second = make_session(temp_dir, "second", 0, age_seconds=50)
+    # One 8 KB upload shared by both sessions
+    store.put_buffer(b"y" * 8 * KB, link_to=str(first / "upload.png"))
+    store.put_buffer(b"y" * 8 * KB, link_to=str(second / "upload.png"))
+    janitor = StorageJanitor(str(temp_dir), artifact_store=store, ttl_seconds=None, quota_bytes=None)
+
+    assert janitor.sweep()["usage_bytes"] == 8 * KB
@@ -1,6 +1,48 @@
+import os
+import re
+import hashlib
 import streamlit as st
+from functools import lru_cache
 from typing import Dict, Any
 
+# Streamlit serves this directory at app/static/ when server.enableStaticServing is on
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_URL = 'app/static'
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace from a stylesheet"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    css = re.sub(r'\s+', ' ', css)
+    # Whitespace before ':' is kept, since it is significant in selectors like `div :hover`
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+@lru_cache(maxsize=None)
+def build_stylesheet(css: str) -> str:
+    """
+    Write a minified stylesheet to the static directory under a content-hash name.
+    
+    Built once per distinct palette per process; the file is only written if
+    it does not exist yet, so concurrent processes agree on the same name.
+    
+    Returns:
+        str: File name of the stylesheet inside STATIC_DIR
+    """
+    minified = minify_css(css)
+    name = f"theme.{hashlib.sha256(minified.encode()).hexdigest()[:12]}.css"
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(minified)
+        os.replace(tmp_path, path)
+    return name
+
+
 class ThemeManager:
     def __init__(self):
         pass
@@ -36,8 +78,10 @@ class ThemeManager:
     
     def get_modern_css(self) -> str:
         """Generate shadcn-inspired CSS"""
-        colors = self.get_theme_colors()
-        
+        return _modern_css(tuple(self.get_theme_colors().items()))
+    
+    @staticmethod
+    def _render_css(colors: Dict[str, str]) -> str:
         return f"""
         :root {{
             --background: {colors['background']};
@@ -444,9 +488,33 @@ class ThemeManager:
         }}
         """
     
+    def get_stylesheet_tag(self) -> str:
+        """
+        HTML that applies the theme: a <link> to the cached static stylesheet,
+        or the minified CSS inline when static file serving is disabled.
+        """
+        css = _modern_css(tuple(self.get_theme_colors().items()))
+        if st.get_option('server.enableStaticServing'):
+            try:
+                return f'<link rel="stylesheet" href="{STATIC_URL}/{build_stylesheet(css)}">'
+            except OSError as e:
+                print(f"Could not write theme stylesheet: {str(e)}")
+        return f"<style>{_minified_css(css)}</style>"
+    
     def apply_theme(self):
         """Apply shadcn-inspired theme to the Streamlit app"""
-        st.markdown(f"<style>{self.get_modern_css()}</style>", unsafe_allow_html=True)
+        st.markdown(self.get_stylesheet_tag(), unsafe_allow_html=True)
+
+
+@lru_cache(maxsize=None)
+def _modern_css(palette) -> str:
+    """Theme CSS for a palette given as a tuple of (name, color) pairs"""
+    return ThemeManager._render_css(dict(palette))
+
+
+@lru_cache(maxsize=None)
+def _minified_css(css: str) -> str:
+    return minify_css(css)
 
 
 # Global theme manager instance
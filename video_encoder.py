@@ -0,0 +1,219 @@
+"""
+ffmpeg encoder fed with raw RGB frames.
+
+Frames are piped to an ffmpeg process that encodes them with the x264
+settings of a render profile, muxing in an optional soundtrack in the same
+pass.
+
+FramePipeline overlaps drawing with encoding: finished frames are copied
+into a small ring of preallocated buffers and a thread writes them to the
+encoder. The pipe write releases the GIL, so the next frame is drawn while
+ffmpeg consumes the last one, and a full ring blocks the drawing side, so
+memory stays at PIPELINE_DEPTH frames however far ahead drawing gets. With
+a single CPU there is nothing to overlap and frames are written inline.
+"""
+
+import os
+import queue
+import subprocess
+import threading
+
+import numpy as np
+
+from render_profiles import CONTAINER_FORMATS
+
+# Frames in flight between drawing and encoding; 0 writes frames inline
+PIPELINE_DEPTH = 4 if (os.cpu_count() or 1) > 1 else 0
+
+
+class VideoEncoder:
+    """
+    Usage:
+        with VideoEncoder("out.mp4", profile) as encoder:
+            encoder.write_frame(frame)
+    """
+
+    def __init__(self, output_file, profile, audio_file=None, faststart=True, frame_size=None, bitrate=None,
+                 container=None):
+        """
+        Frames are written at `profile.frame_size`; give `frame_size` to scale
+        them for this output. `bitrate` (e.g. "800k") replaces the profile's
+        CRF and `container` (a CONTAINER_FORMATS key) overrides the one ffmpeg
+        picks from the file extension.
+        """
+        from moviepy.config import FFMPEG_BINARY
+
+        self.output_file = output_file
+        self.profile = profile
+        width, height = profile.frame_size
+        command = [
+            FFMPEG_BINARY, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(profile.fps), '-i', '-',
+        ]
+        if audio_file is not None:
+            command += ['-i', audio_file, '-map', '0:v', '-map', '1:a', '-c:a', 'aac', '-shortest']
+        if frame_size is not None and tuple(frame_size) != (width, height):
+            # Area averaging keeps thin lines and small text readable when downscaling
+            command += ['-vf', f'scale={frame_size[0]}:{frame_size[1]}:flags=area']
+        command += ['-c:v', 'libx264', '-preset', profile.preset]
+        if bitrate is not None:
+            command += ['-b:v', bitrate, '-maxrate', bitrate, '-bufsize', bitrate]
+        else:
+            command += ['-crf', str(profile.crf)]
+        command += ['-pix_fmt', profile.pixel_format, '-threads', str(profile.threads)]
+        if container is not None:
+            command += ['-f', CONTAINER_FORMATS[container]]
+        if faststart:
+            command += ['-movflags', '+faststart']
+        command.append(output_file)
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE)
+
+    def write_frame(self, frame):
+        """Encode one RGB frame (a uint8 array of the profile's frame size)."""
+        try:
+            self.proc.stdin.write(memoryview(frame).cast('B') if frame.flags.c_contiguous else frame.tobytes())
+        except (BrokenPipeError, OSError):
+            self.proc.wait()
+            raise RuntimeError(f"Video encoding failed: {self.proc.stderr.read().decode(errors='replace').strip()}")
+
+    def close(self):
+        """Finish the file; raises RuntimeError if ffmpeg failed."""
+        if self.proc.stdin is not None and not self.proc.stdin.closed:
+            self.proc.stdin.close()
+        stderr = self.proc.stderr.read()
+        self.proc.stderr.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError(f"Video encoding failed: {stderr.decode(errors='replace').strip()}")
+
+    def abort(self):
+        """Stop encoding without finishing the file."""
+        self.proc.kill()
+        self.proc.wait()
+        for pipe in (self.proc.stdin, self.proc.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class EncoderFanout:
+    """Several encoders fed the same frames, one per output of a render."""
+
+    def __init__(self, encoders):
+        self.encoders = encoders
+        self.profile = encoders[0].profile
+
+    def write_frame(self, frame):
+        for encoder in self.encoders:
+            encoder.write_frame(frame)
+
+    def close(self):
+        """Finish every output, then raise the first failure if there was one."""
+        error = None
+        for encoder in self.encoders:
+            try:
+                encoder.close()
+            except RuntimeError as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def abort(self):
+        for encoder in self.encoders:
+            encoder.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class FramePipeline:
+    """
+    Usage:
+        with FramePipeline(VideoEncoder("out.mp4", profile)) as pipeline:
+            pipeline.write_frame(frame)
+    """
+
+    def __init__(self, encoder, depth=None):
+        self.encoder = encoder
+        if depth is None:
+            depth = PIPELINE_DEPTH
+        self._thread = None
+        if depth == 0:
+            return
+        width, height = encoder.profile.frame_size
+        self._free = queue.Queue()
+        for _ in range(depth):
+            self._free.put(np.empty((height, width, 3), dtype=np.uint8))
+        self._filled = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._feed, name="frame-encoder", daemon=True)
+        self._thread.start()
+
+    def _feed(self):
+        while True:
+            buffer = self._filled.get()
+            if buffer is None:
+                return
+            if self._error is None:
+                try:
+                    self.encoder.write_frame(buffer)
+                except BaseException as e:
+                    # Keep recycling buffers so the drawing side never blocks on a dead encoder
+                    self._error = e
+            self._free.put(buffer)
+
+    def write_frame(self, frame):
+        """Copy a frame into the ring and queue it; blocks while every buffer is waiting to be encoded."""
+        if self._thread is None:
+            self.encoder.write_frame(frame)
+            return
+        buffer = self._free.get()
+        if self._error is not None:
+            self._free.put(buffer)
+            raise self._error
+        np.copyto(buffer, frame)
+        self._filled.put(buffer)
+
+    def _stop(self):
+        if self._thread is not None:
+            self._filled.put(None)
+            self._thread.join()
+
+    def close(self):
+        """Encode the queued frames and finish the file."""
+        self._stop()
+        if self._thread is not None and self._error is not None:
+            self.encoder.abort()
+            raise self._error
+        self.encoder.close()
+
+    def abort(self):
+        """Drop the queued frames and stop encoding without finishing the file."""
+        # Killing ffmpeg first unblocks a feeder thread stuck in a pipe write
+        self.encoder.abort()
+        self._stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
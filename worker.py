@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Render worker: takes jobs from the shared job queue and processes them.
+
+Each worker runs one job at a time, so render capacity grows by starting
+more workers, on this host or on any host that mounts the same volume:
+
+    docker compose up --scale worker=4
+
+While a job runs, a heartbeat thread renews its lease, publishes render
+progress and picks up cancellation requests. On SIGTERM the current job is
+cancelled and handed back to the queue for another worker.
+
+With ADAPTIVE_QUALITY, jobs are rendered at a cheaper profile while the
+queue is backed up and re-rendered at the requested one once it has
+drained (see adaptive_quality.py).
+
+Usage:
+    python worker.py [--once] [--poll 2]
+"""
+
+import os
+import time
+import signal
+import socket
+import threading
+
+import config
+from adaptive_quality import sample_load, pressure, choose_profile
+from job_queue import get_job_queue
+from job_control import CancelToken, RenderCancelled
+
+# Finished jobs are forgotten once their outputs are past the storage TTL
+PRUNE_INTERVAL_SECONDS = 600
+
+
+class Worker:
+    def __init__(self, queue, poll_interval=2.0, heartbeat_interval=config.JOB_HEARTBEAT_SECONDS):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+        self._token = None
+        self._last_prune = 0.0
+
+    def stop(self):
+        """Stop taking jobs and cancel the current one, which is handed back to the queue."""
+        self._stopping.set()
+        if self._token is not None:
+            self._token.cancel()
+
+    def run(self, once=False):
+        print(f"Worker {self.worker_id} waiting for jobs")
+        while not self._stopping.is_set():
+            job = self.queue.claim(self.worker_id, upgrades=self._idle())
+            if job is None:
+                if once:
+                    return
+                self._maybe_prune()
+                self._stopping.wait(self.poll_interval)
+                continue
+            self.process(job)
+            if once:
+                return
+
+    def _idle(self):
+        """Whether there is room for upgrade jobs: adaptive quality is off or nothing is under pressure."""
+        return not config.ADAPTIVE_QUALITY or pressure(sample_load(self.queue)) == 0
+
+    def _maybe_prune(self):
+        if time.time() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+            self._last_prune = time.time()
+            self.queue.prune(config.STORAGE_TTL_HOURS * 3600)
+
+    def process(self, job):
+        from file_processor import get_file_processor
+
+        print(f"Worker {self.worker_id} took job {job['id']} ({job['filename']}, attempt {job['attempts']})")
+        profile = job['profile']
+        if config.ADAPTIVE_QUALITY and not job['upgrade_of']:
+            load = sample_load(self.queue)
+            profile = choose_profile(job['profile'], load)
+            if profile != job['profile']:
+                print(f"Worker {self.worker_id} rendering job {job['id']} at {profile} instead of {job['profile']} "
+                      f"({load.queued} jobs waiting, load {load.cpu_load:.2f} per CPU)")
+        token = self._token = CancelToken()
+        latest = {'progress': None}
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.heartbeat_interval):
+                owned, cancel_requested = self.queue.heartbeat(job['id'], self.worker_id, latest['progress'])
+                if cancel_requested or not owned:
+                    # Cancelled by the user, or the lease was lost and another worker has the job
+                    token.cancel()
+
+        def report(progress):
+            latest['progress'] = progress
+
+        thread = threading.Thread(target=heartbeat, daemon=True, name='job-heartbeat')
+        thread.start()
+        try:
+            with open(self.queue.input_path(job), 'rb') as f:
+                data = f.read()
+            success, message, output_path = get_file_processor().process_file(
+                job['filename'], data, progress_callback=report, cancel_token=token, user_id=job['user_id'],
+                mode=job['mode'], profile=profile, measures=job['measures'], score_path=self.queue.score_path(job)
+            )
+        except RenderCancelled as e:
+            success, message, output_path = False, f"Processing stopped: {str(e)}", None
+        except Exception as e:
+            success, message, output_path = False, f"Worker error: {str(e)}", None
+        finally:
+            done.set()
+            thread.join()
+            self._token = None
+
+        if self._stopping.is_set() and not success:
+            self.queue.release(job['id'], self.worker_id)
+            print(f"Worker {self.worker_id} handed job {job['id']} back to the queue")
+            return
+        # Publish the final progress before the job is marked finished
+        owned, _ = self.queue.heartbeat(job['id'], self.worker_id, latest['progress'])
+        if not owned:
+            print(f"Worker {self.worker_id} lost the lease on job {job['id']}; discarding its result")
+            return
+        upgrade = None
+        if success and profile != job['profile']:
+            # Before complete(), which drops the input the upgrade is rendered from
+            upgrade = self.queue.submit_upgrade(job, job['profile'])
+            message = (f"{message} (rendered at {profile} quality while busy; "
+                       f"a {job['profile']} version is queued as job {upgrade['id']})")
+        if not self.queue.complete(job['id'], self.worker_id, success, message, output_path,
+                                   cancelled=token.cancelled, rendered_profile=profile):
+            if upgrade:
+                self.queue.cancel(upgrade['id'])
+            print(f"Worker {self.worker_id} lost the lease on job {job['id']}; discarding its result")
+            return
+        print(f"Worker {self.worker_id} finished job {job['id']}: {message}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Process MusicSynth jobs from the shared queue.")
+    parser.add_argument("--once", action="store_true", help="Process at most one job, then exit")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between checks of an empty queue (default: 2)")
+    args = parser.parse_args()
+
+    worker = Worker(get_job_queue(), poll_interval=args.poll)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    worker.run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()